@@ -2,6 +2,7 @@
 import logging
 import os
 import pickle
+import time
 from typing import Tuple
 
 import numpy as np
@@ -34,10 +35,13 @@ def prepare_data(
         )
 
     logging.info("Preparing data for train and test")
-    df = pd.read_csv(data_path, index_col="date")
+    df = pd.read_csv(
+        data_path, index_col="date", usecols=["date", *features, target]
+    )
 
-    x = df[features].values
-    y = df[target].values
+    # The trees are built on float32 features, converting once halves the memory
+    x = df[features].to_numpy(dtype=np.float32)
+    y = df[target].to_numpy()
 
     x_train, x_test, y_train, y_test = train_test_split(
         x, y, test_size=test_size, random_state=28
@@ -46,15 +50,23 @@ def prepare_data(
     return x_train, x_test, y_train, y_test
 
 
-def model_setup() -> RandomForestRegressor:
+def model_setup(
+    n_jobs: int = -1, warm_start: bool = False
+) -> RandomForestRegressor:
     """Initalise and return the regression model.
 
+    Args:
+        n_jobs (int): number of trees built in parallel, -1 uses all the cores
+        warm_start (bool): whether fitting again adds trees to the forest
+
     Returns:
         RandomForestRegressor: a random forest regressor
 
     """
     logging.info("Creating Random Forest Regressor model")
-    model = RandomForestRegressor(random_state=28, verbose=1)
+    model = RandomForestRegressor(
+        random_state=28, verbose=1, n_jobs=n_jobs, warm_start=warm_start
+    )
     return model
 
 
@@ -69,8 +81,64 @@ def train(
         y_train (np.ndarray): the ground truth of the training dataset
     """
     logging.info("Training model")
+    start = time.perf_counter()
     model.fit(x_train, y_train)
-    logging.info("Training Completed")
+    logging.info(
+        f"Training Completed in {time.perf_counter() - start:.2f} seconds"
+    )
+
+
+def train_until_plateau(
+    model: RandomForestRegressor,
+    x_train: np.ndarray,
+    y_train: np.ndarray,
+    validation_size: float = 0.2,
+    step: int = 10,
+    max_estimators: int = 500,
+    tolerance: float = 0.001,
+) -> None:
+    """Add trees to a warm started model until the validation error stops improving.
+
+    The trees added last are removed if they made the validation error worse,
+    so the forest kept is the best one found.
+
+    Args:
+        model (RandomForestRegressor): the model to be trained, with warm_start set
+        x_train (np.ndarray): the training dataset
+        y_train (np.ndarray): the ground truth of the training dataset
+        validation_size (float): share of the training dataset used for validation
+        step (int): number of trees added at a time
+        max_estimators (int): maximum number of trees of the forest
+        tolerance (float): smallest relative improvement of the validation error to keep adding trees
+    """
+    x_fit, x_val, y_fit, y_val = train_test_split(
+        x_train, y_train, test_size=validation_size, random_state=28
+    )
+    logging.info("Training model until the validation error plateaus")
+    start = time.perf_counter()
+    best_rmse = np.inf
+    model.set_params(n_estimators=0)
+
+    while model.n_estimators < max_estimators:
+        model.set_params(n_estimators=model.n_estimators + step)
+        model.fit(x_fit, y_fit)
+        rmse = np.sqrt(mean_squared_error(y_val, model.predict(x_val)))
+        logging.info(f"{model.n_estimators} trees, validation RMSE: {rmse}")
+
+        if rmse > best_rmse * (1 - tolerance):
+            if rmse > best_rmse:
+                # The last trees made the forest worse, the best one is kept
+                del model.estimators_[-step:]
+                model.set_params(n_estimators=len(model.estimators_))
+
+            break
+
+        best_rmse = rmse
+
+    logging.info(
+        f"Training Completed with {model.n_estimators} trees in "
+        f"{time.perf_counter() - start:.2f} seconds"
+    )
 
 
 def evaluate(
@@ -84,10 +152,14 @@ def evaluate(
         y_test (np.ndarray): the ground truth of the testing dataset
     """
     logging.info("Evaluating model on test set")
+    start = time.perf_counter()
     predictions = model.predict(x_test)
+    logging.info(
+        f"Predicted {len(x_test)} rows in {time.perf_counter() - start:.2f} seconds"
+    )
     mse = mean_squared_error(y_test, predictions)
     mae = mean_absolute_error(y_test, predictions)
-    rmse = mean_squared_error(y_test, predictions, squared=False)
+    rmse = np.sqrt(mse)
     r2 = r2_score(y_test, predictions)
 
     logging.info(f"Mean Squared Error: {mse}")
@@ -99,9 +171,15 @@ def evaluate(
 def save_model(model: RandomForestRegressor, save_path: str) -> None:
     """Save the trained model using pickle into the models folder.
 
+    The model is saved for single row predictions, so it predicts on one core
+    rather than starting a pool of workers over all the cores per request, and
+    fitting it again starts over.
+
     Args:
         model (RandomForestRegressor): the trained model to be saved
         save_path (str): the path to save the trained model
     """
+    model.set_params(n_jobs=1, warm_start=False)
+
     with open(save_path, "wb") as f:
         pickle.dump(model, f)
@@ -9,6 +9,7 @@ from pipeline.train import (
     prepare_data,
     save_model,
     train,
+    train_until_plateau,
 )
 from src.prepare_data import (
     authenticate_api,
@@ -137,6 +138,7 @@ def training(
     model_save_path: str,
     features: list,
     test_size: float,
+    warm_start: bool = False,
 ):
     """Train a random forest regression model using the reference dataset.
 
@@ -145,6 +147,7 @@ def training(
         model_save_path (str): Path to save the trained model
         features (list): List of features to use for training
         test_size (float): split ratio to split dataset into train and test datasets
+        warm_start (bool): add trees until the validation error plateaus instead of a fixed number
     """
     save_dir = os.path.dirname(model_save_path)
     create_dir(save_dir)
@@ -156,10 +159,13 @@ def training(
         target=target,
         test_size=test_size,
     )
-    # Create a random forest regressor using sklearn
-    model = model_setup()
+    # Create a random forest regressor using sklearn, trees are built on all cores
+    model = model_setup(warm_start=warm_start)
     # Fit the model
-    train(model, x_train, y_train)
+    if warm_start:
+        train_until_plateau(model, x_train, y_train)
+    else:
+        train(model, x_train, y_train)
     # Evaluate the performance
     evaluate(model, x_test, y_test)
     # Saving the model
@@ -191,6 +197,13 @@ if __name__ == "__main__":
         action="store_true",
         help="Train a regression model using the reference dataset",
     )
+    parser.add_argument(
+        "-w",
+        "--warm-start",
+        default=False,
+        action="store_true",
+        help="Add trees until the validation error plateaus when training",
+    )
     args = parser.parse_args()
 
     # path to shareable google drive link containing kaggle dataset
@@ -231,4 +244,5 @@ if __name__ == "__main__":
             model_save_path,
             train_features,
             test_size,
+            args.warm_start,
         )
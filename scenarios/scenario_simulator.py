@@ -1,12 +1,16 @@
 """Simulate a scenario with data drift."""
 import argparse
-import json
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 import pandas as pd
 import requests
 
+from serialization import dumps, records
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -26,13 +30,15 @@ def request_prediction(
     """
     dataset = pd.read_csv(dataset_path)
 
-    for _, row in dataset.iterrows():
-        features = row.to_json(orient="index")
-        features = json.loads(features)
+    for features in records(dataset):
         logging.info("Sending a request")
 
         try:
-            requests.post(model_server_url, json=features)
+            requests.post(
+                model_server_url,
+                data=dumps(features),
+                headers={"content-type": "application/json"},
+            )
             logging.info(
                 f"Waiting for {sleep_timeout} seconds till next request."
             )
@@ -42,6 +48,99 @@ def request_prediction(
             logging.error("Cannot reach the inference server.")
 
 
+def replay(
+    model_server_url: str,
+    dataset_path: str,
+    speed_up: float,
+    senders: int,
+    date_column: str = "date",
+) -> None:
+    """Replay the production rows on their original time offsets, compressed by a speed up factor.
+
+    Each sender takes the next row in date order, waits for its scheduled time
+    and sends it, so up to `senders` requests are in flight and bursts of rows
+    with close dates are sent concurrently. The lag between the scheduled and
+    actual send times is reported, a growing lag means the senders or the
+    servers cannot keep up with the replayed load.
+
+    Args:
+        model_server_url (str): the address of the inference server
+        dataset_path (str): the path for the production dataset to use
+        speed_up (float): how many times faster than real time to replay
+        senders (int): number of concurrent senders
+        date_column (str): the column with the date of each row
+    """
+    dataset = pd.read_csv(dataset_path)
+    dates = pd.to_datetime(dataset[date_column])
+    order = np.argsort(dates.to_numpy(), kind="stable")
+    dataset = dataset.iloc[order]
+    dates = dates.iloc[order]
+    # Seconds from the start of the replay to send each row
+    schedule = (dates - dates.iloc[0]).dt.total_seconds().to_numpy() / speed_up
+    payloads = [dumps(features) for features in records(dataset)]
+    lags = np.full(len(payloads), np.nan)
+    latencies = np.full(len(payloads), np.nan)
+    failed = np.zeros(len(payloads), dtype=bool)
+    # Each sender reuses its connections to the server
+    sessions = threading.local()
+    logging.info(
+        f"Replaying {len(payloads)} rows spanning {schedule[-1] * speed_up:.0f}s "
+        f"in {schedule[-1]:.1f}s with {senders} senders"
+    )
+    started = time.perf_counter()
+
+    def send(index: int) -> None:
+        """Send a row at its scheduled time.
+
+        Args:
+            index (int): position of the row in the schedule
+        """
+        if not hasattr(sessions, "session"):
+            sessions.session = requests.Session()
+
+        delay = started + schedule[index] - time.perf_counter()
+
+        if delay > 0:
+            time.sleep(delay)
+
+        sent = time.perf_counter()
+        lags[index] = sent - started - schedule[index]
+
+        try:
+            response = sessions.session.post(
+                model_server_url,
+                data=payloads[index],
+                headers={"content-type": "application/json"},
+            )
+            failed[index] = response.status_code != 200
+
+        except requests.exceptions.ConnectionError:
+            failed[index] = True
+
+        latencies[index] = time.perf_counter() - sent
+
+    # The rows are submitted in date order, the senders take them in turn
+    with ThreadPoolExecutor(max_workers=senders) as executor:
+        for _ in executor.map(send, range(len(payloads))):
+            pass
+
+    elapsed = time.perf_counter() - started
+    lag_ms = np.percentile(lags * 1000, [50, 95, 99, 100])
+    logging.info(
+        f"Sent {len(payloads)} rows in {elapsed:.1f}s "
+        f"({len(payloads) / elapsed:.0f} rows/s), {failed.sum()} failed"
+    )
+    logging.info(
+        "Send time lag behind schedule: "
+        f"p50 {lag_ms[0]:.1f}ms, p95 {lag_ms[1]:.1f}ms, "
+        f"p99 {lag_ms[2]:.1f}ms, max {lag_ms[3]:.1f}ms"
+    )
+    logging.info(
+        f"Request latency: p50 {np.percentile(latencies, 50) * 1000:.1f}ms, "
+        f"p99 {np.percentile(latencies, 99) * 1000:.1f}ms"
+    )
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Script for data sending to Evidently metrics integration demo service"
@@ -71,6 +170,30 @@ if __name__ == "__main__":
         help="Sleep timeout between data send tries in seconds.",
     )
 
+    parser.add_argument(
+        "-r",
+        "--replay",
+        default=False,
+        action="store_true",
+        help="Send the rows on the time offsets of their date, rather than every timeout",
+    )
+
+    parser.add_argument(
+        "-s",
+        "--speed-up",
+        type=float,
+        default=1000,
+        help="How many times faster than real time to replay the rows",
+    )
+
+    parser.add_argument(
+        "-n",
+        "--senders",
+        type=int,
+        default=8,
+        help="Number of concurrent senders of the replay",
+    )
+
     parser.add_argument(
         "-H",
         "--host",
@@ -86,17 +209,24 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     model_server_url = "http://inference_service:5050/predict"
+    dataset_path = None
+
     if args.no_drift:
         dataset_path = (
             "datasets/house_price_random_forest/production_no_drift.csv"
         )
         logging.info("Sending non drifted data")
-        logging.info("Visit http://localhost:3000/ for Grafana dashboard")
-        request_prediction(args.timeout, model_server_url, dataset_path)
     elif args.drift:
         dataset_path = (
             "datasets/house_price_random_forest/production_with_drift.csv"
         )
         logging.info("Sending drifted data")
+
+    if dataset_path is not None:
         logging.info("Visit http://localhost:3000/ for Grafana dashboard")
-        request_prediction(args.timeout, model_server_url, dataset_path)
+
+        if args.replay:
+            replay(model_server_url, dataset_path, args.speed_up, args.senders)
+
+        else:
+            request_prediction(args.timeout, model_server_url, dataset_path)
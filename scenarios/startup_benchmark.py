@@ -0,0 +1,172 @@
+"""Measure the time from the start of a server to its first successful request."""
+import argparse
+import logging
+import os
+import shlex
+import signal
+import statistics
+import subprocess
+import time
+
+import pandas as pd
+import requests
+
+from serialization import dumps, records
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+
+# How each server is started and the request it must answer
+SERVERS = {
+    "inference": {
+        "cwd": "server/model_server",
+        "command": "python inference_server.py",
+        "url": "http://127.0.0.1:5050/predict",
+    },
+    "metric": {
+        "cwd": "server/monitoring_server",
+        "command": "python metric_server.py",
+        "url": "http://127.0.0.1:8085/iterate/house_price_random_forest",
+    },
+}
+
+
+def first_request_time(
+    command: str, cwd: str, url: str, payload: bytes, timeout: float
+) -> tuple:
+    """Start a server and send the same request until it succeeds.
+
+    Args:
+        command (str): the command starting the server
+        cwd (str): the directory to start the server from
+        url (str): the address of the request
+        payload (bytes): the JSON body of the request
+        timeout (float): seconds to wait for a successful request
+
+    Returns:
+        tuple: the seconds from the start of the server to the first successful request, and its latency
+
+    Raises:
+        TimeoutError: if no request succeeds within the timeout
+    """
+    started = time.perf_counter()
+    # A session of its own, so the reloader and worker processes are stopped too
+    server = subprocess.Popen(
+        shlex.split(command),
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                response = requests.post(
+                    url,
+                    data=payload,
+                    headers={"content-type": "application/json"},
+                    timeout=timeout,
+                )
+
+                if response.status_code == 200:
+                    return (
+                        time.perf_counter() - started,
+                        response.elapsed.total_seconds(),
+                    )
+
+            except requests.exceptions.ConnectionError:
+                pass
+
+            time.sleep(0.05)
+
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait()
+
+    raise TimeoutError(f"{command} did not answer within {timeout} seconds")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the time to the first successful request of a server"
+    )
+
+    parser.add_argument(
+        "-s",
+        "--server",
+        choices=sorted(SERVERS),
+        default="inference",
+        help="Server to start",
+    )
+
+    parser.add_argument(
+        "-c",
+        "--command",
+        type=str,
+        default=None,
+        help="Command starting the server, e.g. gunicorn -c gunicorn.conf.py inference_server:app",
+    )
+
+    parser.add_argument(
+        "--cwd",
+        type=str,
+        default=None,
+        help="Directory to start the server from, defaults to the server's directory",
+    )
+
+    parser.add_argument(
+        "-r", "--runs", type=int, default=5, help="Number of starts to measure"
+    )
+
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        type=float,
+        default=120,
+        help="Seconds to wait for the first successful request of a start",
+    )
+
+    parser.add_argument(
+        "--dataset",
+        type=str,
+        default="datasets/house_price_random_forest/production_no_drift.csv",
+        help="Production dataset whose first row is sent",
+    )
+
+    args = parser.parse_args()
+
+    server = SERVERS[args.server]
+    row = records(pd.read_csv(args.dataset, nrows=1))[0]
+
+    if args.server == "metric":
+        # The metric server receives the rows with their prediction
+        row["prediction"] = 0.0
+        row = [row]
+
+    durations = []
+    latencies = []
+
+    for run in range(args.runs):
+        duration, latency = first_request_time(
+            args.command or server["command"],
+            args.cwd or server["cwd"],
+            server["url"],
+            dumps(row),
+            args.timeout,
+        )
+        durations.append(duration)
+        latencies.append(latency)
+        logging.info(
+            f"Run {run + 1}: first request after {duration:.2f}s, "
+            f"answered in {latency * 1000:.0f}ms"
+        )
+
+    logging.info(
+        f"Time to first successful request: median {statistics.median(durations):.2f}s, "
+        f"min {min(durations):.2f}s, max {max(durations):.2f}s, "
+        f"median latency {statistics.median(latencies) * 1000:.0f}ms"
+    )
@@ -0,0 +1,47 @@
+"""Gunicorn settings of the inference server.
+
+The app is imported and warmed up once in the master process, then the workers
+are forked from it, so they start with the model loaded and share its memory
+copy-on-write instead of each unpickling it.
+"""
+import gc
+import os
+import shutil
+
+bind = "0.0.0.0:5050"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+preload_app = True
+
+# The workers write their metrics there and /metrics sums them, the files of
+# the previous run are removed before the app creates its metrics
+multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+if multiproc_dir:
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir)
+
+
+def on_starting(server) -> None:
+    """Warm the model up in the master process, before the workers are forked.
+
+    Args:
+        server (gunicorn.arbiter.Arbiter): the master process
+    """
+    from inference_server import warm_up
+
+    warm_up()
+    # Objects moved to the permanent generation are not touched by the
+    # collections of the workers, so their pages stay shared
+    gc.freeze()
+
+
+def child_exit(server, worker) -> None:
+    """Remove the live gauges of a worker which exited from the metrics.
+
+    Args:
+        server (gunicorn.arbiter.Arbiter): the master process
+        worker (gunicorn.workers.base.Worker): the worker which exited
+    """
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
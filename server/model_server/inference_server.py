@@ -1,12 +1,25 @@
 """Server for inference."""
-import json
 import logging
+import os
 import pickle
+import uuid
+from typing import Optional
 
 import numpy as np
 import requests
 from flask import Flask, request
+from prediction_cache import PredictionCache
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    generate_latest,
+    multiprocess,
+)
 from sklearn.ensemble import RandomForestRegressor
+from werkzeug.serving import is_running_from_reloader
+
+from serialization import BACKEND, dumps, loads
 
 app = Flask(__name__)
 logging.basicConfig(
@@ -15,37 +28,30 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()],
 )
 
-
-# The encoder converts NumPy types in source data to JSON-compatible types
-class NumpyEncoder(json.JSONEncoder):
-    """If object type contains types that are not JSON serializable, return object as JSON compatible types.
-
-    Args:
-        json.JSONEncoder: inherit the class json.JSONEncoder and then implement the default method
-    """
-
-    def default(self, obj: object) -> object:
-        """Implement the default method for the JSONEncoder class.
-
-        Args:
-            obj (object): the object to encode
-
-        Returns:
-            object: the encoded object
-        """
-        if isinstance(obj, np.void):
-            return None
-
-        if isinstance(obj, (np.generic, np.bool_)):
-            return obj.item()
-
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
-
-        return obj
+# The features used by the model, in the order it was trained with
+FEATURES = (
+    "bedrooms",
+    "bathrooms",
+    "sqft_living",
+    "sqft_lot",
+    "floors",
+    "waterfront",
+    "view",
+    "condition",
+    "grade",
+    "yr_built",
+)
+N_FEATURES = len(FEATURES)
+# Loaded by warm_up before the server accepts requests
+MODEL: Optional[RandomForestRegressor] = None
+# Predictions of repeated feature vectors, PREDICTION_CACHE_SIZE=0 disables the cache
+PREDICTION_CACHE_TTL_SEC = os.environ.get("PREDICTION_CACHE_TTL_SEC", "3600")
+PREDICTION_CACHE = PredictionCache(
+    int(os.environ.get("PREDICTION_CACHE_SIZE", 10_000)),
+    float(PREDICTION_CACHE_TTL_SEC) if PREDICTION_CACHE_TTL_SEC else None,
+)
 
 
-@app.before_first_request
 def load_model() -> RandomForestRegressor:
     """Load the trained model from the specified path.
 
@@ -57,11 +63,28 @@ def load_model() -> RandomForestRegressor:
 
     with open(model_path, "rb") as f:
         MODEL = pickle.load(f)
+    # Models saved before training set it back could start a pool of workers over all the cores per prediction
+    MODEL.set_params(n_jobs=1)
     logging.info("Model loaded")
 
     return MODEL
 
 
+def warm_up() -> None:
+    """Load the model and make a first prediction before accepting requests.
+
+    The first prediction pays for the lazy set up of scikit-learn, so the first
+    request does not. Under gunicorn, the master process warms up before forking
+    the workers, which share the loaded model copy-on-write.
+    """
+    global MODEL
+    MODEL = load_model()
+    # The cached predictions are the ones of the previous model
+    PREDICTION_CACHE.clear()
+    MODEL.predict(np.zeros((1, N_FEATURES)))
+    logging.info("Model warmed up")
+
+
 @app.route("/")
 def home() -> str:
     """The message for default route.
@@ -72,51 +95,111 @@ def home() -> str:
     return "Hello world from the inference server."
 
 
+@app.route("/metrics")
+def metrics() -> tuple:
+    """Export the metrics of the server, summed over the gunicorn workers when they share a directory.
+
+    Returns:
+        tuple: the metrics in the Prometheus text format, the status code and the headers
+    """
+    registry = REGISTRY
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+
+    return generate_latest(registry), 200, {"Content-Type": CONTENT_TYPE_LATEST}
+
+
+def parse_features(payload: dict) -> np.ndarray:
+    """Parse the features of a request into a single row in the model's feature order.
+
+    Args:
+        payload (dict): the JSON payload of the request
+
+    Returns:
+        np.ndarray: the features, with shape (1, number of features)
+
+    Raises:
+        ValueError: if a feature is missing or is not a number
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("the payload must be a JSON object")
+
+    missing = [f for f in FEATURES if f not in payload]
+
+    if missing:
+        raise ValueError(f"missing features {missing}")
+
+    try:
+        features = np.fromiter(
+            (payload[f] for f in FEATURES), dtype=np.float64, count=N_FEATURES
+        )
+
+    except (TypeError, ValueError):
+        raise ValueError("features must be numbers")
+
+    return features.reshape(1, -1)
+
+
 @app.route("/predict", methods=["POST"])
-def predict() -> str:
+def predict() -> tuple:
     """Process the JSON payload and select features that can be used by the model to make predictions.
 
+    The request id, taken from the X-Request-ID header or generated, is returned
+    in the same header so the ground truth can later be sent to the metric server.
+
     Returns:
-        str: the price prediction as a string
+        tuple: the price prediction as a string, the status code and the headers
     """
-    features = [
-        "bedrooms",
-        "bathrooms",
-        "sqft_living",
-        "sqft_lot",
-        "floors",
-        "waterfront",
-        "view",
-        "condition",
-        "grade",
-        "yr_built",
-    ]
-
-    logging.info(f"Received inference request {request.json}")
-    request_data = dict(
-        (f, request.json[f]) for f in features if f in request.json
-    )
-    features = list(request_data.values())
-    features = np.array(features)
-    features = features.reshape(1, -1)
+    if MODEL is None:
+        return "Service Unavailable: the model is not loaded", 503
+
+    # Identifies the prediction when its label is sent to the metric server
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+
+    try:
+        payload = loads(request.get_data())
 
-    pred = MODEL.predict(features)
-    pred_price = float(pred[0])
+    except ValueError:
+        return "Bad Request: the payload is not valid JSON", 400
+
+    logging.info("Received inference request %s", payload)
+
+    try:
+        features = parse_features(payload)
 
-    logging.info(f"The predicted prices is: {pred_price}")
-    send_pred_to_metric_server(pred_price)
-    return str(pred[0])
+    except ValueError as error:
+        return f"Bad Request: {error}", 400
 
+    # The bytes of the features in the model's order identify a feature vector
+    key = features.tobytes()
+    pred_price = PREDICTION_CACHE.get(key)
 
-def send_pred_to_metric_server(pred_price: float) -> None:
+    if pred_price is None:
+        pred_price = float(MODEL.predict(features)[0])
+        PREDICTION_CACHE.put(key, pred_price)
+
+    logging.info("The predicted prices is: %s", pred_price)
+    # Cached predictions are monitored too, so the drift statistics see every request
+    send_pred_to_metric_server(features[0], pred_price, request_id)
+    return str(pred_price), 200, {"X-Request-ID": request_id}
+
+
+def send_pred_to_metric_server(
+    features: np.ndarray, pred_price: float, request_id: str
+) -> None:
     """This function sends the predictions made by the model together with the features are used to make the predictions to the metric server.
 
     Args:
+        features (np.ndarray): the features used to make the prediction
         pred_price (float): the predicted price
+        request_id (str): the id of the request, joining the prediction with its label
     """
-    request_features = request.get_json()
-    pred_price = {"price": float(pred_price)}
-    features_n_pred = request_features | pred_price
+    # Built from the parsed features, so the request is not decoded again
+    features_n_pred = dict(zip(FEATURES, features))
+    features_n_pred["prediction"] = pred_price
+    features_n_pred["request_id"] = request_id
 
     metric_server_url = (
         "http://evidently_service:8085/iterate/house_price_random_forest"
@@ -126,7 +209,7 @@ def send_pred_to_metric_server(pred_price: float) -> None:
     try:
         response = requests.post(
             metric_server_url,
-            data=json.dumps([features_n_pred], cls=NumpyEncoder),
+            data=dumps([features_n_pred]),
             headers={"content-type": "application/json"},
         )
 
@@ -134,7 +217,7 @@ def send_pred_to_metric_server(pred_price: float) -> None:
             logging.info("Success.")
 
         else:
-            logging.Error(
+            logging.error(
                 f"Got an error code {response.status_code} for the data chunk. "
                 f"Reason: {response.reason}, error text: {response.text}"
             )
@@ -144,5 +227,11 @@ def send_pred_to_metric_server(pred_price: float) -> None:
 
 
 if __name__ == "__main__":
-    MODEL = load_model()
-    app.run(host="0.0.0.0", port="5050", debug=True)
+    debug = True
+
+    # With the debugger on, only the reloaded child process serves requests
+    if not debug or is_running_from_reloader():
+        warm_up()
+
+    logging.info(f"Serializing JSON with {BACKEND}")
+    app.run(host="0.0.0.0", port="5050", debug=debug)
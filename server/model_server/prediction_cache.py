@@ -0,0 +1,101 @@
+"""Bounded cache of the predictions of repeated feature vectors."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from prometheus_client import Counter, Gauge
+
+CACHE_HITS = Counter(
+    "inference:prediction_cache_hits",
+    "Predictions answered from the cache",
+)
+CACHE_MISSES = Counter(
+    "inference:prediction_cache_misses",
+    "Predictions made by the model",
+)
+CACHE_ENTRIES = Gauge(
+    "inference:prediction_cache_entries",
+    "Predictions held in the cache",
+    multiprocess_mode="livesum",
+)
+
+
+class PredictionCache:
+    """Least recently used predictions, keyed by the feature vector in the model's order.
+
+    At most `max_entries` predictions are kept, the least recently used one is
+    evicted first, and a prediction older than `ttl_sec` is made again. Both
+    lookups and insertions are O(1).
+    """
+
+    def __init__(
+        self, max_entries: int, ttl_sec: Optional[float] = None
+    ) -> None:
+        """Initialise an empty cache.
+
+        Args:
+            max_entries (int): the maximum number of predictions kept, 0 disables the cache
+            ttl_sec (Optional[float]): seconds a prediction is served from the cache, forever when None
+        """
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: bytes) -> Optional[float]:
+        """Get the cached prediction of a feature vector.
+
+        Args:
+            key (bytes): the features, as the bytes of their array
+
+        Returns:
+            Optional[float]: the prediction, None when it is not cached or expired
+        """
+        if not self.max_entries:
+            return None
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None and (
+                self.ttl_sec is None or time.monotonic() < entry[0]
+            ):
+                self.entries.move_to_end(key)
+                CACHE_HITS.inc()
+                return entry[1]
+
+            if entry is not None:
+                del self.entries[key]
+
+        CACHE_MISSES.inc()
+        return None
+
+    def put(self, key: bytes, prediction: float) -> None:
+        """Cache the prediction of a feature vector, evicting the least recently used one when full.
+
+        Args:
+            key (bytes): the features, as the bytes of their array
+            prediction (float): the prediction of the model
+        """
+        if not self.max_entries:
+            return
+
+        expires = (
+            None if self.ttl_sec is None else time.monotonic() + self.ttl_sec
+        )
+
+        with self.lock:
+            self.entries[key] = (expires, prediction)
+            self.entries.move_to_end(key)
+
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+            CACHE_ENTRIES.set(len(self.entries))
+
+    def clear(self) -> None:
+        """Forget every prediction, e.g. when another model is loaded."""
+        with self.lock:
+            self.entries.clear()
+            CACHE_ENTRIES.set(0)
@@ -0,0 +1,562 @@
+"""Recompute the drift metrics of historical production data in batch."""
+import argparse
+import csv
+import logging
+import os
+import time
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import pandas as pd
+from metric_server import (
+    MonitoringService,
+    MonitoringServiceOptions,
+    load_dataset,
+    read_configs,
+)
+from reference_store import ReferenceStore
+from segments import segment_columns
+
+# The monitoring service of each worker process
+WORKER_SERVICE: MonitoringService | None = None
+
+
+def init_worker(
+    config_file_path: str, dataset_name: str, with_prediction: bool = True
+) -> None:
+    """Load the reference and set up a monitoring service in a worker process.
+
+    Args:
+        config_file_path (str): path of the config.yaml file
+        dataset_name (str): name of the dataset to backfill
+        with_prediction (bool): whether the production file holds the predictions
+    """
+    global WORKER_SERVICE
+    configs = read_configs(config_file_path)
+    options = MonitoringServiceOptions(**configs["service"])
+    dataset_configs = configs["datasets"][dataset_name]
+    reference_store = None
+
+    if not with_prediction:
+        # Only the features are monitored, the stored reference of the server has the prediction
+        dataset_configs = without_prediction(dataset_configs)
+
+    elif options.reference_store_path is not None:
+        reference_store = ReferenceStore(options.reference_store_path)
+
+    dataset = load_dataset(
+        dataset_name,
+        options.datasets_path,
+        dataset_configs,
+        reference_store,
+    )
+    # The workers already run in parallel, the drift engines run in process
+    WORKER_SERVICE = MonitoringService(
+        datasets={dataset_name: dataset},
+        window_size=options.window_size,
+        calculation_period_sec=options.calculation_period_sec,
+        drift_workers=1,
+    )
+
+
+def without_prediction(dataset_configs: dict) -> dict:
+    """Remove the prediction and its drift monitor from the configs of a dataset.
+
+    Args:
+        dataset_configs (dict): the dataset section of the config file
+
+    Returns:
+        dict: the configs monitoring the features only
+    """
+    column_mapping = dict(dataset_configs["column_mapping"])
+    column_mapping.pop("prediction", None)
+    return {
+        **dataset_configs,
+        "column_mapping": column_mapping,
+        "monitors": [
+            monitor
+            for monitor in dataset_configs["monitors"]
+            if monitor != "num_target_drift"
+        ],
+    }
+
+
+def file_columns(input_path: str) -> list:
+    """Read the column names of a csv or parquet file.
+
+    Args:
+        input_path (str): path of the file
+
+    Returns:
+        list: the column names
+    """
+    if input_path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(input_path).names
+
+    return list(pd.read_csv(input_path, nrows=0).columns)
+
+
+def calculate_windows(
+    dataset_name: str, block: pd.DataFrame, windows: list
+) -> list:
+    """Calculate the metrics of windows of rows, in a worker process.
+
+    Args:
+        dataset_name (str): name of the dataset
+        block (pd.DataFrame): the rows covering all the windows
+        windows (list): (start, end, timestamp) of each window, positions within the block
+
+    Returns:
+        list: (start, end, timestamp, metrics) of each window
+    """
+    columns = WORKER_SERVICE.columns[dataset_name]
+    block, _ = WORKER_SERVICE.dtype_plan[dataset_name].apply(block[columns])
+    return [
+        (
+            start,
+            end,
+            timestamp,
+            WORKER_SERVICE.calculate(
+                dataset_name, block.iloc[start:end].reset_index(drop=True)
+            ),
+        )
+        for start, end, timestamp in windows
+    ]
+
+
+def read_chunks(
+    input_path: str, columns: list, chunk_size: int, datetime_column: str
+) -> Iterator[pd.DataFrame]:
+    """Stream a csv or parquet file in chunks, reading only the needed columns.
+
+    Args:
+        input_path (str): path of the file
+        columns (list): the columns to read
+        chunk_size (int): number of rows per chunk
+        datetime_column (str): the column holding the time of each row, if any
+
+    Yields:
+        pd.DataFrame: the chunks
+    """
+    if input_path.endswith(".parquet"):
+        # Optional dependency, only needed for parquet files
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(input_path)
+
+        for batch in parquet_file.iter_batches(
+            batch_size=chunk_size, columns=columns
+        ):
+            chunk = batch.to_pandas()
+
+            if datetime_column:
+                chunk[datetime_column] = pd.to_datetime(chunk[datetime_column])
+
+            yield chunk
+
+        return
+
+    yield from pd.read_csv(
+        input_path,
+        usecols=columns,
+        chunksize=chunk_size,
+        parse_dates=[datetime_column] if datetime_column else False,
+    )
+
+
+def row_windows(
+    chunks: Iterator[pd.DataFrame],
+    window_size: int,
+    step: int,
+    datetime_column: str,
+    windows_per_task: int,
+) -> Iterator[tuple]:
+    """Cut the stream into sliding windows of rows, as the monitoring service does.
+
+    Args:
+        chunks (Iterator[pd.DataFrame]): the streamed rows
+        window_size (int): number of rows per window
+        step (int): number of rows between the end of two windows
+        datetime_column (str): the column holding the time of each row, if any
+        windows_per_task (int): maximum number of windows sent to a worker at once
+
+    Yields:
+        tuple: the stream position of a block of rows, the block and the
+            (start, end, timestamp) of its windows
+    """
+    buffer = None
+    # Stream position of the first buffered row and the end of the next window
+    offset = 0
+    next_end = window_size
+
+    for chunk in chunks:
+        buffer = chunk if buffer is None else pd.concat([buffer, chunk])
+        buffer.reset_index(drop=True, inplace=True)
+        buffered_end = offset + len(buffer)
+
+        while next_end <= buffered_end:
+            block_start = next_end - window_size - offset
+            windows = []
+
+            while next_end <= buffered_end and len(windows) < windows_per_task:
+                start = next_end - window_size - offset - block_start
+                timestamp = (
+                    buffer[datetime_column].iloc[next_end - offset - 1]
+                    if datetime_column
+                    else None
+                )
+                windows.append((start, start + window_size, timestamp))
+                next_end += step
+
+            block_end = block_start + windows[-1][1]
+            yield offset + block_start, buffer.iloc[
+                block_start:block_end
+            ], windows
+
+        # Only keep the rows of the windows still to come
+        keep_from = min(max(next_end - window_size, offset), buffered_end)
+        drop = keep_from - offset
+        buffer = buffer.iloc[drop:]
+        offset = keep_from
+
+
+def time_bucket_windows(
+    chunks: Iterator[pd.DataFrame], datetime_column: str, freq: str
+) -> Iterator[tuple]:
+    """Cut the stream into one window per time bucket, the rows must be sorted by time.
+
+    Args:
+        chunks (Iterator[pd.DataFrame]): the streamed rows
+        datetime_column (str): the column holding the time of each row
+        freq (str): the pandas frequency of the buckets, e.g. "1D"
+
+    Yields:
+        tuple: the stream position of the rows of a bucket, the rows and
+            their single (start, end, timestamp) window
+    """
+    pending = None
+    position = 0
+
+    for chunk in chunks:
+        pending = chunk if pending is None else pd.concat([pending, chunk])
+        buckets = pending[datetime_column].dt.floor(freq)
+        # The last bucket may continue in the next chunk
+        complete = buckets < buckets.iloc[-1]
+
+        for bucket, rows in pending[complete].groupby(buckets[complete]):
+            yield position, rows, [(0, len(rows), bucket + pd.Timedelta(freq))]
+            position += len(rows)
+
+        pending = pending[~complete]
+
+    if pending is not None and len(pending):
+        bucket = pending[datetime_column].dt.floor(freq).iloc[0]
+        yield position, pending, [
+            (0, len(pending), bucket + pd.Timedelta(freq))
+        ]
+
+
+def format_labels(labels: dict) -> str:
+    """Format the labels of a metric the way Prometheus does.
+
+    Args:
+        labels (dict): the labels
+
+    Returns:
+        str: e.g. {dataset_name="house",feature="bedrooms"}
+    """
+    formatted = ",".join(
+        f'{key}="{value}"' for key, value in sorted(labels.items())
+    )
+    return "{" + formatted + "}"
+
+
+class CsvWriter:
+    """Write the metrics as a long csv time series, one row per metric and window."""
+
+    def __init__(self, output_path: str) -> None:
+        """Open the output file.
+
+        Args:
+            output_path (str): path of the csv file
+        """
+        self.file = open(output_path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(
+            [
+                "timestamp",
+                "window_start",
+                "window_end",
+                "metric",
+                "labels",
+                "value",
+            ]
+        )
+
+    def write(
+        self, timestamp: object, start: int, end: int, metrics: list
+    ) -> None:
+        """Write the metrics of a window.
+
+        Args:
+            timestamp (object): time of the window, if known
+            start (int): stream position of the first row of the window
+            end (int): stream position after the last row of the window
+            metrics (list): the metric name, labels and value of each metric
+        """
+        for metric_key, labels, value in metrics:
+            self.writer.writerow(
+                [
+                    timestamp,
+                    start,
+                    end,
+                    metric_key,
+                    format_labels(labels),
+                    float(value),
+                ]
+            )
+
+    def close(self) -> None:
+        """Close the output file."""
+        self.file.close()
+
+
+class OpenMetricsWriter:
+    """Write the metrics as OpenMetrics, for `promtool tsdb create-blocks-from openmetrics`.
+
+    OpenMetrics wants the samples of a metric together, so they are buffered
+    per metric until the end.
+    """
+
+    def __init__(self, output_path: str) -> None:
+        """Set up the output.
+
+        Args:
+            output_path (str): path of the OpenMetrics file
+        """
+        self.output_path = output_path
+        self.samples = {}
+
+    def write(
+        self, timestamp: object, start: int, end: int, metrics: list
+    ) -> None:
+        """Buffer the metrics of a window.
+
+        Args:
+            timestamp (object): time of the window
+            start (int): stream position of the first row of the window
+            end (int): stream position after the last row of the window
+            metrics (list): the metric name, labels and value of each metric
+
+        Raises:
+            ValueError: if the time of the window is not known
+        """
+        if timestamp is None:
+            raise ValueError(
+                "OpenMetrics output needs the datetime column of the dataset"
+            )
+
+        seconds = pd.Timestamp(timestamp).timestamp()
+
+        for metric_key, labels, value in metrics:
+            self.samples.setdefault(metric_key, []).append(
+                f"{metric_key}{format_labels(labels)} {float(value)} {seconds}"
+            )
+
+    def close(self) -> None:
+        """Write the buffered metrics."""
+        with open(self.output_path, "w") as output_file:
+            for metric_key, samples in self.samples.items():
+                output_file.write(f"# TYPE {metric_key} gauge\n")
+                output_file.write("\n".join(samples) + "\n")
+
+            output_file.write("# EOF\n")
+
+
+def backfill(
+    config_file_path: str,
+    dataset_name: str,
+    input_path: str,
+    output_path: str,
+    step: int | None = None,
+    time_bucket: str | None = None,
+    chunk_size: int = 100_000,
+    workers: int | None = None,
+    windows_per_task: int = 32,
+) -> None:
+    """Compute the drift metrics of every window of a production file.
+
+    Args:
+        config_file_path (str): path of the config.yaml file
+        dataset_name (str): name of the dataset the file belongs to
+        input_path (str): path of the csv or parquet production file
+        output_path (str): path of the csv or OpenMetrics (.om) output file
+        step (int | None): rows between two windows, defaults to the window size
+        time_bucket (str | None): a pandas frequency to use one window per time bucket instead
+        chunk_size (int): number of rows read at once
+        workers (int | None): number of worker processes, defaults to the number of cores
+        windows_per_task (int): maximum number of windows sent to a worker at once
+
+    Raises:
+        ValueError: if time buckets are used without a datetime column
+    """
+    configs = read_configs(config_file_path)
+    options = MonitoringServiceOptions(**configs["service"])
+    column_mapping = configs["datasets"][dataset_name]["column_mapping"]
+    datetime_column = column_mapping.get("datetime")
+    prediction = column_mapping.get("prediction")
+    columns = (column_mapping.get("numerical_features") or []) + (
+        column_mapping.get("categorical_features") or []
+    )
+    with_prediction = bool(prediction) and prediction in file_columns(
+        input_path
+    )
+
+    if with_prediction:
+        columns.append(prediction)
+
+    elif prediction:
+        logging.warning(
+            f"{input_path} has no {prediction} column, only the drift of the features is backfilled"
+        )
+
+    columns += [
+        column
+        for column in segment_columns(
+            configs["datasets"][dataset_name].get("segment_by") or []
+        )
+        if column not in columns
+    ]
+
+    if time_bucket is not None and not datetime_column:
+        raise ValueError("Time buckets need the datetime column of the dataset")
+
+    chunks = read_chunks(
+        input_path,
+        columns + ([datetime_column] if datetime_column else []),
+        chunk_size,
+        datetime_column,
+    )
+
+    if time_bucket is not None:
+        windows = time_bucket_windows(chunks, datetime_column, time_bucket)
+
+    else:
+        windows = row_windows(
+            chunks,
+            options.window_size,
+            step or options.window_size,
+            datetime_column,
+            windows_per_task,
+        )
+
+    writer = (
+        OpenMetricsWriter(output_path)
+        if output_path.endswith(".om")
+        else CsvWriter(output_path)
+    )
+    workers = workers or os.cpu_count()
+    started = time.perf_counter()
+    n_windows = 0
+    in_flight: deque[tuple[int, Future]] = deque()
+
+    def write_oldest() -> None:
+        """Wait for the oldest task and write its windows, keeping the output in order."""
+        nonlocal n_windows
+        block_position, future = in_flight.popleft()
+
+        for start, end, timestamp, metrics in future.result():
+            writer.write(
+                timestamp, block_position + start, block_position + end, metrics
+            )
+            n_windows += 1
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(config_file_path, dataset_name, with_prediction),
+    ) as executor:
+        for block_position, block, block_windows in windows:
+            in_flight.append(
+                (
+                    block_position,
+                    executor.submit(
+                        calculate_windows, dataset_name, block, block_windows
+                    ),
+                )
+            )
+
+            # Bound the memory held by the blocks waiting for a worker
+            if len(in_flight) >= 2 * workers:
+                write_oldest()
+
+        while in_flight:
+            write_oldest()
+
+    writer.close()
+    elapsed = time.perf_counter() - started
+    logging.info(
+        f"Computed {n_windows} windows in {elapsed:.1f} seconds, saved at path: {output_path}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recompute the drift metrics of a historical production file"
+    )
+    parser.add_argument(
+        "-i", "--input", required=True, help="Production csv or parquet file"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="Output csv file, or OpenMetrics file if it ends with .om",
+    )
+    parser.add_argument(
+        "-d",
+        "--dataset",
+        default="house_price_random_forest",
+        help="Dataset of config.yaml the file belongs to",
+    )
+    parser.add_argument(
+        "-c", "--config", default="config.yaml", help="Path of config.yaml"
+    )
+    parser.add_argument(
+        "-s",
+        "--step",
+        type=int,
+        default=None,
+        help="Rows between two windows, defaults to the window size",
+    )
+    parser.add_argument(
+        "-b",
+        "--time-bucket",
+        default=None,
+        help="One window per time bucket instead, e.g. 1D",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=100_000, help="Rows read at once"
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes, defaults to the number of cores",
+    )
+    args = parser.parse_args()
+
+    backfill(
+        config_file_path=args.config,
+        dataset_name=args.dataset,
+        input_path=args.input,
+        output_path=args.output,
+        step=args.step,
+        time_bucket=args.time_bucket,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+    )
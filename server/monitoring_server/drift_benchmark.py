@@ -0,0 +1,184 @@
+"""Compare the drift engines with Evidently's data drift monitor, on their p-values and speed."""
+import argparse
+import logging
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+from drift_engine import ParallelDataDriftMonitoring
+from evidently.model_monitoring import DataDriftMonitor, ModelMonitoring
+from evidently.options.data_drift import DataDriftOptions
+from evidently.pipeline.column_mapping import ColumnMapping
+from fast_drift import FastDataDriftMonitoring
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+
+
+def synthetic_data(
+    n_features: int, n_rows: int, shift: float, seed: int
+) -> pd.DataFrame:
+    """Generate features covering the tests of the drift engines.
+
+    A quarter of the numerical features have at most 5 values and are tested
+    on their value counts, a tenth of the values of every feature are missing,
+    and the categorical features get categories unseen in the reference when
+    shifted.
+
+    Args:
+        n_features (int): the number of numerical features, and of categorical ones
+        n_rows (int): the number of rows
+        shift (float): the shift of the distributions, 0 for the reference
+        seed (int): the seed of the generator
+
+    Returns:
+        pd.DataFrame: the numerical features num_*, then the categorical ones cat_*
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+
+    for index in range(n_features):
+        if index % 4 == 3:
+            values = rng.integers(0, 3 + index % 3, n_rows).astype(float)
+
+        else:
+            values = rng.normal(shift * index / n_features, 1, n_rows).round(2)
+
+        values[rng.random(n_rows) < 0.1] = np.nan
+        columns[f"num_{index}"] = values
+
+    for index in range(n_features):
+        n_categories = 2 + index % 8 + (shift > 0)
+        values = (
+            rng.integers(0, n_categories, n_rows).astype(str).astype(object)
+        )
+        values[rng.random(n_rows) < 0.1] = None
+        columns[f"cat_{index}"] = values
+
+    return pd.DataFrame(columns)
+
+
+def drift_values(monitoring) -> dict:
+    """Get the p-value and test of each feature from the metrics of a monitoring.
+
+    Args:
+        monitoring: Evidently's monitoring or a drift engine, after its execution
+
+    Returns:
+        dict: the test name and p-value of each feature
+    """
+    return {
+        labels["feature"]: (labels["stat_test"], value)
+        for metric, value, labels in monitoring.metrics()
+        if metric.name == "data_drift:value"
+    }
+
+
+def median_time(
+    monitoring, reference, current, column_mapping, repeats
+) -> float:
+    """Time the calculation of the drift of a window.
+
+    Args:
+        monitoring: Evidently's monitoring or a drift engine
+        reference (pd.DataFrame): the reference data
+        current (pd.DataFrame): the window
+        column_mapping (ColumnMapping): the numerical and categorical features
+        repeats (int): number of calculations measured
+
+    Returns:
+        float: the median duration in seconds
+    """
+    durations = []
+
+    for _ in range(repeats):
+        started = time.perf_counter()
+        monitoring.execute(reference, current, column_mapping)
+        list(monitoring.metrics())
+        durations.append(time.perf_counter() - started)
+
+    return statistics.median(durations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the drift engines with Evidently on synthetic data"
+    )
+    parser.add_argument(
+        "-f",
+        "--features",
+        type=int,
+        default=20,
+        help="Numerical features, and as many categorical ones",
+    )
+    parser.add_argument(
+        "--reference-rows",
+        type=int,
+        default=1000,
+        help="Reference rows, Evidently picks other tests above 1000",
+    )
+    parser.add_argument(
+        "-w", "--window", type=int, default=1000, help="Window rows"
+    )
+    parser.add_argument(
+        "-s",
+        "--shift",
+        type=float,
+        default=0.2,
+        help="Shift of the window distributions",
+    )
+    parser.add_argument(
+        "-r", "--repeats", type=int, default=10, help="Calculations measured"
+    )
+    args = parser.parse_args()
+
+    reference = synthetic_data(args.features, args.reference_rows, 0.0, 0)
+    current = synthetic_data(args.features, args.window, args.shift, 1)
+    column_mapping = ColumnMapping(
+        numerical_features=[f"num_{index}" for index in range(args.features)],
+        categorical_features=[f"cat_{index}" for index in range(args.features)],
+        target=None,
+        prediction=None,
+    )
+    options = DataDriftOptions(drift_share=1)
+    engines = {
+        "evidently": ModelMonitoring(
+            monitors=[DataDriftMonitor()], options=[options]
+        ),
+        "parallel_data_drift": ParallelDataDriftMonitoring(options=options),
+        "fast_data_drift": FastDataDriftMonitoring(options=options),
+    }
+    values = {}
+
+    for name, monitoring in engines.items():
+        monitoring.execute(reference, current, column_mapping)
+        values[name] = drift_values(monitoring)
+
+    # Above 1000 reference rows, the engines are compared with each other
+    expected = values[
+        "evidently" if args.reference_rows <= 1000 else "parallel_data_drift"
+    ]
+
+    for name in ("parallel_data_drift", "fast_data_drift"):
+        tests = sum(
+            values[name][feature][0] == stat_test
+            for feature, (stat_test, _) in expected.items()
+        )
+        difference = max(
+            abs(values[name][feature][1] - p_value)
+            for feature, (_, p_value) in expected.items()
+        )
+        logging.info(
+            f"{name}: same test for {tests} of {len(expected)} features, "
+            f"largest p-value difference {difference:.2e}"
+        )
+
+    for name, monitoring in engines.items():
+        duration = median_time(
+            monitoring, reference, current, column_mapping, args.repeats
+        )
+        logging.info(f"{name}: {duration * 1000:.1f}ms per window")
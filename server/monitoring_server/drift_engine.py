@@ -0,0 +1,442 @@
+"""Drift engine evaluating the feature drift tests of a dataset in parallel."""
+import logging
+import weakref
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Generator
+
+import numpy as np
+import pandas as pd
+from evidently.options.data_drift import DataDriftOptions
+from evidently.pipeline.column_mapping import ColumnMapping
+from scipy.stats import chisquare, ks_2samp, norm
+
+# Evidently's default threshold for its p-value based statistical tests
+DEFAULT_THRESHOLD = 0.05
+# Evidently picks the tests of the drift engines for references up to this many rows, distance based tests above
+MAX_EVIDENTLY_REFERENCE_ROWS = 1000
+
+
+@dataclass(frozen=True)
+class DriftMetric:
+    """Name of a metric, mirroring the metrics yielded by Evidently's monitors."""
+
+    name: str
+
+
+SHARE_DRIFTED_FEATURES = DriftMetric("data_drift:share_drifted_features")
+N_DRIFTED_FEATURES = DriftMetric("data_drift:n_drifted_features")
+DATASET_DRIFT = DriftMetric("data_drift:dataset_drift")
+DRIFT_VALUE = DriftMetric("data_drift:value")
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    """Description of a NumPy array stored in shared memory, cheap to pickle."""
+
+    name: str
+    shape: tuple
+    dtype: str
+
+
+@dataclass
+class FeatureDrift:
+    """Result of the drift test of a single feature."""
+
+    feature: str
+    feature_type: str
+    stat_test: str
+    p_value: float
+    drift_detected: bool
+
+
+def share_array(array: np.ndarray) -> tuple:
+    """Copy an array into a new shared memory block.
+
+    Args:
+        array (np.ndarray): the array to share
+
+    Returns:
+        tuple: the shared memory block and its description
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block, SharedArray(block.name, array.shape, array.dtype.str)
+
+
+def release(block: shared_memory.SharedMemory) -> None:
+    """Close and free a shared memory block created by `share_array`.
+
+    Args:
+        block (shared_memory.SharedMemory): the block to free
+    """
+    block.close()
+    block.unlink()
+
+
+def feature_drift(
+    reference: np.ndarray,
+    current: np.ndarray,
+    feature_type: str,
+    threshold: float,
+) -> tuple:
+    """Run the default Evidently statistical test between two samples.
+
+    The test is selected the way Evidently does for references up to 1000
+    rows: K-S for numerical features with more than 5 values, chi-square for
+    more than 2 values and the Z-test for binary features.
+
+    Args:
+        reference (np.ndarray): the reference values, NaNs excluded
+        current (np.ndarray): the current values, NaNs excluded
+        feature_type (str): either "num" or "cat"
+        threshold (float): the p-value under which drift is detected
+
+    Returns:
+        tuple: the test name, its p-value and whether drift is detected
+    """
+    values = np.concatenate([reference, current])
+
+    # Counting the distinct values by hashing is cheaper than sorting them
+    if feature_type == "num" and len(pd.unique(values)) > 5:
+        p_value = ks_2samp(reference, current)[1]
+        return "K-S p_value", p_value, bool(p_value <= threshold)
+
+    keys, inverse = np.unique(values, return_inverse=True)
+    n_reference = len(reference)
+    reference_counts = np.bincount(inverse[:n_reference], minlength=len(keys))
+    current_counts = np.bincount(inverse[n_reference:], minlength=len(keys))
+
+    if len(keys) > 2:
+        expected = reference_counts * (len(current) / len(reference))
+        p_value = chisquare(current_counts, expected)[1]
+        return "chi-square p_value", p_value, bool(p_value < threshold)
+
+    if len(keys) == 1:
+        p_value = 1.0
+
+    else:
+        # Share of the rows not equal to the smallest value
+        p1 = reference_counts[1] / len(reference)
+        p2 = current_counts[1] / len(current)
+        p = (reference_counts[1] + current_counts[1]) / (
+            len(reference) + len(current)
+        )
+        z_stat = (p1 - p2) / np.sqrt(
+            p * (1 - p) * (1.0 / len(reference) + 1.0 / len(current))
+        )
+        p_value = 2 * (1 - norm.cdf(np.abs(z_stat)))
+
+    return "Z-test p_value", p_value, bool(p_value < threshold)
+
+
+def evaluate_features(
+    reference: np.ndarray,
+    current: np.ndarray,
+    tasks: list,
+) -> list:
+    """Evaluate the drift of some columns of the reference and current matrices.
+
+    Args:
+        reference (np.ndarray): the encoded reference, one column per feature
+        current (np.ndarray): the encoded current window, one column per feature
+        tasks (list): (column index, feature, feature type, threshold) tuples
+
+    Returns:
+        list: the FeatureDrift of each task
+    """
+    results = []
+
+    for index, feature, feature_type, threshold in tasks:
+        reference_column = reference[:, index]
+        current_column = current[:, index]
+        stat_test, p_value, drift_detected = feature_drift(
+            reference_column[np.isfinite(reference_column)],
+            current_column[np.isfinite(current_column)],
+            feature_type,
+            threshold,
+        )
+        results.append(
+            FeatureDrift(
+                feature, feature_type, stat_test, p_value, drift_detected
+            )
+        )
+
+    return results
+
+
+def evaluate_shared_features(
+    reference: SharedArray, current: SharedArray, tasks: list
+) -> list:
+    """Process pool entry point, evaluating features from shared memory.
+
+    Args:
+        reference (SharedArray): the encoded reference in shared memory
+        current (SharedArray): the encoded current window in shared memory
+        tasks (list): (column index, feature, feature type, threshold) tuples
+
+    Returns:
+        list: the FeatureDrift of each task
+    """
+    blocks = [
+        shared_memory.SharedMemory(name=shared.name)
+        for shared in (reference, current)
+    ]
+    arrays = [
+        np.ndarray(shared.shape, dtype=shared.dtype, buffer=block.buf)
+        for shared, block in zip((reference, current), blocks)
+    ]
+
+    try:
+        return evaluate_features(*arrays, tasks)
+
+    finally:
+        # The views must be gone before the blocks can be closed
+        del arrays
+        for block in blocks:
+            block.close()
+
+
+class FeatureEncoder:
+    """Encode the features of a dataset as a float matrix, categories as codes.
+
+    The codes of the reference categories are fixed once, values unseen in
+    the reference get new codes as they arrive.
+    """
+
+    def __init__(self, reference: pd.DataFrame, column_mapping: ColumnMapping):
+        """Initialise the encoder from the reference data.
+
+        Args:
+            reference (pd.DataFrame): the reference data
+            column_mapping (ColumnMapping): the numerical and categorical features
+        """
+        self.numerical_features = list(column_mapping.numerical_features or [])
+        self.categorical_features = list(
+            column_mapping.categorical_features or []
+        )
+        self.categories = {
+            feature: pd.Index(np.asarray(reference[feature].dropna().unique()))
+            for feature in self.categorical_features
+        }
+        self.reference = self.encode(reference)
+
+    @property
+    def features(self) -> list:
+        """Features in the column order of the encoded matrices, categorical first.
+
+        Returns:
+            list: (feature, feature type) pairs
+        """
+        return [(feature, "cat") for feature in self.categorical_features] + [
+            (feature, "num") for feature in self.numerical_features
+        ]
+
+    def encode(self, data: pd.DataFrame) -> np.ndarray:
+        """Encode a data frame into a float matrix, NaN for missing values.
+
+        Args:
+            data (pd.DataFrame): the data to encode
+
+        Returns:
+            np.ndarray: a matrix with one column per feature
+        """
+        encoded = np.empty((len(data), len(self.features)), dtype=np.float64)
+
+        for index, (feature, feature_type) in enumerate(self.features):
+            column = data[feature]
+
+            if feature_type == "num":
+                encoded[:, index] = column.to_numpy(dtype=np.float64)
+                continue
+
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                # Map the categories of the column once rather than every value
+                values = column.cat.categories
+
+            else:
+                values = column
+
+            unseen = values[~values.isin(self.categories[feature])]
+            unseen = np.asarray(unseen.dropna().unique())
+
+            if len(unseen):
+                self.categories[feature] = self.categories[feature].append(
+                    pd.Index(unseen)
+                )
+
+            codes = self.categories[feature].get_indexer(values)
+
+            if values is not column:
+                # The missing values have the code -1, which picks the appended -1
+                codes = np.append(codes, -1)[column.cat.codes.to_numpy()]
+
+            encoded[:, index] = np.where(codes < 0, np.nan, codes)
+
+        return encoded
+
+
+class ParallelDataDriftMonitoring:
+    """Data drift monitoring splitting the feature tests across a process pool.
+
+    It can be used in place of Evidently's `ModelMonitoring` with a
+    `DataDriftMonitor`, yielding the same `data_drift:*` metrics. The encoded
+    reference and window are shared with the workers through shared memory
+    instead of pickling the data frames.
+    """
+
+    def __init__(
+        self,
+        options: DataDriftOptions,
+        executor: Executor | None = None,
+        workers: int = 1,
+        min_features_per_task: int = 8,
+    ) -> None:
+        """Initialise the monitoring.
+
+        Args:
+            options (DataDriftOptions): the drift share and thresholds to use
+            executor (Executor | None): the process pool, features are evaluated in process without one
+            workers (int): the number of processes of the pool
+            min_features_per_task (int): smallest number of features sent to a worker at once
+        """
+        self.options = options
+        self.executor = executor
+        self.workers = workers
+        self.min_features_per_task = min_features_per_task
+        self.encoder = None
+        # The reference prepared last, weakly referenced since the ids of collected objects are reused
+        self.prepared = None
+        self.reference_block = None
+        self.results = []
+
+    def threshold(self, feature: str, feature_type: str) -> float:
+        """Get the p-value threshold of a feature.
+
+        Args:
+            feature (str): name of the feature
+            feature_type (str): either "num" or "cat"
+
+        Returns:
+            float: the threshold
+        """
+        threshold = self.options.get_threshold(feature, feature_type)
+        return DEFAULT_THRESHOLD if threshold is None else threshold
+
+    def prepare_reference(
+        self, reference_data: pd.DataFrame, column_mapping: ColumnMapping
+    ) -> None:
+        """Encode the reference and move it to shared memory once.
+
+        Args:
+            reference_data (pd.DataFrame): the reference data
+            column_mapping (ColumnMapping): the numerical and categorical features
+        """
+        if self.prepared is not None and self.prepared() is reference_data:
+            return
+
+        self.close()
+        self.encoder = FeatureEncoder(reference_data, column_mapping)
+        self.prepared = weakref.ref(reference_data)
+
+    def split_tasks(self) -> list:
+        """Split the features into one task list per worker.
+
+        Returns:
+            list: lists of (column index, feature, feature type, threshold)
+        """
+        tasks = [
+            (
+                index,
+                feature,
+                feature_type,
+                self.threshold(feature, feature_type),
+            )
+            for index, (feature, feature_type) in enumerate(
+                self.encoder.features
+            )
+        ]
+        n_chunks = min(
+            self.workers, max(len(tasks) // self.min_features_per_task, 1)
+        )
+        # Round robin, so each worker gets a mix of numerical and categorical features
+        return [tasks[chunk::n_chunks] for chunk in range(n_chunks)]
+
+    def execute(
+        self,
+        reference_data: pd.DataFrame,
+        current_data: pd.DataFrame,
+        column_mapping: ColumnMapping,
+    ) -> None:
+        """Calculate the drift of every feature between the reference and current data.
+
+        Args:
+            reference_data (pd.DataFrame): the reference data
+            current_data (pd.DataFrame): the current window
+            column_mapping (ColumnMapping): the numerical and categorical features
+        """
+        self.prepare_reference(reference_data, column_mapping)
+        current = self.encoder.encode(current_data)
+        chunks = self.split_tasks()
+
+        if self.executor is None or len(chunks) == 1:
+            self.results = evaluate_features(
+                self.encoder.reference, current, chunks[0]
+            )
+            return
+
+        if self.reference_block is None:
+            self.reference_block = share_array(self.encoder.reference)
+
+        current_block, current_shared = share_array(current)
+
+        try:
+            futures = [
+                self.executor.submit(
+                    evaluate_shared_features,
+                    self.reference_block[1],
+                    current_shared,
+                    chunk,
+                )
+                for chunk in chunks
+            ]
+            results = [result for f in futures for result in f.result()]
+
+        finally:
+            release(current_block)
+
+        order = {
+            feature: index
+            for index, (feature, _) in enumerate(self.encoder.features)
+        }
+        self.results = sorted(results, key=lambda result: order[result.feature])
+
+    def metrics(self) -> Generator[tuple, None, None]:
+        """Yield the metrics of the last calculation, as Evidently's `DataDriftMonitor` does.
+
+        Yields:
+            tuple: the metric, its value and its labels
+        """
+        n_drifted = sum(result.drift_detected for result in self.results)
+        share_drifted = n_drifted / len(self.results) if self.results else 0.0
+
+        yield SHARE_DRIFTED_FEATURES, share_drifted, None
+        yield N_DRIFTED_FEATURES, n_drifted, None
+        yield DATASET_DRIFT, bool(
+            self.results and share_drifted >= self.options.drift_share
+        ), None
+
+        for result in self.results:
+            yield DRIFT_VALUE, result.p_value, dict(
+                feature=result.feature,
+                feature_type=result.feature_type,
+                stat_test=result.stat_test,
+            )
+
+    def close(self) -> None:
+        """Free the shared memory holding the reference."""
+        if self.reference_block is not None:
+            release(self.reference_block[0])
+            self.reference_block = None
+            logging.info("Released the shared reference of the drift engine")
@@ -0,0 +1,202 @@
+"""Compact storage types of the monitored features of a dataset."""
+import logging
+
+import numpy as np
+import pandas as pd
+from evidently.pipeline.column_mapping import ColumnMapping
+
+CATEGORY = "category"
+# Storage types of the numerical features, from the most to the least compact
+NUMERICAL_DTYPES = ("int8", "int16", "int32", "int64", "float32", "float64")
+
+
+def fits(values: np.ndarray, dtype: str, exact: bool = True) -> bool:
+    """Check whether values can be stored with a type.
+
+    Args:
+        values (np.ndarray): the values, as floats
+        dtype (str): one of NUMERICAL_DTYPES
+        exact (bool): whether float32 must represent the values exactly
+
+    Returns:
+        bool: True if the values can be stored with the type
+    """
+    if dtype == "float64":
+        return True
+
+    if dtype == "float32":
+        return not exact or np.array_equal(
+            values.astype(np.float32), values, equal_nan=True
+        )
+
+    if not len(values):
+        return True
+
+    if not np.isfinite(values).all() or (values != np.round(values)).any():
+        return False
+
+    info = np.iinfo(dtype)
+    return bool(values.min() >= info.min and values.max() <= info.max)
+
+
+def bytes_per_row(data: pd.DataFrame) -> float:
+    """Measure the memory used by the rows of a data frame.
+
+    Args:
+        data (pd.DataFrame): the data to measure
+
+    Returns:
+        float: the bytes used per row, the index excluded
+    """
+    if data.empty:
+        return 0.0
+
+    return data.memory_usage(index=False, deep=True).sum() / len(data)
+
+
+class DtypePlan:
+    """Storage types of the monitored features of a dataset.
+
+    Integers are stored with the smallest integer type holding the reference,
+    floats as float32 when it represents the reference exactly and categorical
+    features as pandas categoricals, so as their codes. The types can also be
+    declared in the config file, float32 then rounds the values. Incoming rows
+    not fitting a type widen it rather than being truncated.
+    """
+
+    def __init__(
+        self, column_mapping: ColumnMapping, declared: dict | None = None
+    ) -> None:
+        """Initialise the plan.
+
+        Args:
+            column_mapping (ColumnMapping): the numerical and categorical features
+            declared (dict | None): the storage type of some features, inferred for the others
+
+        Raises:
+            ValueError: if a declared type is unknown or a numerical feature is declared as category
+        """
+        self.numerical_features = list(column_mapping.numerical_features or [])
+        self.categorical_features = list(
+            column_mapping.categorical_features or []
+        )
+        self.declared = dict(declared or {})
+        self.dtypes = {}
+
+        for feature, dtype in self.declared.items():
+            if dtype not in NUMERICAL_DTYPES + (CATEGORY,):
+                raise ValueError(f"Unknown storage type {dtype} of {feature}")
+
+            if dtype == CATEGORY and feature in self.numerical_features:
+                raise ValueError(
+                    f"Numerical feature {feature} cannot be stored as category"
+                )
+
+    def fit(self, reference: pd.DataFrame) -> pd.DataFrame:
+        """Choose the storage types from the reference and convert it.
+
+        Args:
+            reference (pd.DataFrame): the monitored features of the reference
+
+        Returns:
+            pd.DataFrame: the reference with the planned types
+        """
+        for feature in self.numerical_features + self.categorical_features:
+            column = reference[feature]
+            dtype = self.declared.get(feature)
+
+            if dtype is None and feature in self.categorical_features:
+                dtype = CATEGORY
+
+            if dtype == CATEGORY:
+                if isinstance(column.dtype, pd.CategoricalDtype):
+                    self.dtypes[feature] = column.dtype
+
+                else:
+                    categories = pd.unique(column.dropna())
+                    self.dtypes[feature] = pd.CategoricalDtype(categories)
+
+            elif not pd.api.types.is_numeric_dtype(column):
+                logging.error(f"Feature {feature} is not numerical, kept as is")
+
+            elif dtype is not None:
+                self.dtypes[feature] = np.dtype(dtype)
+
+            else:
+                values = column.to_numpy(dtype=np.float64)
+                self.dtypes[feature] = np.dtype(
+                    next(d for d in NUMERICAL_DTYPES if fits(values, d))
+                )
+
+        return self.convert(reference)
+
+    def convert(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Convert the columns of a data frame not stored with the planned types.
+
+        Args:
+            data (pd.DataFrame): the data to convert
+
+        Returns:
+            pd.DataFrame: the data with the planned types
+        """
+        dtypes = {
+            feature: dtype
+            for feature, dtype in self.dtypes.items()
+            if data[feature].dtype != dtype
+        }
+
+        if not dtypes:
+            return data
+
+        return data.astype(dtypes)
+
+    def apply(self, data: pd.DataFrame) -> tuple:
+        """Convert incoming rows, widening the types they do not fit in.
+
+        Args:
+            data (pd.DataFrame): the incoming rows
+
+        Returns:
+            tuple: the converted rows and whether a type was widened
+        """
+        widened = False
+
+        for feature, dtype in self.dtypes.items():
+            column = data[feature]
+
+            if isinstance(dtype, pd.CategoricalDtype):
+                unseen = pd.unique(
+                    column[~column.isin(dtype.categories)].dropna()
+                )
+
+                if len(unseen):
+                    self.dtypes[feature] = pd.CategoricalDtype(
+                        dtype.categories.append(pd.Index(unseen))
+                    )
+                    widened = True
+
+                continue
+
+            if not pd.api.types.is_numeric_dtype(column):
+                continue
+
+            values = column.to_numpy(dtype=np.float64)
+            exact = feature not in self.declared
+
+            if fits(values, dtype.name, exact):
+                continue
+
+            # The window already holds values of the current type, they must fit the wider one
+            self.dtypes[feature] = np.dtype(
+                next(
+                    d
+                    for d in NUMERICAL_DTYPES
+                    if np.can_cast(dtype, d) and fits(values, d, exact)
+                )
+            )
+            widened = True
+            logging.info(
+                f"Storage type of {feature} widened from {dtype} to {self.dtypes[feature]}"
+            )
+
+        return self.convert(data), widened
@@ -0,0 +1,28 @@
+"""Gunicorn settings of the metric server.
+
+Each worker starts loading the references as soon as it is forked. With
+reference_store_path set in config.yaml, the first worker stores the
+references and every worker memory maps them, so the page cache holds a single
+copy of them whatever the number of workers. Each worker keeps the windows of
+the rows it receives and exports its own metrics.
+"""
+import os
+
+bind = "0.0.0.0:8085"
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+# The requests are served while the ingest worker, the file tailer and the
+# reloads run in the background threads of the worker
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+
+def post_fork(server, worker) -> None:
+    """Start loading the monitoring service in a worker once it is forked.
+
+    Args:
+        server (gunicorn.arbiter.Arbiter): the master process
+        worker (gunicorn.workers.base.Worker): the forked worker
+    """
+    from metric_server import start_service
+
+    start_service()
@@ -0,0 +1,153 @@
+"""Drift of the features over several horizons of the latest rows of a dataset."""
+from typing import Generator
+
+import numpy as np
+import pandas as pd
+from drift_engine import DEFAULT_THRESHOLD, DriftMetric, FeatureEncoder
+from evidently.options.data_drift import DataDriftOptions
+from evidently.pipeline.column_mapping import ColumnMapping
+from scipy.stats import ks_2samp
+from segments import count_tests, stacked_counts
+
+HORIZON_DRIFT_VALUE = DriftMetric("horizon_drift:value")
+HORIZON_SHARE_DRIFTED_FEATURES = DriftMetric(
+    "horizon_drift:share_drifted_features"
+)
+HORIZON_N_DRIFTED_FEATURES = DriftMetric("horizon_drift:n_drifted_features")
+HORIZON_DATASET_DRIFT = DriftMetric("horizon_drift:dataset_drift")
+
+
+class HorizonDrift:
+    """Data drift of nested windows of the latest rows, e.g. the last 100, 1000 and 10000.
+
+    The horizons are views of the end of one buffer. The buffer is encoded
+    once and split into bands, the rows newer than the shortest horizon, then
+    the rows between two consecutive horizons. The value counts of each band
+    are summed cumulatively to get the counts of each horizon, so every row is
+    counted once whatever the number of horizons, and the tests based on value
+    counts are run for all the horizons at once. K-S runs on the view of each
+    horizon. The tests are the ones of the drift engine, so a horizon yields
+    the p-values Evidently would on its rows.
+    """
+
+    def __init__(
+        self,
+        reference: pd.DataFrame,
+        column_mapping: ColumnMapping,
+        horizons: list,
+        options: DataDriftOptions,
+    ) -> None:
+        """Encode the reference.
+
+        Args:
+            reference (pd.DataFrame): the reference data
+            column_mapping (ColumnMapping): the numerical and categorical features
+            horizons (list): the number of latest rows of each window
+            options (DataDriftOptions): the drift share and thresholds to use
+        """
+        self.horizons = np.array(sorted(set(horizons)))
+        self.options = options
+        self.encoder = FeatureEncoder(reference, column_mapping)
+        self.reference = [
+            values[np.isfinite(values)] for values in self.encoder.reference.T
+        ]
+        self.results = {}
+
+    def threshold(self, feature: str, feature_type: str) -> float:
+        """Get the p-value threshold of a feature.
+
+        Args:
+            feature (str): name of the feature
+            feature_type (str): either "num" or "cat"
+
+        Returns:
+            float: the threshold
+        """
+        threshold = self.options.get_threshold(feature, feature_type)
+        return DEFAULT_THRESHOLD if threshold is None else threshold
+
+    def execute(self, buffer: pd.DataFrame) -> None:
+        """Calculate the drift of every feature over each horizon filled by the buffer.
+
+        Args:
+            buffer (pd.DataFrame): the latest rows, the newest last
+        """
+        horizons = self.horizons[self.horizons <= len(buffer)]
+        self.results = {horizon: [] for horizon in horizons}
+
+        if not len(horizons):
+            return
+
+        current = self.encoder.encode(buffer.tail(horizons[-1]))
+        # Band of each row, 0 for the rows within the shortest horizon
+        age = np.arange(len(current))[::-1]
+        bands = np.searchsorted(horizons, age, side="right")
+
+        for index, (feature, feature_type) in enumerate(self.encoder.features):
+            reference_values = self.reference[index]
+            values = current[:, index]
+            finite = np.isfinite(values)
+            keys, inverse = np.unique(
+                np.concatenate([reference_values, values[finite]]),
+                return_inverse=True,
+            )
+            shape = (len(horizons), max(len(keys), 1))
+            n_reference = len(reference_values)
+            reference_counts = np.broadcast_to(
+                np.bincount(inverse[:n_reference], minlength=shape[1]), shape
+            )
+            current_counts = np.cumsum(
+                stacked_counts(bands[finite], inverse[n_reference:], shape),
+                axis=0,
+            )
+            p_values, distinct, stat_tests = count_tests(
+                reference_counts, current_counts
+            )
+            threshold = self.threshold(feature, feature_type)
+
+            for position, horizon in enumerate(horizons):
+                if not current_counts[position].sum() or not n_reference:
+                    continue
+
+                if feature_type == "num" and distinct[position] > 5:
+                    horizon_values = values[-horizon:]
+                    p_value = ks_2samp(
+                        reference_values,
+                        horizon_values[np.isfinite(horizon_values)],
+                    )[1]
+                    drift_detected = bool(p_value <= threshold)
+                    stat_test = "K-S p_value"
+
+                else:
+                    p_value = float(p_values[position])
+                    drift_detected = bool(p_value < threshold)
+                    stat_test = str(stat_tests[position])
+
+                self.results[horizon].append(
+                    (feature, feature_type, stat_test, p_value, drift_detected)
+                )
+
+    def metrics(self) -> Generator[tuple, None, None]:
+        """Yield the data drift metrics of each horizon, labelled by window.
+
+        Yields:
+            tuple: the metric, its value and its labels
+        """
+        for horizon, results in self.results.items():
+            window = dict(window=str(horizon))
+            n_drifted = sum(result[-1] for result in results)
+            share_drifted = n_drifted / len(results) if results else 0.0
+
+            yield HORIZON_SHARE_DRIFTED_FEATURES, share_drifted, window
+            yield HORIZON_N_DRIFTED_FEATURES, n_drifted, window
+            yield HORIZON_DATASET_DRIFT, bool(
+                results and share_drifted >= self.options.drift_share
+            ), window
+
+            for feature, feature_type, stat_test, p_value, _ in results:
+                yield HORIZON_DRIFT_VALUE, p_value, dict(
+                    feature=feature,
+                    feature_type=feature_type,
+                    stat_test=stat_test,
+                    **window,
+                )
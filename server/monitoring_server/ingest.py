@@ -0,0 +1,212 @@
+"""Bounded ingestion of the rows sent to the metric server, shedding load under spikes."""
+import logging
+import threading
+from collections import deque
+from collections.abc import Callable
+
+import pandas as pd
+from prometheus_client import Counter, Gauge
+
+# What to do with the rows arriving while the queue of a dataset is full
+DROP_OLDEST = "drop_oldest"
+SAMPLE = "sample"
+REJECT = "reject"
+INGEST_POLICIES = (DROP_OLDEST, SAMPLE, REJECT)
+
+
+class IngestQueue:
+    """Rows of a dataset waiting to be added to its window."""
+
+    def __init__(self) -> None:
+        """Initialise an empty queue."""
+        self.requests = deque()
+        self.n_rows = 0
+        self.offered = 0
+        self.arrivals = 0
+        self.pending = False
+
+    def drain(self) -> tuple:
+        """Take all the queued rows.
+
+        Returns:
+            tuple: the queued rows and the number of rows offered since the last drain
+        """
+        rows = [row for request in self.requests for row in request]
+        offered = self.offered
+        self.requests.clear()
+        self.n_rows = 0
+        self.offered = 0
+        self.pending = False
+        return rows, offered
+
+
+class Ingestor:
+    """Bounded per dataset queues drained by a single worker thread.
+
+    The requests only queue their rows, the worker adds all the rows queued for
+    a dataset to its window at once, serving the datasets in turn. When the
+    queue of a dataset is full, the rows are shed according to the policy:
+
+    - drop_oldest: the oldest queued rows make room for the new ones
+    - sample: once the queue is half full, only 1 in `sample_every` rows is queued
+    - reject: the new rows are refused, the request answered with 429
+
+    Whatever the policy, the rows which would take the queue past `max_rows`
+    are shed, so a single large request cannot overflow it.
+
+    The share of the offered rows which reached the window is exported, so the
+    drift metrics of a sampled window can be interpreted.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[str, pd.DataFrame], None],
+        max_rows: int,
+        policy: str = SAMPLE,
+        sample_every: int = 10,
+    ) -> None:
+        """Initialise the queues.
+
+        Args:
+            process (Callable[[str, pd.DataFrame], None]): adds rows to the window of a dataset
+            max_rows (int): the maximum number of rows queued per dataset
+            policy (str): one of INGEST_POLICIES
+            sample_every (int): keep 1 in this many rows when sampling
+
+        Raises:
+            ValueError: if the policy is unknown
+        """
+        if policy not in INGEST_POLICIES:
+            raise ValueError(
+                f"Unknown ingest policy {policy}, expected one of {INGEST_POLICIES}"
+            )
+
+        self.process = process
+        self.max_rows = max_rows
+        self.policy = policy
+        self.sample_every = max(sample_every, 1)
+        self.queues = {}
+        # Datasets with queued rows, in the order the worker serves them
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.shed_rows = Counter(
+            "Evidently:shed_rows",
+            "Rows not added to the window because the ingest queue was full",
+            labelnames=["dataset_name", "reason"],
+        )
+        self.queued_rows = Gauge(
+            "Evidently:ingest_queue_rows",
+            "Rows waiting in the ingest queue",
+            labelnames=["dataset_name"],
+        )
+        self.sampling_rate = Gauge(
+            "Evidently:ingest_sampling_rate",
+            "Share of the rows received which were added to the window",
+            labelnames=["dataset_name"],
+        )
+        self.worker = threading.Thread(
+            target=self.run, name="ingest-worker", daemon=True
+        )
+        self.worker.start()
+
+    def shed(self, dataset_name: str, reason: str, n_rows: int) -> None:
+        """Count shed rows.
+
+        Args:
+            dataset_name (str): name of the dataset
+            reason (str): why the rows were shed
+            n_rows (int): the number of rows shed
+        """
+        if n_rows:
+            self.shed_rows.labels(dataset_name=dataset_name, reason=reason).inc(
+                n_rows
+            )
+
+    def put(self, dataset_name: str, rows: list) -> bool:
+        """Queue the rows of a request.
+
+        Args:
+            dataset_name (str): name of the dataset
+            rows (list): the rows, as dictionaries
+
+        Returns:
+            bool: False if the rows were rejected
+        """
+        with self.condition:
+            queue = self.queues.setdefault(dataset_name, IngestQueue())
+            queue.offered += len(rows)
+            full = queue.n_rows + len(rows) > self.max_rows
+
+            if self.policy == REJECT and full:
+                self.shed(dataset_name, "rejected", len(rows))
+                return False
+
+            if self.policy == SAMPLE and queue.n_rows >= self.max_rows // 2:
+                kept = []
+
+                for row in rows:
+                    if queue.arrivals % self.sample_every == 0:
+                        kept.append(row)
+
+                    queue.arrivals += 1
+
+                self.shed(dataset_name, "sampled_out", len(rows) - len(kept))
+                rows = kept
+
+            if self.policy == DROP_OLDEST:
+                if len(rows) > self.max_rows:
+                    keep = self.max_rows
+                    self.shed(dataset_name, "dropped", len(rows) - keep)
+                    rows = rows[-keep:]
+
+                while (
+                    queue.requests and queue.n_rows + len(rows) > self.max_rows
+                ):
+                    dropped = queue.requests.popleft()
+                    queue.n_rows -= len(dropped)
+                    self.shed(dataset_name, "dropped", len(dropped))
+
+            # Whatever the policy and the size of the request, the queue holds at most max_rows rows
+            room = max(self.max_rows - queue.n_rows, 0)
+
+            if len(rows) > room:
+                self.shed(dataset_name, "queue_full", len(rows) - room)
+                rows = rows[:room]
+
+            if not rows:
+                return True
+
+            if not queue.pending:
+                queue.pending = True
+                self.pending.append(dataset_name)
+
+            queue.requests.append(rows)
+            queue.n_rows += len(rows)
+            self.queued_rows.labels(dataset_name=dataset_name).set(queue.n_rows)
+            self.condition.notify()
+
+        return True
+
+    def run(self) -> None:
+        """Add the queued rows to the windows, one dataset after the other."""
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+
+                dataset_name = self.pending.popleft()
+                rows, offered = self.queues[dataset_name].drain()
+                self.queued_rows.labels(dataset_name=dataset_name).set(0)
+
+            if not rows:
+                continue
+
+            self.sampling_rate.labels(dataset_name=dataset_name).set(
+                len(rows) / offered
+            )
+
+            try:
+                self.process(dataset_name, pd.DataFrame.from_records(rows))
+
+            except Exception:
+                logging.exception(f"Failed to process rows of {dataset_name}")
@@ -0,0 +1,163 @@
+"""Bounded store of the predictions waiting for their ground truth labels."""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from prometheus_client import Counter, Gauge
+
+
+def regression_quality(target: np.ndarray, prediction: np.ndarray) -> dict:
+    """Calculate the regression quality metrics of labelled predictions.
+
+    The metrics are the ones of Evidently's regression performance monitor,
+    with the same definitions.
+
+    Args:
+        target (np.ndarray): the ground truth
+        prediction (np.ndarray): the predictions
+
+    Returns:
+        dict: the value of each metric
+    """
+    error = prediction - target
+    abs_error = np.abs(error)
+    abs_perc_error = abs_error / np.maximum(target, np.finfo(np.float64).eps)
+    return {
+        "mean_error": float(np.mean(error)),
+        "mean_abs_error": float(np.mean(abs_error)),
+        "mean_abs_perc_error": float(100.0 * np.mean(abs_perc_error)),
+        "error_std": float(np.std(error, ddof=1)),
+        "abs_error_std": float(np.std(abs_error, ddof=1)),
+        "abs_perc_error_std": float(np.std(abs_perc_error, ddof=1)),
+    }
+
+
+class LabelStore:
+    """Predictions of each dataset indexed by request id until their label arrives.
+
+    The predictions are kept in insertion order, so the oldest ones are evicted
+    first in O(1) once a dataset holds `max_rows` predictions or when they are
+    older than `ttl_sec`. A label joins its prediction with a single lookup,
+    which also removes it from the store. The memory used is bounded whatever
+    the prediction volume, labels arriving after their prediction was evicted
+    are counted and dropped.
+    """
+
+    def __init__(self, max_rows: int, ttl_sec: float | None = None) -> None:
+        """Initialise the store.
+
+        Args:
+            max_rows (int): the maximum number of predictions kept per dataset
+            ttl_sec (float | None): seconds a prediction waits for its label, forever when None
+        """
+        self.max_rows = max_rows
+        self.ttl_sec = ttl_sec
+        self.rows = {}
+        self.lock = threading.Lock()
+        self.labels = Counter(
+            "Evidently:labels",
+            "Labels received, by whether their prediction was found",
+            labelnames=["dataset_name", "outcome"],
+        )
+        self.evictions = Counter(
+            "Evidently:unlabelled_evictions",
+            "Predictions evicted before their label arrived",
+            labelnames=["dataset_name", "reason"],
+        )
+        self.pending = Gauge(
+            "Evidently:unlabelled_rows",
+            "Predictions waiting for their label",
+            labelnames=["dataset_name"],
+        )
+
+    def evict(self, dataset_name: str, rows: OrderedDict, now: float) -> None:
+        """Evict the predictions above the cap, then the expired ones.
+
+        Args:
+            dataset_name (str): name of the dataset
+            rows (OrderedDict): the predictions of the dataset, the oldest first
+            now (float): the monotonic time
+        """
+        over = len(rows) - self.max_rows
+
+        for _ in range(max(over, 0)):
+            rows.popitem(last=False)
+
+        if over > 0:
+            self.evictions.labels(
+                dataset_name=dataset_name, reason="capacity"
+            ).inc(over)
+
+        if self.ttl_sec is None:
+            return
+
+        expired = 0
+
+        while rows and now - next(iter(rows.values()))[0] > self.ttl_sec:
+            rows.popitem(last=False)
+            expired += 1
+
+        if expired:
+            self.evictions.labels(
+                dataset_name=dataset_name, reason="expired"
+            ).inc(expired)
+
+    def put(
+        self, dataset_name: str, request_ids: pd.Series, rows: pd.DataFrame
+    ) -> None:
+        """Keep the predictions of a batch of requests.
+
+        Args:
+            dataset_name (str): name of the dataset
+            request_ids (pd.Series): the request id of each row, rows without one are not kept
+            rows (pd.DataFrame): the monitored columns of the rows, the prediction included
+        """
+        now = time.monotonic()
+
+        with self.lock:
+            store = self.rows.setdefault(dataset_name, OrderedDict())
+
+            for request_id, row in zip(
+                request_ids, rows.itertuples(index=False, name=None)
+            ):
+                if pd.notna(request_id):
+                    store[request_id] = (now, row)
+
+            self.evict(dataset_name, store, now)
+            self.pending.labels(dataset_name=dataset_name).set(len(store))
+
+    def join(self, dataset_name: str, labels: list) -> tuple:
+        """Join labels with the predictions they belong to.
+
+        Args:
+            dataset_name (str): name of the dataset
+            labels (list): dictionaries with the request id and the target of a prediction
+
+        Returns:
+            tuple: the rows of the joined predictions and their targets
+        """
+        rows = []
+        targets = []
+
+        with self.lock:
+            store = self.rows.setdefault(dataset_name, OrderedDict())
+            self.evict(dataset_name, store, time.monotonic())
+
+            for label in labels:
+                found = store.pop(label.get("request_id"), None)
+
+                if found is not None:
+                    rows.append(found[1])
+                    targets.append(label.get("target"))
+
+            self.pending.labels(dataset_name=dataset_name).set(len(store))
+
+        self.labels.labels(dataset_name=dataset_name, outcome="joined").inc(
+            len(rows)
+        )
+        self.labels.labels(dataset_name=dataset_name, outcome="unknown").inc(
+            len(labels) - len(rows)
+        )
+        return rows, targets
@@ -2,18 +2,35 @@
 # fmt: off
 import hashlib
 import logging
+import multiprocessing
 import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
 from dataclasses import (  # Automatically adding generated special methods such as __init__() and __repr__().
     dataclass,
+    field,
+    replace,
 )
-from datetime import datetime, timedelta
 
 import pandas as pd
 import prometheus_client
 import yaml
+from drift_engine import (
+    MAX_EVIDENTLY_REFERENCE_ROWS,
+    ParallelDataDriftMonitoring,
+)
+from dtype_plan import DtypePlan, bytes_per_row
 from evidently.model_monitoring import (  # Specify monitors to use and return specific metrics of monitors
     DataDriftMonitor,
     ModelMonitoring,
+    NumTargetDriftMonitor,
 )
 from evidently.options.data_drift import (  # Set data drift options e.g share drift etc..
     DataDriftOptions,
@@ -23,9 +40,22 @@ from evidently.runner.loader import DataLoader  # Basically pd.read_csv()
 from evidently.runner.loader import (  # Set a column for date, header and separtor etc...
     DataOptions,
 )
+from fast_drift import FastDataDriftMonitoring
 from flask import Flask, request
-from prometheus_client import Gauge
+from horizons import HorizonDrift
+from ingest import Ingestor
+from label_store import LabelStore, regression_quality
+from prometheus_client import Counter, Gauge
+from reference_store import ReferenceStore
+from reload import ConfigWatcher
+from reservoir import RESERVOIR, WINDOW_MODES, replacements, reservoir_rng
+from scheduler import CalculationBudget, CalculationPolicy, CalculationScheduler
+from segments import SegmentedDrift, segment_columns
+from tail import FileTailer
 from werkzeug.middleware.dispatcher import DispatcherMiddleware
+from werkzeug.serving import is_running_from_reloader
+
+from serialization import BACKEND, loads
 
 app = Flask(__name__)
 logging.basicConfig(
@@ -49,6 +79,29 @@ class MonitoringServiceOptions:
     moving_reference: bool
     window_size: int
     calculation_period_sec: int
+    loader_workers: int = 4
+    lazy_loading: bool = False
+    idle_ttl_sec: float | None = None
+    max_resident_datasets: int | None = None
+    spill_path: str = "spill"
+    drift_workers: int | None = None
+    reference_store_path: str | None = None
+    calculation_budget_share: float | None = None
+    ingest_queue_rows: int | None = None
+    ingest_policy: str = "sample"
+    ingest_sample_every: int = 10
+    window_mode: str = "sliding"
+    reservoir_seed: int = 0
+    label_store_rows: int = 100_000
+    label_ttl_sec: float | None = None
+    recent_request_ids: int | None = 10_000
+    warm_up: bool = True
+    tail_files: list | None = None
+    tail_checkpoint_path: str = "tail_checkpoints.json"
+    tail_batch_bytes: int = 4_194_304
+    tail_poll_sec: float = 1.0
+    reload_poll_sec: float | None = None
+    max_series_per_dataset: int | None = None
 
 
 @dataclass
@@ -59,9 +112,35 @@ class LoadedDataset:
     references: pd.DataFrame
     monitors: list[str]
     column_mapping: ColumnMapping
+    features: list[str]
+    reference_hash: str
+    calculation_policy: CalculationPolicy = field(default_factory=CalculationPolicy)
+    dtype_plan: DtypePlan | None = None
+    prediction: str | None = None
+    target: str | None = None
+    segment_by: list = field(default_factory=list)
+    max_segments: int = 20
+    horizons: list = field(default_factory=list)
+
+
+@dataclass
+class LoadingStatus:
+    """Progress of the reference datasets loading done on server start."""
+
+    total: int = 0
+    loaded: int = 0
+    failed: int = 0
+    ready: bool = False
 
 
 EVIDENTLY_MONITORS_MAPPING = {"data_drift": DataDriftMonitor}
+# Monitors of the prediction, run apart so the data drift share only counts the features
+PREDICTION_MONITORS_MAPPING = {"num_target_drift": NumTargetDriftMonitor}
+# Drift engines replacing Evidently's monitoring of a dataset, yielding the same metrics
+DRIFT_ENGINES_MAPPING = {
+    "parallel_data_drift": ParallelDataDriftMonitoring,
+    "fast_data_drift": FastDataDriftMonitoring,
+}
 
 
 class MonitoringService:
@@ -78,6 +157,18 @@ class MonitoringService:
         datasets: dict[str, LoadedDataset],
         window_size: int,
         calculation_period_sec: float,
+        loader: Callable[[str], LoadedDataset] | None = None,
+        idle_ttl_sec: float | None = None,
+        max_resident_datasets: int | None = None,
+        spill_path: str = "spill",
+        drift_workers: int | None = None,
+        calculation_budget_share: float | None = None,
+        window_mode: str = "sliding",
+        reservoir_seed: int = 0,
+        label_store_rows: int = 100_000,
+        label_ttl_sec: float | None = None,
+        max_series_per_dataset: int | None = None,
+        recent_request_ids: int | None = 10_000,
     ) -> None:
         """Initalise the class variables.
 
@@ -85,30 +176,481 @@ class MonitoringService:
             datasets (dict): datasets to be monitored
             window_size (int): number of rows to be used for calculation
             calculation_period_sec (float): frequency for calculation
+            loader (Callable[[str], LoadedDataset] | None): loads a dataset on its first request, enables the lazy mode
+            idle_ttl_sec (float | None): seconds without data before a lazily loaded dataset is unloaded
+            max_resident_datasets (int | None): maximum number of lazily loaded datasets kept in memory
+            spill_path (str): directory where the windows of unloaded datasets are saved
+            drift_workers (int | None): number of processes of the drift engines, defaults to the number of cores
+            calculation_budget_share (float | None): share of the time all the datasets may spend calculating
+            window_mode (str): "sliding" for the latest rows, "reservoir" for a uniform sample of all the rows received
+            reservoir_seed (int): seed of the reservoir sampling
+            label_store_rows (int): maximum number of predictions waiting for their label per dataset
+            label_ttl_sec (float | None): seconds a prediction waits for its label, forever when None
+            max_series_per_dataset (int | None): maximum number of Prometheus series exported per dataset, no cap when None
+            recent_request_ids (int | None): number of request ids remembered per dataset to drop retried rows, no deduplication when None
+
+        Raises:
+            ValueError: if the window mode is unknown
         """
+        if window_mode not in WINDOW_MODES:
+            raise ValueError(f"Unknown window mode {window_mode}, expected one of {WINDOW_MODES}")
+
         self.reference = {}
         self.current = {}
         self.monitoring = {}
         self.column_mapping = {}
+        self.prediction_monitoring = {}
+        self.prediction_mapping = {}
+        self.features = {}
+        self.columns = {}
+        self.prediction = {}
+        self.target = {}
+        self.labelled = {}
+        self.segments = {}
+        self.horizons = {}
+        self.buffer_size = {}
+        self.hash = {}
+        self.dtype_plan = {}
+        self.scheduler = {}
+        self.last_access = {}
+        self.rows_seen = {}
+        self.reservoir_rng = {}
         self.window_size = window_size
+        self.window_mode = window_mode
+        self.reservoir_seed = reservoir_seed
         self.calculation_period_sec = calculation_period_sec
         self.options = DataDriftOptions(drift_share=1)
+        self.loader = loader
+        self.idle_ttl_sec = idle_ttl_sec
+        self.max_resident_datasets = max_resident_datasets
+        self.spill_path = spill_path
+        self.lock = threading.RLock()
+        self.dataset_locks = {}
+        self.drift_workers = drift_workers or os.cpu_count()
+        self.drift_executor = None
+        self.budget = CalculationBudget(calculation_budget_share)
+        self.calculation_triggers = Counter("Evidently:calculation_triggers", "Drift calculations by trigger", labelnames=["dataset_name", "reason"])
+        self.calculation_skips = Counter("Evidently:calculation_skips", "Skipped drift calculations by reason", labelnames=["dataset_name", "reason"])
+        # The results of the last calculation of each dataset, with the reference and window they were calculated on
+        self.cached_results = {}
+        self.result_cache_hits = Counter("Evidently:result_cache_hits", "Calculations answered from the results of an identical window", labelnames=["dataset_name"])
+        self.result_cache_misses = Counter("Evidently:result_cache_misses", "Calculations run on a window not seen in the last calculation", labelnames=["dataset_name"])
+        self.label_store = LabelStore(label_store_rows, label_ttl_sec)
+        # The ids of the latest requests of each dataset, oldest first
+        self.request_ids = {}
+        self.recent_request_ids = recent_request_ids
+        self.retried_rows = Counter("Evidently:retried_rows", "Rows dropped because their request was already received", labelnames=["dataset_name"])
 
         for dataset_info in datasets.values():
-            features = dataset_info.references[["bedrooms", "condition"]]
-            self.reference[dataset_info.name] = features
-            self.monitoring[dataset_info.name] = ModelMonitoring(
-                monitors=[EVIDENTLY_MONITORS_MAPPING[monitor]() for monitor in dataset_info.monitors],
+            self.add_dataset(dataset_info)
+
+        self.metrics = {
+            "Evidently:reference_dataset_hash": Gauge("Evidently:reference_dataset_hash", "", labelnames=["dataset_name", "hash"]),
+            "Evidently:n_features": Gauge("Evidently:n_features", "", labelnames=["dataset_name"]),
+        }
+        # The series set by each source of metrics of each dataset
+        self.series = {}
+        self.max_series_per_dataset = max_series_per_dataset
+        self.series_metric = Gauge("Evidently:series", "Series exported for the dataset", labelnames=["dataset_name"])
+        self.dropped_series = Counter("Evidently:dropped_series", "Series not exported because the dataset reached its cap", labelnames=["dataset_name"])
+        self.window_bytes_metric = Gauge("Evidently:window_bytes_per_row", "Memory used per row of the window", labelnames=["dataset_name"])
+
+    def add_dataset(self, dataset_info: LoadedDataset) -> None:
+        """Set up the reference and the monitors of a loaded dataset.
+
+        Args:
+            dataset_info (LoadedDataset): the loaded dataset
+        """
+        for attribute, value in self.build_dataset(dataset_info).items():
+            getattr(self, attribute)[dataset_info.name] = value
+
+    def build_dataset(self, dataset_info: LoadedDataset) -> dict[str, object]:
+        """Build the reference and the monitors of a loaded dataset, without installing them.
+
+        Args:
+            dataset_info (LoadedDataset): the loaded dataset
+
+        Returns:
+            dict[str, object]: the state of the dataset, by attribute of the service
+        """
+        features = dataset_info.references
+        # The window holds the monitored features, the prediction and the segment columns
+        columns = dataset_info.features + ([dataset_info.prediction] if dataset_info.prediction else [])
+        columns += [column for column in segment_columns(dataset_info.segment_by) if column not in columns]
+
+        # Selecting the columns copies them, the stored references only contain the monitored columns already
+        if set(features.columns) != set(columns):
+            features = features[columns]
+
+        state = {
+            "reference": features,
+            "features": dataset_info.features,
+            "columns": columns,
+            "prediction": dataset_info.prediction,
+            "target": dataset_info.target,
+            "segments": None,
+        }
+
+        if dataset_info.segment_by:
+            state["segments"] = SegmentedDrift(
+                features, dataset_info.column_mapping, dataset_info.segment_by, self.options, dataset_info.max_segments,
+            )
+
+        # The monitors calculate the drift of the window_size latest rows already
+        horizons = [horizon for horizon in dataset_info.horizons if horizon != self.window_size]
+        state["horizons"] = None
+        state["buffer_size"] = self.window_size
+
+        if horizons and self.window_mode == RESERVOIR:
+            logging.error(f"Horizons of {dataset_info.name} dataset are ignored, the reservoir is a sample rather than the latest rows")
+
+        elif horizons:
+            # One buffer holds the longest horizon, the shorter ones are views of its end
+            state["horizons"] = HorizonDrift(features, dataset_info.column_mapping, horizons, self.options)
+            state["buffer_size"] = max(horizons + [self.window_size])
+        state["hash"] = dataset_info.reference_hash
+        state["dtype_plan"] = dataset_info.dtype_plan or DtypePlan(dataset_info.column_mapping)
+        monitors = [monitor for monitor in dataset_info.monitors if monitor not in PREDICTION_MONITORS_MAPPING]
+        prediction_monitors = [monitor for monitor in dataset_info.monitors if monitor in PREDICTION_MONITORS_MAPPING]
+        state["monitoring"] = self.create_monitoring(monitors)
+
+        if isinstance(state["monitoring"], ParallelDataDriftMonitoring) and len(features) > MAX_EVIDENTLY_REFERENCE_ROWS:
+            logging.warning(
+                f"Reference of {dataset_info.name} dataset has {len(features)} rows, {monitors} run K-S, chi-square and Z-tests "
+                f"where Evidently's data_drift uses the Wasserstein distance and Jensen-Shannon divergence above {MAX_EVIDENTLY_REFERENCE_ROWS} rows"
+            )
+
+        # Evidently's data drift would test the prediction as one more feature
+        state["column_mapping"] = replace(dataset_info.column_mapping, prediction=None)
+        state["prediction_monitoring"] = None
+        state["prediction_mapping"] = dataset_info.column_mapping
+
+        if prediction_monitors and dataset_info.prediction:
+            state["prediction_monitoring"] = ModelMonitoring(
+                monitors=[PREDICTION_MONITORS_MAPPING[monitor]() for monitor in prediction_monitors],
+                options=[self.options],
+            )
+        elif prediction_monitors:
+            logging.error(f"Dataset {dataset_info.name} has no prediction column, ignoring {prediction_monitors}")
+        policy = dataset_info.calculation_policy
+
+        if policy.period_sec is None and policy.min_new_rows is None and policy.shift_threshold is None:
+            policy = replace(policy, period_sec=self.calculation_period_sec)
+
+        state["scheduler"] = CalculationScheduler(policy, self.budget, features)
+        return state
+
+    def dataset_lock(self, dataset_name: str) -> threading.RLock:
+        """Get the lock serialising the updates of the window of a dataset with its reloads.
+
+        Args:
+            dataset_name (str): name of the dataset
+
+        Returns:
+            threading.RLock: the lock of the dataset
+        """
+        lock = self.dataset_locks.get(dataset_name)
+
+        if lock is None:
+            lock = self.dataset_locks.setdefault(dataset_name, threading.RLock())
+
+        return lock
+
+    def replace_dataset(self, dataset_info: LoadedDataset) -> None:
+        """Swap in a dataset rebuilt from its reloaded config or reference, or add a new one.
+
+        The reference and the monitors are built while the previous ones keep serving, then swapped in at once under
+        the lock of the dataset, so its rows only wait for the swap and the rows of the other datasets do not wait.
+        The window is kept when its columns are unchanged, converted to the new types and cut to the new buffer,
+        and dropped otherwise. So are the labelled predictions.
+
+        Args:
+            dataset_info (LoadedDataset): the reloaded dataset
+        """
+        dataset_name = dataset_info.name
+        state = self.build_dataset(dataset_info)
+
+        with self.dataset_lock(dataset_name):
+            previous = self.monitoring.get(dataset_name)
+            current_data = self.current.pop(dataset_name, None)
+            labelled = self.labelled.pop(dataset_name, None)
+            rows_seen = self.rows_seen.pop(dataset_name, 0)
+            rng = self.reservoir_rng.pop(dataset_name, None)
+            self.cached_results.pop(dataset_name, None)
+            # The metrics of the previous config are published again by the next calculation
+            self.clear_series(dataset_name)
+
+            for attribute, value in state.items():
+                getattr(self, attribute)[dataset_name] = value
+
+            if current_data is not None and list(current_data.columns) != state["columns"]:
+                logging.info(f"Columns of dataset {dataset_name} changed, dropping its window")
+
+            elif current_data is not None and self.window_mode == RESERVOIR and len(current_data) != min(rows_seen, self.window_size):
+                logging.info(f"Window size of dataset {dataset_name} changed, sampling its reservoir again")
+
+            elif current_data is not None:
+                current_data = current_data.iloc[max(len(current_data) - state["buffer_size"], 0):].reset_index(drop=True)
+                current_data, _ = state["dtype_plan"].apply(current_data)
+                self.current[dataset_name] = current_data
+                state["scheduler"].update(current_data, current_data.iloc[:0])
+
+                if rng is not None:
+                    self.rows_seen[dataset_name] = rows_seen
+                    self.reservoir_rng[dataset_name] = rng
+
+            if labelled is not None and list(labelled.columns) == state["columns"] + [state["target"]]:
+                labelled = labelled.iloc[max(len(labelled) - self.window_size, 0):].reset_index(drop=True)
+                self.labelled[dataset_name], _ = state["dtype_plan"].apply(labelled)
+
+            # No calculation of the dataset runs while its lock is held
+            if isinstance(previous, ParallelDataDriftMonitoring) and previous is not state["monitoring"]:
+                previous.close()
+
+        logging.info(f"Reloaded dataset {dataset_name}")
+
+    def remove_dataset(self, dataset_name: str) -> None:
+        """Stop monitoring a dataset removed from the config file, discarding its window.
+
+        Args:
+            dataset_name (str): name of the dataset
+        """
+        with self.dataset_lock(dataset_name):
+            monitoring = self.monitoring.get(dataset_name)
+
+            if isinstance(monitoring, ParallelDataDriftMonitoring):
+                monitoring.close()
+
+            for state in (self.reference, self.current, self.monitoring, self.column_mapping, self.prediction_monitoring, self.prediction_mapping, self.features, self.columns, self.prediction, self.target, self.labelled, self.segments, self.horizons, self.buffer_size, self.hash, self.dtype_plan, self.scheduler, self.last_access, self.rows_seen, self.reservoir_rng, self.cached_results, self.request_ids):
+                state.pop(dataset_name, None)
+
+            self.clear_series(dataset_name)
+            spill_file = self.spill_file(dataset_name)
+
+            if os.path.exists(spill_file):
+                os.remove(spill_file)
+
+        logging.info(f"Removed dataset {dataset_name}")
+
+    def create_monitoring(self, monitors: list[str]) -> ModelMonitoring | ParallelDataDriftMonitoring:
+        """Create the monitoring of a dataset, either Evidently's monitors or a drift engine.
+
+        Args:
+            monitors (list[str]): the monitors configured for the dataset
+
+        Returns:
+            ModelMonitoring | ParallelDataDriftMonitoring: the monitoring pipeline
+        """
+        engines = [monitor for monitor in monitors if monitor in DRIFT_ENGINES_MAPPING]
+
+        if not engines:
+            return ModelMonitoring(
+                monitors=[EVIDENTLY_MONITORS_MAPPING[monitor]() for monitor in monitors],
                 options=[self.options],
             )
-            self.column_mapping[dataset_info.name] = dataset_info.column_mapping
 
-        self.metrics = {}
-        self.next_run_time = {}
-        self.hash = hashlib.sha256(pd.util.hash_pandas_object(self.reference["house_price_random_forest"]).values).hexdigest()
-        self.hash_metric = prometheus_client.Gauge("Evidently:reference_dataset_hash", "", labelnames=["hash"])
-        self.n_feature = 2
-        self.n_feature_metric = prometheus_client.Gauge("Evidently:n_features", "", labelnames=["dataset_name"])
+        if len(monitors) > 1:
+            logging.error(f"Drift engine {engines[0]} replaces the other monitors: {monitors}")
+
+        # The fast engine runs in the server process
+        if self.drift_executor is None and self.drift_workers > 1 and DRIFT_ENGINES_MAPPING[engines[0]] is ParallelDataDriftMonitoring:
+            # Workers forked from a fork server do not inherit the locks held by the server threads. The workers
+            # import the main module again, its imports are preloaded once in the fork server rather than per worker
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            mp_context = multiprocessing.get_context(start_method)
+
+            if start_method == "forkserver":
+                mp_context.set_forkserver_preload(["metric_server"])
+
+            self.drift_executor = ProcessPoolExecutor(max_workers=self.drift_workers, mp_context=mp_context)
+
+        return DRIFT_ENGINES_MAPPING[engines[0]](options=self.options, executor=self.drift_executor, workers=self.drift_workers)
+
+    def warm_up(self) -> None:
+        """Start the drift workers and calculate the drift of every loaded dataset once, before accepting data.
+
+        The first calculation pays for the lazy imports and caches of the monitors, e.g. the encoded reference of
+        the drift engines, so the first requests do not. The window is a sample of the reference and the results
+        are not published.
+        """
+        if self.drift_executor is not None:
+            # Submitting concurrent tasks starts the workers, which import the drift engine
+            for future in [self.drift_executor.submit(os.getpid) for _ in range(self.drift_workers)]:
+                future.result()
+
+        for dataset_name, reference in list(self.reference.items()):
+            started = time.perf_counter()
+            self.calculate(dataset_name, reference.head(self.window_size).reset_index(drop=True))
+            logging.info(f"Warmed up dataset {dataset_name} in {time.perf_counter() - started:.2f} seconds")
+
+    def spill_file(self, dataset_name: str) -> str:
+        """Path of the file holding the window of an unloaded dataset.
+
+        Args:
+            dataset_name (str): name of the dataset
+
+        Returns:
+            str: the path of the spilled window
+        """
+        return os.path.join(self.spill_path, f"{dataset_name}.pkl")
+
+    def materialize(self, dataset_name: str) -> None:
+        """Load a dataset on its first request in lazy mode, restoring its spilled window if any.
+
+        Args:
+            dataset_name (str): name of the dataset
+        """
+        with self.lock:
+            if dataset_name in self.monitoring or self.loader is None:
+                return
+
+            self.add_dataset(self.loader(dataset_name))
+            spill_file = self.spill_file(dataset_name)
+
+            if os.path.exists(spill_file) and list(pd.read_pickle(spill_file).columns) != self.columns[dataset_name]:
+                # The config of the dataset was reloaded since its window was spilled
+                logging.info(f"Columns of dataset {dataset_name} changed, dropping its spilled window")
+                os.remove(spill_file)
+
+            if os.path.exists(spill_file):
+                spilled = pd.read_pickle(spill_file)
+
+                if "rows_seen" in spilled.attrs:
+                    self.rows_seen[dataset_name] = spilled.attrs["rows_seen"]
+                    self.reservoir_rng[dataset_name] = reservoir_rng(self.reservoir_seed, dataset_name)
+                    self.reservoir_rng[dataset_name].bit_generator.state = spilled.attrs["reservoir_state"]
+
+                # Types widened before the window was spilled must be widened again
+                current_data, _ = self.dtype_plan[dataset_name].apply(spilled)
+                self.current[dataset_name] = current_data
+                self.scheduler[dataset_name].update(current_data, current_data.iloc[:0])
+                os.remove(spill_file)
+                logging.info(f"Restored window of {dataset_name} dataset from {spill_file}")
+
+    def unload(self, dataset_name: str) -> bool:
+        """Spill the window of a dataset to disk and drop its reference and monitors from memory.
+
+        The dataset is skipped while another thread holds its lock, e.g. to calculate its drift. Waiting for the lock
+        could deadlock with a thread unloading the dataset served here, the dataset is unloaded on a later request.
+
+        Args:
+            dataset_name (str): name of the dataset
+
+        Returns:
+            bool: whether the dataset was unloaded
+        """
+        dataset_lock = self.dataset_lock(dataset_name)
+
+        if not dataset_lock.acquire(blocking=False):
+            logging.info(f"Dataset {dataset_name} is in use, unloading it later")
+            return False
+
+        try:
+            self.spill(dataset_name)
+
+        finally:
+            dataset_lock.release()
+
+        return True
+
+    def spill(self, dataset_name: str) -> None:
+        """Spill the window of a dataset to disk and drop its state, holding the lock of the dataset.
+
+        Args:
+            dataset_name (str): name of the dataset
+        """
+        with self.lock:
+            if dataset_name not in self.monitoring:
+                return
+
+            current_data = self.current.pop(dataset_name, None)
+
+            if current_data is not None:
+                if dataset_name in self.rows_seen:
+                    # The reservoir carries on sampling the stream where it stopped
+                    current_data.attrs["rows_seen"] = self.rows_seen.pop(dataset_name)
+                    current_data.attrs["reservoir_state"] = self.reservoir_rng.pop(dataset_name).bit_generator.state
+
+                os.makedirs(self.spill_path, exist_ok=True)
+                current_data.to_pickle(self.spill_file(dataset_name))
+
+            monitoring = self.monitoring.get(dataset_name)
+
+            if isinstance(monitoring, ParallelDataDriftMonitoring):
+                monitoring.close()
+
+            # The predictions waiting for their label stay in the bounded label store, the recent request ids stay too
+            for state in (self.reference, self.monitoring, self.column_mapping, self.prediction_monitoring, self.prediction_mapping, self.features, self.columns, self.prediction, self.target, self.labelled, self.segments, self.horizons, self.buffer_size, self.hash, self.dtype_plan, self.scheduler, self.last_access):
+                state.pop(dataset_name, None)
+
+            logging.info(f"Unloaded idle dataset {dataset_name}")
+
+    def unload_idle(self, keep: str) -> None:
+        """Unload the datasets idle for longer than the TTL, then the least recently used ones above the cap.
+
+        Args:
+            keep (str): name of the dataset being served, which is never unloaded
+        """
+        if self.loader is None:
+            return
+
+        now = time.monotonic()
+        # The other threads update the access times of the datasets they serve
+        last_access = dict(self.last_access)
+        # Least recently used first
+        resident = sorted((name for name in last_access if name != keep), key=last_access.get)
+
+        if self.idle_ttl_sec is not None:
+            for dataset_name in [name for name in resident if now - last_access[name] > self.idle_ttl_sec]:
+                if self.unload(dataset_name):
+                    resident.remove(dataset_name)
+
+        if self.max_resident_datasets is not None:
+            # The dataset being served counts towards the cap, the datasets in use are skipped
+            excess = len(resident) + 1 - self.max_resident_datasets
+
+            for dataset_name in resident:
+                if excess <= 0:
+                    break
+
+                if self.unload(dataset_name):
+                    excess -= 1
+
+    def drop_retried(self, dataset_name: str, new_rows: pd.DataFrame, request_ids: pd.Series) -> tuple[pd.DataFrame, pd.Series]:
+        """Drop the rows of the requests already received, e.g. sent again after a timeout.
+
+        The ids of the latest recent_request_ids requests of the dataset are remembered, so a retried row enters
+        the window once. Rows without a request id are always kept.
+
+        Args:
+            dataset_name (str): name of the dataset
+            new_rows (pd.DataFrame): the received rows
+            request_ids (pd.Series): the request id of each row
+
+        Returns:
+            tuple[pd.DataFrame, pd.Series]: the rows of the new requests and their ids
+        """
+        seen = self.request_ids.setdefault(dataset_name, OrderedDict())
+        keep = []
+
+        for request_id in request_ids:
+            retried = pd.notna(request_id) and request_id in seen
+            keep.append(not retried)
+
+            if pd.notna(request_id) and not retried:
+                seen[request_id] = None
+
+        while len(seen) > self.recent_request_ids:
+            seen.popitem(last=False)
+
+        retried_rows = keep.count(False)
+
+        if retried_rows == 0:
+            return new_rows, request_ids
+
+        logging.info(f"Dropping {retried_rows} retried rows of dataset {dataset_name}")
+        self.retried_rows.labels(dataset_name=dataset_name).inc(retried_rows)
+        return new_rows[keep], request_ids[keep]
 
     def iterate(self, dataset_name: str, new_rows: pd.DataFrame) -> None:
         """Get a new row of data for monitoring.
@@ -116,60 +658,297 @@ class MonitoringService:
         Args:
             dataset_name (str): name of the dataset
             new_rows (pd.DataFrame): a row of data used for inference from the inference server
+
+        Raises:
+            Exception: an error of the calculation, once its time is recorded in the calculation budget
         """
-        # new_rows = new_rows.drop(['price'], axis = 1) # Drop price column if we only care about features drift for now.
-        # We only want the bedroom and the condition feature
-        new_rows = new_rows[["bedrooms", "condition"]]
-        logging.info(new_rows)
-        window_size = self.window_size
+        # The request threads, the ingest worker and the file tailer update the same windows, which the reloads replace
+        with self.dataset_lock(dataset_name):
+            self.materialize(dataset_name)
+            self.last_access[dataset_name] = time.monotonic()
+            self.unload_idle(keep=dataset_name)
 
-        if dataset_name in self.current:  # Check if have recevied data before
-            current_data = pd.concat([self.current[dataset_name], new_rows], ignore_index=True)
-        else:  # If first time receive data
-            current_data = new_rows
+            # We only want the monitored features, e.g. the bedroom and the condition feature, and the prediction
+            request_ids = new_rows.get("request_id")
 
-        current_size = current_data.shape[0]
+            if request_ids is not None and self.recent_request_ids is not None:
+                new_rows, request_ids = self.drop_retried(dataset_name, new_rows, request_ids)
 
-        if (
-            current_size > self.window_size
-        ):  # If there are more rows in current data then specified window size
-            current_data.drop(index=list(range(0, current_size - self.window_size)), inplace=True,)
-            current_data.reset_index(drop=True, inplace=True)
+                if new_rows.empty:
+                    logging.info(f"Every row sent to dataset {dataset_name} was received already")
+                    return
 
-        self.current[dataset_name] = current_data
+            new_rows, widened = self.dtype_plan[dataset_name].apply(new_rows[self.columns[dataset_name]])
+            logging.info(new_rows)
 
-        if current_size < window_size:
-            logging.info(f"Currenlty has less data than set window size: {current_size} of {window_size}, waiting for more data")
-            return
+            if self.target[dataset_name] is not None and request_ids is not None:
+                self.label_store.put(dataset_name, request_ids, new_rows)
 
-        next_run_time = self.next_run_time.get(dataset_name)
+            if widened and dataset_name in self.current:
+                self.current[dataset_name] = self.dtype_plan[dataset_name].convert(self.current[dataset_name])
 
-        if next_run_time is not None and next_run_time > datetime.now():
-            logging.info(f"Next data request for dataset {dataset_name} in {next_run_time}")
-            return
+            window_size = self.window_size
+
+            if self.window_mode == RESERVOIR:
+                current_data = self.sample_window(dataset_name, new_rows)
+                current_size = current_data.shape[0]
+
+            else:
+                if dataset_name in self.current:  # Check if have recevied data before
+                    current_data = pd.concat([self.current[dataset_name], new_rows], ignore_index=True)
+                else:  # If first time receive data
+                    current_data = new_rows
+
+                current_size = current_data.shape[0]
+                buffer_size = self.buffer_size[dataset_name]
+                removed_rows = current_data.iloc[:max(current_size - buffer_size, 0)]
+                self.scheduler[dataset_name].update(new_rows, removed_rows)
+
+                if (
+                    current_size > buffer_size
+                ):  # If there are more rows in current data then specified window size
+                    current_data.drop(index=list(range(0, current_size - buffer_size)), inplace=True,)
+                    current_data.reset_index(drop=True, inplace=True)
+                    current_size = buffer_size
+
+            self.current[dataset_name] = current_data
+
+            if current_size < window_size:
+                logging.info(f"Currenlty has less data than set window size: {current_size} of {window_size}, waiting for more data")
+                self.calculation_skips.labels(dataset_name=dataset_name, reason="window_filling").inc()
+                return
+
+            now = time.monotonic()
+            due, reason = self.scheduler[dataset_name].trigger(now)
+
+            if not due:
+                logging.info(f"Skipping the calculation of dataset {dataset_name}: {reason}")
+                self.calculation_skips.labels(dataset_name=dataset_name, reason=reason).inc()
+                return
+
+            scheduler = self.scheduler[dataset_name]
+
+            # The trigger holds the calculation budget until the calculation is recorded
+            try:
+                self.calculation_triggers.labels(dataset_name=dataset_name, reason=reason).inc()
+                self.window_bytes_metric.labels(dataset_name=dataset_name).set(bytes_per_row(current_data))
+                # The drift tests ignore the order of the rows, so does the window hash
+                cache_key = (self.hash[dataset_name], scheduler.size, scheduler.window_hash)
+                cached = self.cached_results.get(dataset_name)
+                horizons = self.horizons[dataset_name]
+
+                # The horizons depend on the order of the rows, the window hash does not
+                if horizons is None and cached is not None and cached[0] == cache_key:
+                    logging.info(f"Window of dataset {dataset_name} unchanged since the last calculation, republishing its results")
+                    self.result_cache_hits.labels(dataset_name=dataset_name).inc()
+                    results = cached[1]
+
+                else:
+                    self.result_cache_misses.labels(dataset_name=dataset_name).inc()
+                    # The monitored window is a view of the end of the buffer
+                    results = self.calculate(dataset_name, current_data.tail(window_size))
+
+                    if horizons is not None:
+                        horizons.execute(current_data)
+                        results += self.collect_metrics(dataset_name, horizons.metrics())
+
+                    self.cached_results[dataset_name] = (cache_key, results)
+
+            except Exception:
+                scheduler.failed(now, time.monotonic() - now)
+                raise
+
+            scheduler.calculated(now, time.monotonic() - now)
+            self.publish(dataset_name, results)
+
+    def sample_window(self, dataset_name: str, new_rows: pd.DataFrame) -> pd.DataFrame:
+        """Add new rows to the reservoir of a dataset, a uniform sample of all the rows it received.
+
+        The rows fill the window first, then each row replaces a random row of the window with a
+        probability decreasing as the stream grows. The work is O(1) per row whatever the traffic.
+
+        Args:
+            dataset_name (str): name of the dataset
+            new_rows (pd.DataFrame): the rows received
+
+        Returns:
+            pd.DataFrame: the window
+        """
+        current_data = self.current.get(dataset_name)
+        seen = self.rows_seen.get(dataset_name, 0)
+        rng = self.reservoir_rng.setdefault(dataset_name, reservoir_rng(self.reservoir_seed, dataset_name))
+
+        n_fill = min(self.window_size - seen, len(new_rows)) if seen < self.window_size else 0
+        filled = new_rows.iloc[:n_fill]
+        new_rows = new_rows.iloc[n_fill:]
+
+        if current_data is None:
+            current_data = filled.reset_index(drop=True)
+        elif n_fill:
+            current_data = pd.concat([current_data, filled], ignore_index=True)
+
+        indices, positions = replacements(rng, seen + n_fill, len(new_rows), self.window_size)
+        added = new_rows.iloc[indices]
+        removed_rows = current_data.iloc[positions]
+
+        for column_index, feature in enumerate(current_data.columns):
+            current_data.iloc[positions, column_index] = added[feature].to_numpy()
+
+        self.rows_seen[dataset_name] = seen + n_fill + len(new_rows)
+        self.scheduler[dataset_name].update(pd.concat([filled, added]), removed_rows)
+        return current_data
+
+    def label(self, dataset_name: str, labels: list[dict]) -> int:
+        """Join the ground truth labels of earlier predictions and monitor the regression performance.
+
+        The joined rows fill a window of the latest window_size labelled predictions, the quality
+        metrics of Evidently's regression performance monitor are published once it is full.
+
+        Args:
+            dataset_name (str): name of the dataset
+            labels (list[dict]): the request id of each prediction and its target
+
+        Returns:
+            int: the number of labels joined with their prediction
+
+        Raises:
+            ValueError: if the dataset has no target configured
+        """
+        # Serialised with the updates, reloads and unloading of the dataset
+        with self.dataset_lock(dataset_name):
+            self.materialize(dataset_name)
+            target = self.target.get(dataset_name)
+
+            if target is None:
+                raise ValueError(f"No target configured for dataset {dataset_name}")
 
-        self.next_run_time[dataset_name] = datetime.now() + timedelta(seconds=self.calculation_period_sec)
+            rows, targets = self.label_store.join(dataset_name, labels)
+
+            if not rows:
+                return 0
+
+            joined = pd.DataFrame.from_records(rows, columns=self.columns[dataset_name])
+            joined[target] = pd.to_numeric(pd.Series(targets, dtype=object), errors="coerce")
+            joined = self.dtype_plan[dataset_name].convert(joined.dropna(subset=[target]))
+            labelled = pd.concat([self.labelled.get(dataset_name), joined], ignore_index=True)
+            labelled = labelled.iloc[max(len(labelled) - self.window_size, 0):].reset_index(drop=True)
+            self.labelled[dataset_name] = labelled
+
+            if len(labelled) < self.window_size:
+                logging.info(f"Currently has less labelled data than set window size: {len(labelled)} of {self.window_size}, waiting for more labels")
+                return len(rows)
+
+            quality = regression_quality(
+                labelled[target].to_numpy(dtype=float), labelled[self.prediction[dataset_name]].to_numpy(dtype=float),
+            )
+            self.publish(dataset_name, [
+                ("Evidently:regression_performance:quality", {"dataset": "current", "metric": metric, "dataset_name": dataset_name}, value)
+                for metric, value in quality.items()
+            ], source="labels")
+            return len(rows)
+
+    def calculate(self, dataset_name: str, current_data: pd.DataFrame) -> list[tuple[str, dict, float]]:
+        """Calculate the metrics of a window of data against the reference of a dataset.
+
+        Args:
+            dataset_name (str): name of the dataset
+            current_data (pd.DataFrame): the window of data
+
+        Returns:
+            list[tuple[str, dict, float]]: the metric name, labels and value of each metric
+        """
         # The exectue method inherits from the Pipeline class
         self.monitoring[dataset_name].execute(
             self.reference[dataset_name],
             current_data,
             self.column_mapping[dataset_name],
         )
-        self.hash_metric.labels(hash=self.hash).set(1)
-        self.n_feature_metric.labels(**{"dataset_name": dataset_name}).set(self.n_feature)
+        metrics = list(self.monitoring[dataset_name].metrics())
 
-        for metric, value, labels in self.monitoring[dataset_name].metrics():
-            metric_key = f"Evidently:{metric.name}"
-            found = self.metrics.get(metric_key)
+        if self.prediction_monitoring[dataset_name] is not None:
+            self.prediction_monitoring[dataset_name].execute(
+                self.reference[dataset_name],
+                current_data,
+                self.prediction_mapping[dataset_name],
+            )
+            metrics.extend(self.prediction_monitoring[dataset_name].metrics())
 
-            if not labels:
-                labels = {}
+        if self.segments[dataset_name] is not None:
+            self.segments[dataset_name].execute(current_data)
+            metrics.extend(self.segments[dataset_name].metrics())
 
-            labels["dataset_name"] = dataset_name
+        return self.collect_metrics(dataset_name, metrics)
+
+    def collect_metrics(self, dataset_name: str, metrics: Iterable[tuple]) -> list[tuple[str, dict, float]]:
+        """Name and label the metrics yielded by the monitors of a dataset.
+
+        Args:
+            dataset_name (str): name of the dataset
+            metrics (Iterable[tuple]): the metric, its value and its labels
 
+        Returns:
+            list[tuple[str, dict, float]]: the metric name, labels and value of each metric
+        """
+        results = []
+
+        for metric, value, labels in metrics:
             if isinstance(value, str):  # Check if the value variable is a string
                 continue
 
+            labels = dict(labels or {})
+            labels["dataset_name"] = dataset_name
+            results.append((f"Evidently:{metric.name}", labels, value))
+
+        return results
+
+    def publish(self, dataset_name: str, results: list[tuple[str, dict, float]], source: str = "drift") -> None:
+        """Set the Prometheus gauges of the calculated metrics.
+
+        Args:
+            dataset_name (str): name of the dataset
+            results (list[tuple[str, dict, float]]): the metric name, labels and value of each metric
+            source (str): the calculation of the results, e.g. "drift" or "labels", whose series they replace
+        """
+        with self.dataset_lock(dataset_name):
+            self.set_series(dataset_name, "reference", [
+                ("Evidently:reference_dataset_hash", {"dataset_name": dataset_name, "hash": self.hash[dataset_name]}, 1),
+                ("Evidently:n_features", {"dataset_name": dataset_name}, len(self.features[dataset_name])),
+            ])
+            self.set_series(dataset_name, source, results)
+
+        for metric_key, labels, value in results:
+            if metric_key == "Evidently:data_drift:dataset_drift" and value is True:
+                logging.info("Data drift detected")
+
+    def set_series(self, dataset_name: str, source: str, results: list[tuple[str, dict, float]]) -> None:
+        """Set the series of a source of metrics of a dataset, removing the ones its previous results had and these do not.
+
+        The label sets of a dataset change with its reference hash, its features, segments and horizons, or the test
+        chosen for a feature, the series they leave behind are removed so /metrics only exports the latest results.
+        A dataset owns at most max_series_per_dataset series, the results beyond the cap are dropped, so the first
+        ones, the data drift of the features, are kept.
+
+        Args:
+            dataset_name (str): name of the dataset
+            source (str): the calculation of the results, whose series they replace
+            results (list[tuple[str, dict, float]]): the metric name, labels and value of each metric
+        """
+        owned = self.series.setdefault(dataset_name, {})
+        previous = owned.get(source, set())
+        others = sum(len(keys) for name, keys in owned.items() if name != source)
+        series = set()
+        dropped = 0
+
+        for metric_key, labels, value in results:
+            # The gauges have their label names sorted
+            key = (metric_key, tuple(sorted(labels.items())))
+
+            if key not in series and self.max_series_per_dataset is not None and others + len(series) >= self.max_series_per_dataset:
+                dropped += 1
+                continue
+
+            found = self.metrics.get(metric_key)
+
             if found is None:
                 found = Gauge(metric_key, "", list(sorted(labels.keys())))
                 self.metrics[metric_key] = found
@@ -179,18 +958,45 @@ class MonitoringService:
 
             except ValueError as error:
                 # ignore errors sending other metrics
-                logging.error("Value error for metric %s, error: ", metric_key, error)
+                logging.error("Value error for metric %s, error: %s", metric_key, error)
+                continue
 
-            if metric.name == "data_drift:dataset_drift" and value is True:
-                logging.info("Data drift detected")
+            series.add(key)
+
+        for metric_key, label_items in previous - series:
+            self.metrics[metric_key].remove(*[value for _, value in label_items])
+
+        owned[source] = series
+
+        if dropped:
+            logging.warning(f"Dropped {dropped} series of dataset {dataset_name} above the cap of {self.max_series_per_dataset}")
+            self.dropped_series.labels(dataset_name=dataset_name).inc(dropped)
 
+        self.series_metric.labels(dataset_name=dataset_name).set(others + len(series))
 
-@app.before_first_request
-def configure_service() -> None:
-    """Configure evidently's monitoring service on server start."""
-    global SERVICE
-    config_file_path = "config.yaml"  # This get path of the config.yaml file
+    def clear_series(self, dataset_name: str) -> None:
+        """Remove every series of a dataset, e.g. when it is reloaded or removed.
 
+        Args:
+            dataset_name (str): name of the dataset
+        """
+        for series in self.series.pop(dataset_name, {}).values():
+            for metric_key, label_items in series:
+                self.metrics[metric_key].remove(*[value for _, value in label_items])
+
+        for gauge in (self.series_metric, self.window_bytes_metric):
+            gauge.remove(dataset_name)
+
+
+def read_configs(config_file_path: str = "config.yaml") -> dict:
+    """Read the monitoring service config file, exiting if it does not exist.
+
+    Args:
+        config_file_path (str): path of the config.yaml file
+
+    Returns:
+        dict: the parsed configs
+    """
     # Check if a config file exists?
     if not os.path.exists(config_file_path):  # Will return false if not exists
         logging.error(f"Config file does not exists in path: {config_file_path}")
@@ -198,50 +1004,305 @@ def configure_service() -> None:
 
     # If config file found
     with open(config_file_path, "rb") as config_file:
-        configs = yaml.safe_load(config_file)
+        return yaml.safe_load(config_file)
+
+
+def load_dataset(dataset_name: str, datasets_path: str, dataset_configs: dict, reference_store: ReferenceStore | None = None) -> LoadedDataset:
+    """Load the reference data of a dataset and hash its monitored features.
+
+    Args:
+        dataset_name (str): name of the dataset
+        datasets_path (str): the directory containing one folder per dataset
+        dataset_configs (dict): the dataset section of the config file
+        reference_store (ReferenceStore | None): store sharing the reference with the other workers
+
+    Returns:
+        LoadedDataset: the loaded reference together with its monitoring configs
+    """
+    logging.info(f"Loading reference data from '{dataset_name}'")
+    reference_data_path = os.path.join(datasets_path, dataset_name, "reference.csv")
+    prediction = dataset_configs["column_mapping"].get("prediction")
+    target = dataset_configs["column_mapping"].get("target")
+    # The labels arrive after the predictions, the windows are monitored without the target
+    column_mapping = ColumnMapping(**{**dataset_configs["column_mapping"], "target": None})
+    features = (column_mapping.numerical_features or []) + (column_mapping.categorical_features or [])
+    segment_by = dataset_configs.get("segment_by") or []
+    columns = features + ([prediction] if prediction else [])
+    columns += [column for column in segment_columns(segment_by) if column not in columns]
+    # Compact storage types, declared in the config file or inferred from the reference
+    dtype_plan = DtypePlan(column_mapping, dataset_configs.get("dtypes"))
+
+    def read_reference() -> pd.DataFrame:
+        """Read the reference csv file.
+
+        Returns:
+            pd.DataFrame: the reference data
+        """
+        return DataLoader().load(
+            reference_data_path,
+            DataOptions(
+                # If no date_column specified, used none
+                date_column=dataset_configs["column_mapping"].get("datetime", None),
+                separator=dataset_configs["data_format"]["separator"],
+                header=dataset_configs["data_format"]["header"],
+            ),
+        )
+
+    def read_columns() -> pd.DataFrame:
+        """Read the monitored columns of the reference.
+
+        Returns:
+            pd.DataFrame: the features, the prediction and the segment columns of the reference
+
+        Raises:
+            ValueError: if the reference has neither the prediction nor the target
+        """
+        reference = read_reference()
+
+        if prediction and prediction not in reference:
+            # Without the predictions of the model, the predictions are expected to follow the target
+            if target not in reference:
+                raise ValueError(f"Reference of {dataset_name} dataset has neither the prediction {prediction} nor the target {target}")
+
+            reference[prediction] = reference[target]
+
+        return reference[columns]
+
+    if reference_store is not None:
+        reference_data, reference_hash = reference_store.load(
+            dataset_name, reference_data_path, columns, lambda: dtype_plan.fit(read_columns()), dtype_plan.declared,
+        )
+        # The stored reference has the planned types already, fitting it does not copy it
+        reference_data = dtype_plan.fit(reference_data)
+
+    else:
+        reference_data = dtype_plan.fit(read_columns())
+        reference_hash = hashlib.sha256(pd.util.hash_pandas_object(reference_data).values).hexdigest()
+
+    logging.info(f"Reference data of {dataset_name} dataset is loaded, containing {len(reference_data)} rows of {bytes_per_row(reference_data):.1f} bytes.")
+
+    return LoadedDataset(
+        name=dataset_name,
+        references=reference_data,
+        monitors=dataset_configs["monitors"],
+        column_mapping=column_mapping,
+        features=features,
+        reference_hash=reference_hash,
+        calculation_policy=CalculationPolicy(**(dataset_configs.get("calculation") or {})),
+        dtype_plan=dtype_plan,
+        prediction=prediction,
+        target=target,
+        segment_by=segment_by,
+        max_segments=dataset_configs.get("max_segments", 20),
+        horizons=dataset_configs.get("horizons") or [],
+    )
+
+
+def load_datasets(dataset_names: list[str], datasets_path: str, configs: dict, loader_workers: int, reference_store: ReferenceStore | None = None) -> dict[str, LoadedDataset]:
+    """Load and hash the reference datasets concurrently, updating the loading progress.
+
+    Args:
+        dataset_names (list[str]): names of the datasets to load
+        datasets_path (str): the directory containing one folder per dataset
+        configs (dict): the parsed config.yaml file
+        loader_workers (int): number of datasets loaded at the same time
+        reference_store (ReferenceStore | None): store sharing the references with the other workers
+
+    Returns:
+        dict[str, LoadedDataset]: the datasets which loaded successfully
+    """
+    datasets = {}
+
+    with ThreadPoolExecutor(max_workers=loader_workers) as executor:
+        futures = {
+            executor.submit(load_dataset, dataset_name, datasets_path, configs["datasets"][dataset_name], reference_store): dataset_name
+            for dataset_name in dataset_names
+        }
+
+        for future in as_completed(futures):
+            try:
+                datasets[futures[future]] = future.result()
+                LOADING_STATUS.loaded += 1
 
+            except Exception:
+                logging.exception(f"Failed to load reference data of {futures[future]} dataset")
+                LOADING_STATUS.failed += 1
+
+    return datasets
+
+
+def reload_datasets(configs: dict, dataset_names: list[str], reference_store: ReferenceStore | None = None) -> list[str]:
+    """Apply a reloaded config file or reference to the datasets it changed.
+
+    Each dataset is loaded again and swapped in once ready, while the others keep being served. A dataset which fails
+    to load keeps being monitored with its previous config and reference. In lazy mode, the datasets not loaded yet
+    are loaded with their new config on their first request.
+
+    Args:
+        configs (dict): the parsed config.yaml file
+        dataset_names (list[str]): names of the datasets whose config or reference changed
+        reference_store (ReferenceStore | None): store sharing the references with the other workers
+
+    Returns:
+        list[str]: the datasets which failed to reload
+    """
+    options = MonitoringServiceOptions(**configs["service"])
+    SERVICE.window_size = options.window_size
+    SERVICE.calculation_period_sec = options.calculation_period_sec
+    failed = []
+
+    for dataset_name in dataset_names:
+        if dataset_name not in configs["datasets"] or not os.path.isdir(os.path.join(options.datasets_path, dataset_name)):
+            SERVICE.remove_dataset(dataset_name)
+            continue
+
+        if SERVICE.loader is not None and dataset_name not in SERVICE.monitoring:
+            continue
+
+        try:
+            SERVICE.replace_dataset(load_dataset(dataset_name, options.datasets_path, configs["datasets"][dataset_name], reference_store))
+
+        except Exception:
+            logging.exception(f"Failed to reload dataset {dataset_name}, keeping its previous config and reference")
+            failed.append(dataset_name)
+
+    return failed
+
+
+def configure_service(configs: dict, config_file_path: str = "config.yaml") -> None:
+    """Configure evidently's monitoring service on server start.
+
+    The reference datasets are loaded and hashed concurrently, so the start up time is bound
+    by the largest dataset rather than the sum of all of them. In lazy mode, each dataset is
+    only loaded on its first request instead.
+
+    Args:
+        configs (dict): the parsed config.yaml file
+        config_file_path (str): path of the config.yaml file, watched for changes when reload_poll_sec is set
+    """
+    global SERVICE, INGESTOR, TAILER, WATCHER
     # Init with config file, ** = dict unpack
     monitoring_service_options = MonitoringServiceOptions(**configs["service"])
     # Load and set up reference dataset
     datasets_path = monitoring_service_options.datasets_path
-    data_loader = DataLoader()
+    dataset_names = []
+
+    for dataset_name in os.listdir(datasets_path):
+        if dataset_name in configs["datasets"]:
+            dataset_names.append(dataset_name)
 
+        else:
+            logging.error(f"{dataset_name} is not configured within the config.yaml file")
+
+    LOADING_STATUS.total = len(dataset_names)
     datasets = {}
+    reference_store = None
 
-    for dataset_name in os.listdir(datasets_path):
-        logging.info(f"Loading reference data from '{dataset_name}'")
-        reference_data_path = os.path.join(datasets_path, dataset_name, "reference.csv")
+    if monitoring_service_options.reference_store_path is not None:
+        reference_store = ReferenceStore(monitoring_service_options.reference_store_path)
 
-        if dataset_name in configs["datasets"]:
-            dataset_configs = configs["datasets"][dataset_name]
-            reference_data = data_loader.load(
-                reference_data_path,
-                DataOptions(
-                    # If no date_column specified, used none
-                    date_column=dataset_configs["column_mapping"].get("datetime", None),
-                    separator=dataset_configs["data_format"]["separator"],
-                    header=dataset_configs["data_format"]["header"],
-                ),
-            )
+    if monitoring_service_options.lazy_loading:
+        def loader(dataset_name: str) -> LoadedDataset:
+            """Load a configured dataset on its first request.
 
-            datasets[dataset_name] = LoadedDataset(
-                name=dataset_name,
-                references=reference_data,
-                monitors=dataset_configs["monitors"],
-                column_mapping=ColumnMapping(**dataset_configs["column_mapping"]),
-            )
+            Args:
+                dataset_name (str): name of the dataset
 
-            logging.info(f"Reference data of {dataset_name} dataset is loaded, containing {len(reference_data)} rows.")
+            Returns:
+                LoadedDataset: the loaded dataset
+            """
+            return load_dataset(dataset_name, datasets_path, configs["datasets"][dataset_name], reference_store)
 
-        else:
-            logging.error(f"{dataset_name} is not configured within the config.yaml file")
+    else:
+        loader = None
+        datasets = load_datasets(dataset_names, datasets_path, configs, monitoring_service_options.loader_workers, reference_store)
 
     SERVICE = MonitoringService(
         datasets=datasets,
         window_size=monitoring_service_options.window_size,
         calculation_period_sec=monitoring_service_options.calculation_period_sec,
+        loader=loader,
+        idle_ttl_sec=monitoring_service_options.idle_ttl_sec,
+        max_resident_datasets=monitoring_service_options.max_resident_datasets,
+        spill_path=monitoring_service_options.spill_path,
+        drift_workers=monitoring_service_options.drift_workers,
+        calculation_budget_share=monitoring_service_options.calculation_budget_share,
+        window_mode=monitoring_service_options.window_mode,
+        reservoir_seed=monitoring_service_options.reservoir_seed,
+        label_store_rows=monitoring_service_options.label_store_rows,
+        label_ttl_sec=monitoring_service_options.label_ttl_sec,
+        recent_request_ids=monitoring_service_options.recent_request_ids,
+        max_series_per_dataset=monitoring_service_options.max_series_per_dataset,
     )
 
+    if monitoring_service_options.ingest_queue_rows is not None:
+        INGESTOR = Ingestor(
+            SERVICE.iterate,
+            max_rows=monitoring_service_options.ingest_queue_rows,
+            policy=monitoring_service_options.ingest_policy,
+            sample_every=monitoring_service_options.ingest_sample_every,
+        )
+
+    if monitoring_service_options.warm_up:
+        SERVICE.warm_up()
+
+    LOADING_STATUS.ready = True
+
+    if monitoring_service_options.tail_files:
+        # The rows of the logs are added to the windows directly, without going through HTTP and the ingest queue
+        TAILER = FileTailer(
+            SERVICE.iterate,
+            monitoring_service_options.tail_files,
+            monitoring_service_options.tail_checkpoint_path,
+            batch_bytes=monitoring_service_options.tail_batch_bytes,
+            poll_sec=monitoring_service_options.tail_poll_sec,
+        )
+
+    if monitoring_service_options.reload_poll_sec is not None:
+        WATCHER = ConfigWatcher(
+            config_file_path,
+            configs,
+            lambda configs, dataset_names: reload_datasets(configs, dataset_names, reference_store),
+            poll_sec=monitoring_service_options.reload_poll_sec,
+        )
+
+    logging.info(f"Monitoring service is ready, {LOADING_STATUS.loaded} of {LOADING_STATUS.total} datasets loaded.")
+
+
+def start_service(config_file_path: str = "config.yaml") -> threading.Thread:
+    """Read the configs and start loading the monitoring service in the background, once per process.
+
+    The server can answer the liveness and readiness probes while the references are loading. Later calls return
+    the thread started by the first one.
+
+    Args:
+        config_file_path (str): path of the config.yaml file
+
+    Returns:
+        threading.Thread: the thread loading the service
+    """
+    global LOADER
+
+    with START_LOCK:
+        if LOADER is None:
+            configs = read_configs(config_file_path)
+            logging.info(f"Serializing JSON with {BACKEND}")
+            LOADER = threading.Thread(target=configure_service, args=(configs, config_file_path), name="service-loader", daemon=True)
+            LOADER.start()
+
+    return LOADER
+
+
+@app.before_request
+def start_on_first_request() -> None:
+    """Start loading the service on the first request of a process nothing started it in.
+
+    WSGI servers importing the app, e.g. gunicorn or waitress, do not run the __main__ block, the first request,
+    usually a probe, starts the loading instead.
+    """
+    if LOADER is None:
+        start_service()
+
 
 @app.route("/")
 def home() -> None:
@@ -253,6 +1314,26 @@ def home() -> None:
     return "Hello world from the metric server."
 
 
+@app.route("/healthz")
+def healthz() -> tuple[dict, int]:
+    """Liveness probe, reporting the progress of the reference datasets loading.
+
+    Returns:
+        tuple[dict, int]: the loading progress and the status code
+    """
+    return vars(LOADING_STATUS), 200
+
+
+@app.route("/ready")
+def ready() -> tuple[dict, int]:
+    """Readiness probe, the server only accepts data once every reference dataset is loaded.
+
+    Returns:
+        tuple[dict, int]: the loading progress and the status code
+    """
+    return vars(LOADING_STATUS), 200 if LOADING_STATUS.ready else 503
+
+
 @app.route("/iterate/<dataset>", methods=["POST"])
 def iterate(dataset: str) -> str:
     """Get the data from the inference server and call the iterate method from a MonitoringService object.
@@ -263,17 +1344,81 @@ def iterate(dataset: str) -> str:
     Returns:
         str: message to indicate whether the server is running or not.
     """
-    item = request.json
+    if not LOADING_STATUS.ready:
+        return "Service Unavailable: reference datasets are still loading", 503
+
+    try:
+        item = loads(request.get_data())
+
+    except ValueError:
+        return "Bad Request: the payload is not valid JSON", 400
 
-    global SERVICE
     if SERVICE is None:
         return "Internal Server Error: service not found", 500
 
-    SERVICE.iterate(dataset_name=dataset, new_rows=pd.DataFrame.from_dict(item))
+    if INGESTOR is None:
+        SERVICE.iterate(dataset_name=dataset, new_rows=pd.DataFrame.from_dict(item))
+        return "ok"
+
+    rows = item if isinstance(item, list) else pd.DataFrame.from_dict(item).to_dict("records")
+
+    if not INGESTOR.put(dataset, rows):
+        return "Too Many Requests: the ingest queue of the dataset is full", 429, {"Retry-After": "1"}
+
     return "ok"
 
 
+@app.route("/label/<dataset>", methods=["POST"])
+def label(dataset: str) -> tuple[dict, int]:
+    """Get the ground truth of earlier predictions, identified by the request id returned by the inference server.
+
+    Args:
+        dataset (str): the dataset of the predictions
+
+    Returns:
+        tuple[dict, int]: the number of labels joined and unknown, and the status code
+    """
+    if not LOADING_STATUS.ready:
+        return "Service Unavailable: reference datasets are still loading", 503
+
+    try:
+        item = loads(request.get_data())
+
+    except ValueError:
+        return "Bad Request: the payload is not valid JSON", 400
+
+    labels = item if isinstance(item, list) else [item]
+
+    if not all(isinstance(label, dict) for label in labels):
+        return "Bad Request: each label must be an object with a request_id and a target", 400
+
+    if SERVICE is None:
+        return "Internal Server Error: service not found", 500
+
+    try:
+        joined = SERVICE.label(dataset, labels)
+
+    except ValueError as error:
+        return f"Bad Request: {error}", 400
+
+    return {"joined": joined, "unknown": len(labels) - joined}, 200
+
+
+SERVICE: MonitoringService | None = None
+INGESTOR: Ingestor | None = None
+TAILER: FileTailer | None = None
+WATCHER: ConfigWatcher | None = None
+LOADING_STATUS = LoadingStatus()
+LOADER: threading.Thread | None = None
+START_LOCK = threading.Lock()
+
+
 if __name__ == "__main__":
-    SERVICE: MonitoringService | None = None
-    app.run(host="0.0.0.0", port="8085", debug=True)
+    debug = True
+
+    # With the debugger on, only the reloaded child process serves requests
+    if not debug or is_running_from_reloader():
+        start_service()
+
+    app.run(host="0.0.0.0", port="8085", debug=debug)
 # fmt: on
@@ -0,0 +1,189 @@
+"""Measure the size and render time of /metrics as the series of many datasets change."""
+import argparse
+import logging
+import statistics
+import time
+
+import prometheus_client
+from metric_server import MonitoringService
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+
+
+def drift_results(
+    dataset_name: str, n_features: int, n_segments: int, update: int
+) -> list:
+    """Build results shaped like the drift calculation of a dataset.
+
+    Every other update, half the features switch between K-S and chi-square,
+    as a feature does when its number of distinct values crosses 5.
+
+    Args:
+        dataset_name (str): name of the dataset
+        n_features (int): number of features
+        n_segments (int): number of segments
+        update (int): number of the update
+
+    Returns:
+        list: the metric name, labels and value of each metric
+    """
+    results = []
+
+    for index in range(n_features):
+        feature = f"feature_{index}"
+        stat_test = (
+            "chi-square p_value" if index % 2 and update % 2 else "K-S p_value"
+        )
+        labels = dict(
+            dataset_name=dataset_name,
+            feature=feature,
+            feature_type="num",
+            stat_test=stat_test,
+        )
+        results.append(("Evidently:data_drift:value", labels, 0.5))
+
+        for segment in range(n_segments):
+            results.append(
+                (
+                    "Evidently:segment_drift:value",
+                    dict(labels, segment=f"segment={segment}"),
+                    0.5,
+                )
+            )
+
+    for metric in ("n_drifted_features", "share_drifted_features"):
+        results.append(
+            (
+                f"Evidently:data_drift:{metric}",
+                dict(dataset_name=dataset_name),
+                0,
+            )
+        )
+
+    return results
+
+
+def render_time(
+    registry: prometheus_client.CollectorRegistry, repeats: int
+) -> tuple:
+    """Render a registry in the text format several times.
+
+    Args:
+        registry (prometheus_client.CollectorRegistry): the registry
+        repeats (int): number of renders
+
+    Returns:
+        tuple: the median render time in seconds and the size of the output in bytes
+    """
+    durations = []
+
+    for _ in range(repeats):
+        started = time.perf_counter()
+        output = prometheus_client.generate_latest(registry)
+        durations.append(time.perf_counter() - started)
+
+    return statistics.median(durations), len(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure /metrics as the references and tests of many datasets change"
+    )
+    parser.add_argument(
+        "-d", "--datasets", type=int, default=50, help="Number of datasets"
+    )
+    parser.add_argument(
+        "-f", "--features", type=int, default=20, help="Features per dataset"
+    )
+    parser.add_argument(
+        "-s", "--segments", type=int, default=5, help="Segments per dataset"
+    )
+    parser.add_argument(
+        "-u",
+        "--updates",
+        type=int,
+        default=10,
+        help="Reference updates of each dataset, each one publishing a new hash",
+    )
+    parser.add_argument(
+        "-m",
+        "--max-series-per-dataset",
+        type=int,
+        default=None,
+        help="Cap of the series of a dataset, none by default",
+    )
+    parser.add_argument(
+        "-r", "--repeats", type=int, default=20, help="Renders measured"
+    )
+    args = parser.parse_args()
+
+    service = MonitoringService(
+        datasets={},
+        window_size=1000,
+        calculation_period_sec=1,
+        max_series_per_dataset=args.max_series_per_dataset,
+    )
+    # Every series ever published, as exported without removing the stale ones
+    published = {}
+
+    for update in range(args.updates):
+        for index in range(args.datasets):
+            dataset_name = f"dataset_{index}"
+            service.hash[dataset_name] = f"{update:064x}"
+            service.features[dataset_name] = [None] * args.features
+            results = drift_results(
+                dataset_name, args.features, args.segments, update
+            )
+            service.publish(dataset_name, results)
+            results += [
+                (
+                    "Evidently:reference_dataset_hash",
+                    dict(dataset_name=dataset_name, hash=f"{update:064x}"),
+                    1,
+                ),
+                (
+                    "Evidently:n_features",
+                    dict(dataset_name=dataset_name),
+                    args.features,
+                ),
+            ]
+
+            for metric_key, labels, value in results:
+                published.setdefault(metric_key, {})[
+                    tuple(sorted(labels.items()))
+                ] = value
+
+    unbounded = prometheus_client.CollectorRegistry()
+
+    for metric_key, series in published.items():
+        gauge = prometheus_client.Gauge(
+            metric_key,
+            "",
+            [name for name, _ in next(iter(series))],
+            registry=unbounded,
+        )
+
+        for label_items, value in series.items():
+            gauge.labels(**dict(label_items)).set(value)
+
+    n_series = sum(
+        len(keys)
+        for owned in service.series.values()
+        for keys in owned.values()
+    )
+    n_unbounded = sum(len(series) for series in published.values())
+    duration, size = render_time(prometheus_client.REGISTRY, args.repeats)
+    unbounded_duration, unbounded_size = render_time(unbounded, args.repeats)
+
+    logging.info(
+        f"With series removal: {n_series} series, /metrics of {size / 1024:.0f} KiB "
+        f"rendered in {duration * 1000:.1f}ms"
+    )
+    logging.info(
+        f"Without: {n_unbounded} series, /metrics of {unbounded_size / 1024:.0f} KiB "
+        f"rendered in {unbounded_duration * 1000:.1f}ms"
+    )
@@ -0,0 +1,228 @@
+"""Reference datasets stored once on disk and memory mapped by every worker."""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+from collections.abc import Callable
+
+import numpy as np
+import pandas as pd
+
+# Bump when the layout of the stored references changes
+STORE_VERSION = 2
+
+
+class ReferenceStore:
+    """Columnar store of the reference datasets, shared by the server workers.
+
+    The first worker loading a reference writes its monitored features as one
+    NumPy matrix per storage type together with the reference hash. Every
+    worker, including the first one, then memory maps the matrices read-only,
+    so the operating system keeps a single copy of the reference in its page
+    cache however many workers are running. Non numerical features are stored
+    as category codes.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialise the store.
+
+        Args:
+            path (str): the directory holding the stored references
+        """
+        self.path = path
+
+    def source_info(
+        self, reference_data_path: str, features: list, dtypes: dict
+    ) -> dict:
+        """Describe the reference file a stored reference is built from.
+
+        Args:
+            reference_data_path (str): path of the reference csv file
+            features (list): the monitored features
+            dtypes (dict): the storage types declared in the config file
+
+        Returns:
+            dict: the version, file path, size, modification time, features and types
+        """
+        stat = os.stat(reference_data_path)
+        return {
+            "version": STORE_VERSION,
+            "source": os.path.abspath(reference_data_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "features": features,
+            "dtypes": dtypes,
+        }
+
+    def load(
+        self,
+        dataset_name: str,
+        reference_data_path: str,
+        features: list,
+        read_reference: Callable[[], pd.DataFrame],
+        dtypes: dict | None = None,
+    ) -> tuple:
+        """Get the memory mapped reference of a dataset, storing it first if needed.
+
+        Args:
+            dataset_name (str): name of the dataset
+            reference_data_path (str): path of the reference csv file
+            features (list): the monitored features
+            read_reference (Callable[[], pd.DataFrame]): reads the reference csv file, with its storage types
+            dtypes (dict | None): the storage types declared in the config file
+
+        Returns:
+            tuple: the reference data frame and its hash
+        """
+        dataset_path = os.path.join(self.path, dataset_name)
+        source_info = self.source_info(
+            reference_data_path, features, dtypes or {}
+        )
+        os.makedirs(self.path, exist_ok=True)
+
+        # Only one worker stores the reference, the others wait for it
+        with open(f"{dataset_path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            try:
+                meta = self.read_meta(dataset_path)
+
+                if meta is None or meta["source_info"] != source_info:
+                    meta = self.store(
+                        dataset_path, read_reference()[features], source_info
+                    )
+
+                else:
+                    logging.info(
+                        f"Using the stored reference of {dataset_name} dataset"
+                    )
+
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        return self.open(dataset_path, meta), meta["hash"]
+
+    @staticmethod
+    def read_meta(dataset_path: str) -> dict | None:
+        """Read the description of a stored reference.
+
+        Args:
+            dataset_path (str): directory of the stored reference
+
+        Returns:
+            dict | None: the description, None if the reference is not stored
+        """
+        meta_path = os.path.join(dataset_path, "meta.json")
+
+        if not os.path.exists(meta_path):
+            return None
+
+        with open(meta_path) as meta_file:
+            return json.load(meta_file)
+
+    @staticmethod
+    def store(
+        dataset_path: str, reference: pd.DataFrame, source_info: dict
+    ) -> dict:
+        """Write a reference as numerical matrices and category codes.
+
+        Args:
+            dataset_path (str): directory of the stored reference
+            reference (pd.DataFrame): the monitored features of the reference
+            source_info (dict): description of the reference file
+
+        Returns:
+            dict: the description of the stored reference
+        """
+        numerical = {}
+        categories = {}
+        tmp_path = f"{dataset_path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        for feature in reference.columns:
+            column = reference[feature]
+
+            if pd.api.types.is_numeric_dtype(column):
+                numerical.setdefault(column.dtype.name, []).append(feature)
+                continue
+
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                codes = column.cat.codes.to_numpy()
+                uniques = column.cat.categories
+
+            else:
+                codes, uniques = pd.factorize(column)
+                codes = codes.astype(np.min_scalar_type(-len(uniques) - 1))
+
+            np.save(os.path.join(tmp_path, f"{feature}.codes.npy"), codes)
+            categories[feature] = uniques.tolist()
+
+        for dtype, features in numerical.items():
+            np.save(
+                os.path.join(tmp_path, f"numerical.{dtype}.npy"),
+                reference[features].to_numpy(dtype=dtype),
+            )
+
+        meta = {
+            "source_info": source_info,
+            "numerical": numerical,
+            "categories": categories,
+            "hash": hashlib.sha256(
+                pd.util.hash_pandas_object(reference).values
+            ).hexdigest(),
+        }
+
+        with open(os.path.join(tmp_path, "meta.json"), "w") as meta_file:
+            json.dump(meta, meta_file)
+
+        # Swap the whole directory, readers never see a partially stored reference
+        shutil.rmtree(dataset_path, ignore_errors=True)
+        os.replace(tmp_path, dataset_path)
+        logging.info(f"Stored reference at path: {dataset_path}")
+        return meta
+
+    @staticmethod
+    def open(dataset_path: str, meta: dict) -> pd.DataFrame:
+        """Memory map a stored reference as a data frame.
+
+        The numerical features are views of the mapped matrices and the codes
+        of the categorical ones are the mapped arrays, none of them is copied.
+
+        Args:
+            dataset_path (str): directory of the stored reference
+            meta (dict): the description of the stored reference
+
+        Returns:
+            pd.DataFrame: the reference data
+        """
+        frames = [
+            pd.DataFrame(
+                np.load(
+                    os.path.join(dataset_path, f"numerical.{dtype}.npy"),
+                    mmap_mode="r",
+                ),
+                columns=features,
+                copy=False,
+            )
+            for dtype, features in meta["numerical"].items()
+        ]
+
+        for feature, categories in meta["categories"].items():
+            codes = np.load(
+                os.path.join(dataset_path, f"{feature}.codes.npy"),
+                mmap_mode="r",
+            )
+            # Assigning a column would copy the codes, a new frame keeps them
+            frames.append(
+                pd.DataFrame(
+                    {feature: pd.Categorical.from_codes(codes, categories)},
+                    copy=False,
+                )
+            )
+
+        return (
+            pd.concat(frames, axis=1, copy=False) if frames else pd.DataFrame()
+        )
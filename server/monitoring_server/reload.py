@@ -0,0 +1,257 @@
+"""Hot reload of the config file and the reference datasets, applied per dataset."""
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+
+import yaml
+from prometheus_client import Counter
+
+# Options of the service section applied without a restart, every dataset is rebuilt when they change
+RELOADABLE_OPTIONS = ("window_size", "calculation_period_sec")
+
+
+def file_identity(path: str) -> tuple | None:
+    """Identify the content of a file without reading it.
+
+    Args:
+        path (str): path of the file
+
+    Returns:
+        tuple | None: the inode, size and modification time, None if the file does not exist
+    """
+    try:
+        stat = os.stat(path)
+
+    except FileNotFoundError:
+        return None
+
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def fingerprints(datasets: dict, datasets_path: str) -> dict:
+    """Fingerprint the config and the reference file of each monitored dataset.
+
+    Like on start, a dataset is monitored when it has both a config and a folder
+    in the datasets directory.
+
+    Args:
+        datasets (dict): the datasets section of the config file
+        datasets_path (str): the directory containing one folder per dataset
+
+    Returns:
+        dict: the config, as JSON, and the identity of the reference of each dataset
+    """
+    return {
+        dataset_name: (
+            json.dumps(dataset_configs, sort_keys=True, default=str),
+            file_identity(
+                os.path.join(datasets_path, dataset_name, "reference.csv")
+            ),
+        )
+        for dataset_name, dataset_configs in datasets.items()
+        if os.path.isdir(os.path.join(datasets_path, dataset_name))
+    }
+
+
+def validate_configs(configs: object) -> None:
+    """Check a parsed config file has a datasets and a service section.
+
+    Args:
+        configs (object): the parsed config file
+
+    Raises:
+        ValueError: if a section is missing or is not a mapping
+    """
+    if not isinstance(configs, dict) or not all(
+        isinstance(configs.get(section), dict)
+        for section in ("datasets", "service")
+    ):
+        raise ValueError("expected a datasets and a service section")
+
+
+def update(target: dict, key: str, source: dict) -> None:
+    """Set a key of a dict to its value in another, removing it if the other does not have it.
+
+    Args:
+        target (dict): the dict updated
+        key (str): the key
+        source (dict): the dict holding the new value
+    """
+    if key in source:
+        target[key] = source[key]
+
+    else:
+        target.pop(key, None)
+
+
+class ConfigWatcher:
+    """Watch the config file and the references, reloading the datasets they changed.
+
+    A worker thread polls the modification time of the config file and of the
+    reference of each dataset. When the config of a dataset or its reference
+    changed, or it was added or removed, only this dataset is reloaded. When
+    one of the RELOADABLE_OPTIONS changed, every dataset is. The other options
+    of the service section are only applied on restart.
+
+    An invalid config file is ignored until it changes again, the datasets keep
+    being monitored with the last valid one. Only the options and the datasets
+    reloaded are updated in the configs the service runs with, in place, so the
+    lazy loader reads the new config of a dataset on its next load. A dataset
+    which failed to reload keeps its previous config and is retried on the next
+    check.
+    """
+
+    def __init__(
+        self,
+        config_file_path: str,
+        configs: dict,
+        reload: Callable[[dict, list], list],
+        poll_sec: float = 5.0,
+    ) -> None:
+        """Fingerprint the current configs and start watching.
+
+        Args:
+            config_file_path (str): path of the config.yaml file
+            configs (dict): the parsed config file the service was configured with
+            reload (Callable[[dict, list], list]): applies the new configs to the named datasets, returning the ones which failed
+            poll_sec (float): seconds between two checks of the files
+        """
+        self.config_file_path = config_file_path
+        self.configs = configs
+        self.reload = reload
+        self.poll_sec = poll_sec
+        self.config_identity = file_identity(config_file_path)
+        # The last valid config file read, the changes are found against it
+        self.read = copy.deepcopy(configs)
+        self.fingerprints = self.fingerprint(configs)
+        self.reloads = Counter(
+            "Evidently:dataset_reloads",
+            "Datasets rebuilt after their config or reference changed",
+            labelnames=["dataset_name", "outcome"],
+        )
+        self.worker = threading.Thread(
+            target=self.run, name="config-watcher", daemon=True
+        )
+        self.worker.start()
+
+    def fingerprint(self, configs: dict) -> dict:
+        """Fingerprint the datasets of a config file, in the datasets directory the service runs with.
+
+        Args:
+            configs (dict): the parsed config file
+
+        Returns:
+            dict: the config, as JSON, and the identity of the reference of each dataset
+        """
+        return fingerprints(
+            configs["datasets"], self.configs["service"]["datasets_path"]
+        )
+
+    def read_configs(self) -> dict | None:
+        """Read the config file if it changed since the last check.
+
+        Returns:
+            dict | None: the parsed config file, None if it is unchanged or invalid
+        """
+        identity = file_identity(self.config_file_path)
+
+        if identity == self.config_identity:
+            return None
+
+        self.config_identity = identity
+
+        try:
+            with open(self.config_file_path, "rb") as config_file:
+                configs = yaml.safe_load(config_file)
+
+            validate_configs(configs)
+
+        except (OSError, ValueError, yaml.YAMLError) as error:
+            logging.error(
+                f"Invalid config file {self.config_file_path}, keeping the current configs: {error}"
+            )
+            return None
+
+        return configs
+
+    def poll(self) -> None:
+        """Reload the datasets whose config or reference changed since the last check."""
+        configs = self.read_configs() or self.read
+        current = self.fingerprint(configs)
+        dataset_names = current.keys() | self.fingerprints.keys()
+        service, read_service = configs["service"], self.read["service"]
+        changed_options = {
+            option
+            for option in service.keys() | read_service.keys()
+            if service.get(option) != read_service.get(option)
+        }
+        reloaded_options = changed_options.intersection(RELOADABLE_OPTIONS)
+
+        if reloaded_options:
+            changed = sorted(dataset_names)
+
+        else:
+            previous = self.fingerprints
+            changed = sorted(
+                dataset_name
+                for dataset_name in dataset_names
+                if current.get(dataset_name) != previous.get(dataset_name)
+            )
+
+        ignored = sorted(changed_options.difference(RELOADABLE_OPTIONS))
+
+        if ignored:
+            logging.warning(
+                f"Service options {ignored} changed, they are applied on restart"
+            )
+
+        self.read = configs
+
+        if not changed:
+            self.fingerprints = current
+            return
+
+        # The lazy loader holds these configs, they only get what is applied
+        datasets = self.configs["datasets"]
+        previous_datasets = {
+            dataset_name: datasets[dataset_name]
+            for dataset_name in changed
+            if dataset_name in datasets
+        }
+
+        for option in reloaded_options:
+            update(self.configs["service"], option, service)
+
+        for dataset_name in changed:
+            update(datasets, dataset_name, configs["datasets"])
+
+        logging.info(f"Reloading datasets {changed}")
+        failed = self.reload(self.configs, changed)
+
+        for dataset_name in changed:
+            self.reloads.labels(
+                dataset_name=dataset_name,
+                outcome="failed" if dataset_name in failed else "reloaded",
+            ).inc()
+
+        # The datasets which failed keep their previous config and are retried
+        for dataset_name in failed:
+            update(datasets, dataset_name, previous_datasets)
+            update(current, dataset_name, self.fingerprints)
+
+        self.fingerprints = current
+
+    def run(self) -> None:
+        """Check the files every poll_sec seconds."""
+        while True:
+            time.sleep(self.poll_sec)
+
+            try:
+                self.poll()
+
+            except Exception:
+                logging.exception("Failed to reload the configs")
@@ -0,0 +1,54 @@
+"""Uniform sample of a stream of rows in a fixed size window."""
+import zlib
+
+import numpy as np
+
+SLIDING = "sliding"
+RESERVOIR = "reservoir"
+WINDOW_MODES = (SLIDING, RESERVOIR)
+
+
+def reservoir_rng(seed: int, dataset_name: str) -> np.random.Generator:
+    """Create the random generator of the reservoir of a dataset.
+
+    Args:
+        seed (int): the seed shared by the datasets
+        dataset_name (str): name of the dataset, so each dataset samples differently
+
+    Returns:
+        np.random.Generator: the generator, the same on every run
+    """
+    # Python's string hash changes between processes, the CRC does not
+    return np.random.default_rng([seed, zlib.crc32(dataset_name.encode())])
+
+
+def replacements(
+    rng: np.random.Generator, seen: int, n_rows: int, size: int
+) -> tuple:
+    """Draw the reservoir positions replaced by new rows, following Algorithm R.
+
+    The t-th row of the stream replaces a uniformly drawn position of the full
+    reservoir with probability size / t, so the reservoir is always a uniform
+    sample of the stream. The draws of a batch are vectorized, when several
+    rows replace the same position only the last one is kept, as if the rows
+    had been sampled one by one.
+
+    Args:
+        rng (np.random.Generator): the generator of the reservoir
+        seen (int): the number of rows of the stream before the new ones
+        n_rows (int): the number of new rows
+        size (int): the size of the reservoir, full already
+
+    Returns:
+        tuple: the indices of the new rows kept and the positions they replace
+    """
+    if not n_rows:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+
+    positions = rng.integers(0, seen + np.arange(1, n_rows + 1))
+    kept = np.flatnonzero(positions < size)
+    positions = positions[kept]
+    # The first occurrence of each position in reverse order is its last write
+    _, last = np.unique(positions[::-1], return_index=True)
+    last = len(positions) - 1 - last
+    return kept[last], positions[last]
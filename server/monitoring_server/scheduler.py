@@ -0,0 +1,245 @@
+"""Decide when the drift of a dataset is worth recalculating."""
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class CalculationPolicy:
+    """When to recalculate the drift of a dataset, any trigger is enough.
+
+    period_sec: recalculate once this many seconds passed since the last calculation
+    min_new_rows: recalculate once this many rows arrived since the last calculation
+    shift_threshold: recalculate once the mean of a numerical feature in the window moved
+        by this many reference standard deviations since the last calculation
+    min_period_sec: never recalculate more often than this, whatever the triggers
+    """
+
+    period_sec: float | None = None
+    min_new_rows: int | None = None
+    shift_threshold: float | None = None
+    min_period_sec: float = 0
+
+
+class CalculationBudget:
+    """Budget of the time spent calculating, shared by all the datasets.
+
+    The datasets are calculated from several threads. With a cap, the budget is
+    held from the check allowing a calculation until its time is recorded, so
+    the calculations run one at a time and cannot overspend it together.
+    """
+
+    def __init__(self, max_share: float | None, period_sec: float = 60) -> None:
+        """Initialise the budget.
+
+        Args:
+            max_share (float | None): share of the time calculations may use, no cap if None
+            period_sec (float): the sliding period the time spent is measured over
+        """
+        self.max_share = max_share
+        self.period_sec = period_sec
+        self.spent = deque()
+        self.lock = threading.Lock()
+
+    def used(self, now: float) -> float:
+        """Seconds spent calculating during the last period.
+
+        Args:
+            now (float): the current monotonic time
+
+        Returns:
+            float: the seconds spent
+        """
+        while self.spent and self.spent[0][0] < now - self.period_sec:
+            self.spent.popleft()
+
+        return sum(duration for _, duration in self.spent)
+
+    def allows(self, now: float) -> bool:
+        """Whether a calculation can run without exceeding the budget, holding the budget until it is recorded if so.
+
+        Args:
+            now (float): the current monotonic time
+
+        Returns:
+            bool: True if the budget is not exhausted, record must then be called
+        """
+        if self.max_share is None:
+            return True
+
+        # Waits for the calculation of another dataset to be recorded
+        self.lock.acquire()
+
+        if self.used(now) < self.max_share * self.period_sec:
+            return True
+
+        self.lock.release()
+        return False
+
+    def record(self, now: float, duration: float) -> None:
+        """Record the time a calculation allowed by the budget took, releasing the budget.
+
+        Args:
+            now (float): the current monotonic time
+            duration (float): the seconds the calculation took
+        """
+        if self.max_share is None:
+            return
+
+        self.spent.append((now, duration))
+        self.lock.release()
+
+
+class CalculationScheduler:
+    """Track the rows arriving in the window of a dataset to decide when to recalculate.
+
+    The window means are kept as running sums of the numerical features, so
+    the shift trigger costs O(new rows) rather than O(window) per request. The
+    content of the window is fingerprinted the same way, as the sum of the
+    hashes of its rows: it does not depend on the order of the rows, which the
+    drift tests ignore too.
+    """
+
+    def __init__(
+        self,
+        policy: CalculationPolicy,
+        budget: CalculationBudget,
+        reference: pd.DataFrame,
+    ) -> None:
+        """Initialise the scheduler.
+
+        Args:
+            policy (CalculationPolicy): the triggers of the dataset
+            budget (CalculationBudget): the time budget shared by the datasets
+            reference (pd.DataFrame): the reference data, used to scale the shifts
+        """
+        self.policy = policy
+        self.budget = budget
+        self.numerical_features = [
+            feature
+            for feature in reference.columns
+            if pd.api.types.is_numeric_dtype(reference[feature])
+        ]
+        scale = reference[self.numerical_features].std().to_numpy()
+        # Constant features shift by their absolute value instead
+        self.scale = np.where(scale > 0, scale, 1.0)
+        self.sums = np.zeros(len(self.numerical_features))
+        self.size = 0
+        self.window_hash = 0
+        self.new_rows = 0
+        self.last_run = None
+        self.last_means = None
+
+    def update(self, added: pd.DataFrame, removed: pd.DataFrame) -> None:
+        """Account for the rows added to and removed from the window.
+
+        Args:
+            added (pd.DataFrame): the rows added to the window
+            removed (pd.DataFrame): the rows evicted from the window
+        """
+        self.sums += added[self.numerical_features].sum().to_numpy(float)
+        self.sums -= removed[self.numerical_features].sum().to_numpy(float)
+        self.size += len(added) - len(removed)
+        self.new_rows += len(added)
+        self.window_hash = (
+            self.window_hash + self.rows_hash(added) - self.rows_hash(removed)
+        ) % 2**64
+
+    def rows_hash(self, rows: pd.DataFrame) -> int:
+        """Hash a set of rows, whatever their order.
+
+        Numerical features are hashed as floats, so a value hashes the same
+        whether it was sent as an integer or a float.
+
+        Args:
+            rows (pd.DataFrame): the rows to hash
+
+        Returns:
+            int: the 64 bits hash
+        """
+        if rows.empty:
+            return 0
+
+        rows = rows.astype(
+            {feature: float for feature in self.numerical_features}
+        )
+        hashes = pd.util.hash_pandas_object(rows, index=False).to_numpy()
+        # The sum of unsigned integers wraps around, as the hash needs
+        return int(hashes.sum(dtype=np.uint64))
+
+    def shift(self) -> float:
+        """Largest move of a feature mean since the last calculation.
+
+        Returns:
+            float: the shift, in reference standard deviations
+        """
+        if self.last_means is None or not self.size or not len(self.sums):
+            return 0.0
+
+        means = self.sums / self.size
+        return float(np.max(np.abs(means - self.last_means) / self.scale))
+
+    def trigger(self, now: float) -> tuple:
+        """Decide whether to recalculate now.
+
+        Args:
+            now (float): the current monotonic time
+
+        Returns:
+            tuple: whether to recalculate, and the trigger or the reason to skip
+        """
+        policy = self.policy
+
+        if self.last_run is None:
+            reason = "first"
+
+        elif now - self.last_run < policy.min_period_sec:
+            return False, "min_period"
+
+        elif policy.period_sec is not None and (
+            now - self.last_run >= policy.period_sec
+        ):
+            reason = "time"
+
+        elif policy.min_new_rows is not None and (
+            self.new_rows >= policy.min_new_rows
+        ):
+            reason = "rows"
+
+        elif policy.shift_threshold is not None and (
+            self.shift() >= policy.shift_threshold
+        ):
+            reason = "shift"
+
+        else:
+            return False, "not_due"
+
+        if not self.budget.allows(now):
+            return False, "budget"
+
+        # The budget is held until calculated or failed is called
+        return True, reason
+
+    def calculated(self, now: float, duration: float) -> None:
+        """Record a calculation.
+
+        Args:
+            now (float): the monotonic time the calculation started
+            duration (float): the seconds the calculation took
+        """
+        self.last_run = now
+        self.new_rows = 0
+        self.last_means = self.sums / self.size if self.size else None
+        self.budget.record(now, duration)
+
+    def failed(self, now: float, duration: float) -> None:
+        """Record a calculation which failed, the window stays due.
+
+        Args:
+            now (float): the monotonic time the calculation started
+            duration (float): the seconds the calculation took
+        """
+        self.budget.record(now, duration)
@@ -0,0 +1,351 @@
+"""Drift of the features within the segments of a dataset, e.g. per waterfront value."""
+from typing import Generator
+
+import numpy as np
+import pandas as pd
+from drift_engine import DEFAULT_THRESHOLD, DriftMetric, FeatureEncoder
+from evidently.options.data_drift import DataDriftOptions
+from evidently.pipeline.column_mapping import ColumnMapping
+from scipy.stats import chi2, ks_2samp, norm
+
+SEGMENT_DRIFT_VALUE = DriftMetric("segment_drift:value")
+SEGMENT_SHARE_DRIFTED_FEATURES = DriftMetric(
+    "segment_drift:share_drifted_features"
+)
+SEGMENT_ROWS = DriftMetric("segment_drift:n_rows")
+# Segment of the rows outside the largest segments of the reference
+OTHER = "other"
+
+
+def segment_columns(segment_by: list) -> list:
+    """Get the columns a dataset is segmented by.
+
+    Args:
+        segment_by (list): column names, or dictionaries with a column and its bins
+
+    Returns:
+        list: the column names
+    """
+    return [
+        spec["column"] if isinstance(spec, dict) else spec
+        for spec in segment_by
+    ]
+
+
+def grouped(ids: np.ndarray, values: np.ndarray, n_segments: int) -> tuple:
+    """Sort values by segment, then by value, dropping the missing ones.
+
+    Args:
+        ids (np.ndarray): the segment id of each value, -1 for none
+        values (np.ndarray): the values
+        n_segments (int): the number of segments
+
+    Returns:
+        tuple: the sorted values, their segment ids and the bounds of each segment
+    """
+    kept = np.isfinite(values) & (ids >= 0)
+    ids = ids[kept]
+    values = values[kept]
+    order = np.lexsort((values, ids))
+    ids = ids[order]
+    bounds = np.searchsorted(ids, np.arange(n_segments + 1))
+    return values[order], ids, bounds
+
+
+def stacked_counts(
+    ids: np.ndarray, codes: np.ndarray, shape: tuple
+) -> np.ndarray:
+    """Count the values of each group in a single pass.
+
+    Args:
+        ids (np.ndarray): the group of each value
+        codes (np.ndarray): the code of each value, below the number of keys
+        shape (tuple): the number of groups and of keys
+
+    Returns:
+        np.ndarray: the counts, one row per group
+    """
+    n_groups, n_keys = shape
+    return np.bincount(
+        ids * n_keys + codes, minlength=n_groups * n_keys
+    ).reshape(shape)
+
+
+def count_tests(
+    reference_counts: np.ndarray, current_counts: np.ndarray
+) -> tuple:
+    """Run the chi-square or Z-test of every group from their stacked counts.
+
+    Like Evidently, chi-square is used with more than 2 distinct values and the
+    Z-test with 2, the p-value is 1 with a single value.
+
+    Args:
+        reference_counts (np.ndarray): the reference counts of each value, one row per group
+        current_counts (np.ndarray): the current counts of each value, one row per group
+
+    Returns:
+        tuple: the p-value, the number of distinct values and the test name of each group
+    """
+    n_groups, n_keys = current_counts.shape
+    present = (reference_counts + current_counts) > 0
+    distinct = present.sum(axis=1)
+    reference_rows = reference_counts.sum(axis=1)
+    current_rows = current_counts.sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected = reference_counts * (current_rows / reference_rows)[:, None]
+        terms = np.where(
+            present, (current_counts - expected) ** 2 / expected, 0.0
+        )
+        chi_square = chi2.sf(terms.sum(axis=1), distinct - 1)
+
+        # Share of the rows not equal to the smallest value of the group
+        largest = n_keys - 1 - np.argmax(present[:, ::-1], axis=1)
+        groups = np.arange(n_groups)
+        reference_largest = reference_counts[groups, largest]
+        current_largest = current_counts[groups, largest]
+        p1 = reference_largest / reference_rows
+        p2 = current_largest / current_rows
+        p = (reference_largest + current_largest) / (
+            reference_rows + current_rows
+        )
+        z_stat = (p1 - p2) / np.sqrt(
+            p * (1 - p) * (1.0 / reference_rows + 1.0 / current_rows)
+        )
+        z_test = 2 * (1 - norm.cdf(np.abs(z_stat)))
+
+    p_values = np.where(
+        distinct > 2, chi_square, np.where(distinct == 2, z_test, 1.0)
+    )
+    stat_tests = np.where(distinct > 2, "chi-square p_value", "Z-test p_value")
+    return p_values, distinct, stat_tests
+
+
+class SegmentedDrift:
+    """Drift of every feature within each segment of a dataset.
+
+    The segments are the combinations of values of the `segment_by` columns,
+    numerical columns can be cut into bands. Only the `max_segments` largest
+    segments of the reference are monitored, the rows of the others are
+    merged into an "other" segment, so the number of series stays bounded.
+
+    The reference is split by segment and sorted once. The window is encoded
+    and split with a single sort per feature, the tests based on value counts
+    are run for all the segments at once and K-S on the sorted slices. The
+    tests are the ones of the drift engine, so a segment yields the p-values
+    Evidently would on its rows.
+    """
+
+    def __init__(
+        self,
+        reference: pd.DataFrame,
+        column_mapping: ColumnMapping,
+        segment_by: list,
+        options: DataDriftOptions,
+        max_segments: int = 20,
+    ) -> None:
+        """Split the reference into segments.
+
+        Args:
+            reference (pd.DataFrame): the reference, with the segment columns
+            column_mapping (ColumnMapping): the numerical and categorical features
+            segment_by (list): column names, or dictionaries with a column and its bins
+            options (DataDriftOptions): the thresholds to use
+            max_segments (int): the number of reference segments monitored apart
+        """
+        self.bins = {
+            spec["column"]: spec["bins"]
+            for spec in segment_by
+            if isinstance(spec, dict)
+        }
+        self.columns = segment_columns(segment_by)
+        self.options = options
+        self.encoder = FeatureEncoder(reference, column_mapping)
+        counts = self.keys(reference).value_counts()
+        # Bands without rows are counted too
+        counts = counts[counts > 0]
+        self.index = counts.index[:max_segments]
+        self.segments = [self.label(key) for key in self.index]
+
+        if len(counts) > max_segments:
+            self.segments.append(OTHER)
+
+        reference_ids = self.segment_ids(reference)
+        # The sorted values of each feature, their segment ids and a view per segment
+        self.reference = []
+
+        for values in self.encoder.reference.T:
+            values, ids, bounds = grouped(
+                reference_ids, values, len(self.segments)
+            )
+            self.reference.append((values, ids, np.split(values, bounds[1:-1])))
+
+        self.results = []
+        self.rows = np.zeros(len(self.segments), dtype=int)
+
+    def keys(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Get the segment columns of rows, cut into bands when they have bins.
+
+        Args:
+            data (pd.DataFrame): the rows
+
+        Returns:
+            pd.DataFrame: the segment values of each row
+        """
+        return pd.DataFrame(
+            {
+                column: (
+                    pd.cut(data[column].astype(float), self.bins[column])
+                    if column in self.bins
+                    else data[column]
+                )
+                for column in self.columns
+            }
+        )
+
+    def label(self, key: tuple) -> str:
+        """Format the label of a segment.
+
+        Args:
+            key (tuple): the value of each segment column
+
+        Returns:
+            str: the label, e.g. "waterfront=1"
+        """
+        return ",".join(
+            f"{column}={value}" for column, value in zip(self.columns, key)
+        )
+
+    def segment_ids(self, data: pd.DataFrame) -> np.ndarray:
+        """Find the segment of each row.
+
+        Args:
+            data (pd.DataFrame): the rows
+
+        Returns:
+            np.ndarray: the segment id of each row, -1 when it has no segment
+        """
+        keys = self.keys(data)
+        ids = self.index.get_indexer(
+            pd.MultiIndex.from_arrays([keys[column] for column in self.columns])
+        )
+
+        if self.segments[-1] == OTHER:
+            # Missing values have no segment, as they have none in the reference
+            ids = np.where(
+                (ids < 0) & keys.notna().all(axis=1).to_numpy(),
+                len(self.segments) - 1,
+                ids,
+            )
+
+        return ids
+
+    def threshold(self, feature: str, feature_type: str) -> float:
+        """Get the p-value threshold of a feature.
+
+        Args:
+            feature (str): name of the feature
+            feature_type (str): either "num" or "cat"
+
+        Returns:
+            float: the threshold
+        """
+        threshold = self.options.get_threshold(feature, feature_type)
+        return DEFAULT_THRESHOLD if threshold is None else threshold
+
+    def execute(self, current_data: pd.DataFrame) -> None:
+        """Calculate the drift of every feature within each segment of the window.
+
+        Args:
+            current_data (pd.DataFrame): the window, with the segment columns
+        """
+        n_segments = len(self.segments)
+        current = self.encoder.encode(current_data)
+        current_ids = self.segment_ids(current_data)
+        self.rows = np.bincount(
+            current_ids[current_ids >= 0], minlength=n_segments
+        )
+        self.results = []
+
+        for index, (feature, feature_type) in enumerate(self.encoder.features):
+            reference_values, reference_ids, reference_slices = self.reference[
+                index
+            ]
+            current_values, ids, bounds = grouped(
+                current_ids, current[:, index], n_segments
+            )
+            keys, inverse = np.unique(
+                np.concatenate([reference_values, current_values]),
+                return_inverse=True,
+            )
+            shape = (n_segments, max(len(keys), 1))
+            n_reference = len(reference_values)
+            p_values, distinct, stat_tests = count_tests(
+                stacked_counts(reference_ids, inverse[:n_reference], shape),
+                stacked_counts(ids, inverse[n_reference:], shape),
+            )
+            threshold = self.threshold(feature, feature_type)
+
+            # Views of the sorted values, one per segment
+            segment_slices = zip(
+                reference_slices, np.split(current_values, bounds[1:-1])
+            )
+
+            for segment, (reference_slice, current_slice) in enumerate(
+                segment_slices
+            ):
+                if not len(reference_slice) or not len(current_slice):
+                    continue
+
+                if feature_type == "num" and distinct[segment] > 5:
+                    p_value = ks_2samp(reference_slice, current_slice)[1]
+                    drift_detected = bool(p_value <= threshold)
+                    stat_test = "K-S p_value"
+
+                else:
+                    p_value = float(p_values[segment])
+                    drift_detected = bool(p_value < threshold)
+                    stat_test = str(stat_tests[segment])
+
+                self.results.append(
+                    (
+                        self.segments[segment],
+                        feature,
+                        feature_type,
+                        stat_test,
+                        p_value,
+                        drift_detected,
+                    )
+                )
+
+    def metrics(self) -> Generator[tuple, None, None]:
+        """Yield the metrics of the last calculation.
+
+        Yields:
+            tuple: the metric, its value and its labels
+        """
+        drifted = {}
+
+        for (
+            segment,
+            feature,
+            feature_type,
+            stat_test,
+            p_value,
+            drift,
+        ) in self.results:
+            drifted.setdefault(segment, []).append(drift)
+            yield SEGMENT_DRIFT_VALUE, p_value, dict(
+                segment=segment,
+                feature=feature,
+                feature_type=feature_type,
+                stat_test=stat_test,
+            )
+
+        for segment, drifts in drifted.items():
+            yield SEGMENT_SHARE_DRIFTED_FEATURES, sum(drifts) / len(
+                drifts
+            ), dict(segment=segment)
+
+        for segment, n_rows in zip(self.segments, self.rows):
+            yield SEGMENT_ROWS, int(n_rows), dict(segment=segment)
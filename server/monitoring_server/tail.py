@@ -0,0 +1,315 @@
+"""Ingestion of JSONL prediction logs, tailed from checkpointed byte offsets."""
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+
+import pandas as pd
+from prometheus_client import Counter, Gauge
+
+from serialization import loads
+
+
+def parse_lines(lines: list) -> tuple:
+    """Parse JSON lines, all at once when they are all valid.
+
+    The lines are joined into a single JSON array, so a batch is parsed with
+    one call. When the batch has an invalid line, the lines are parsed one by
+    one to skip it.
+
+    Args:
+        lines (list): the lines, as bytes
+
+    Returns:
+        tuple: the rows, as dictionaries, and the number of invalid lines
+    """
+    try:
+        rows = loads(b"[" + b",".join(lines) + b"]")
+
+    except ValueError:
+        rows = None
+
+    if rows is not None and len(rows) == len(lines):
+        valid = [row for row in rows if isinstance(row, dict)]
+        return valid, len(rows) - len(valid)
+
+    valid = []
+
+    for line in lines:
+        try:
+            row = loads(line)
+
+        except ValueError:
+            continue
+
+        if isinstance(row, dict):
+            valid.append(row)
+
+    return valid, len(lines) - len(valid)
+
+
+class TailedFile:
+    """A JSONL file of a dataset, read up to its last complete line."""
+
+    def __init__(self, path: str, dataset_name: str) -> None:
+        """Initialise a file which is not opened yet.
+
+        Args:
+            path (str): path of the file
+            dataset_name (str): the dataset its rows belong to
+        """
+        self.path = path
+        self.dataset_name = dataset_name
+        self.handle = None
+        # Device and inode of the opened file, which change when it is rotated
+        self.identity = None
+        self.offset = 0
+
+
+class FileTailer:
+    """Tail JSONL files into the windows of their datasets, bypassing HTTP.
+
+    A worker thread reads each file in batches of up to `batch_bytes`, parses
+    the complete lines of a batch with a single call and passes them to the
+    monitoring service as one data frame. The offset of the last line read
+    from each file is checkpointed with the identity of the file once its rows
+    are processed, so a restart resumes where it stopped. A row may be
+    processed twice if the server stops between the two.
+
+    Rotation is detected at the end of a file: when the path points to another
+    file, the rest of the old one is read before following the new one from
+    its start, when the file got shorter it was truncated and is read again
+    from its start.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[str, pd.DataFrame], None],
+        files: list,
+        checkpoint_path: str,
+        batch_bytes: int = 4_194_304,
+        poll_sec: float = 1.0,
+    ) -> None:
+        """Restore the checkpoints and start tailing.
+
+        Args:
+            process (Callable[[str, pd.DataFrame], None]): adds rows to the window of a dataset
+            files (list): dictionaries with the path of a file and the dataset of its rows
+            checkpoint_path (str): path of the file keeping the offset reached in each file
+            batch_bytes (int): the maximum number of bytes read at once from a file
+            poll_sec (float): seconds to wait for new lines once every file is read
+        """
+        self.process = process
+        self.files = [
+            TailedFile(file["path"], file["dataset"]) for file in files
+        ]
+        self.checkpoint_path = checkpoint_path
+        self.batch_bytes = batch_bytes
+        self.poll_sec = poll_sec
+        self.checkpoints = self.load_checkpoints()
+        self.tailed_rows = Counter(
+            "Evidently:tailed_rows",
+            "Rows read from the tailed JSONL files",
+            labelnames=["dataset_name"],
+        )
+        self.invalid_lines = Counter(
+            "Evidently:tailed_invalid_lines",
+            "Lines of the tailed JSONL files which are not JSON objects",
+            labelnames=["dataset_name"],
+        )
+        self.lag_bytes = Gauge(
+            "Evidently:tail_lag_bytes",
+            "Bytes of a tailed file not read yet",
+            labelnames=["dataset_name", "path"],
+        )
+        self.worker = threading.Thread(
+            target=self.run, name="file-tailer", daemon=True
+        )
+        self.worker.start()
+
+    def load_checkpoints(self) -> dict:
+        """Read the offsets reached before the last stop.
+
+        Returns:
+            dict: the device, inode and offset of each file path
+        """
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+
+        except FileNotFoundError:
+            return {}
+
+        except ValueError:
+            logging.error(
+                f"Invalid tail checkpoints {self.checkpoint_path}, reading the files from their start"
+            )
+            return {}
+
+    def save_checkpoints(self) -> None:
+        """Write the offsets reached, replacing the previous checkpoints atomically."""
+        temporary_path = f"{self.checkpoint_path}.tmp"
+
+        with open(temporary_path, "w") as f:
+            json.dump(self.checkpoints, f)
+
+        os.replace(temporary_path, self.checkpoint_path)
+
+    def open_file(self, tailed: TailedFile, resume: bool) -> bool:
+        """Open a file, at its checkpointed offset when it is the same file.
+
+        Args:
+            tailed (TailedFile): the file
+            resume (bool): whether to start from the checkpoint rather than from the start
+
+        Returns:
+            bool: False if the file does not exist
+        """
+        try:
+            handle = open(tailed.path, "rb")
+
+        except FileNotFoundError:
+            return False
+
+        stat = os.fstat(handle.fileno())
+        tailed.handle = handle
+        tailed.identity = [stat.st_dev, stat.st_ino]
+        tailed.offset = 0
+        checkpoint = self.checkpoints.get(tailed.path)
+
+        if resume and checkpoint is not None:
+            if checkpoint["identity"] != tailed.identity:
+                logging.warning(
+                    f"{tailed.path} was rotated since the last checkpoint, reading it from its start"
+                )
+
+            elif checkpoint["offset"] > stat.st_size:
+                logging.warning(
+                    f"{tailed.path} was truncated since the last checkpoint, reading it from its start"
+                )
+
+            else:
+                tailed.offset = checkpoint["offset"]
+
+        handle.seek(tailed.offset)
+        return True
+
+    def read_batch(self, tailed: TailedFile) -> bool:
+        """Process the complete lines of the next batch of a file.
+
+        Args:
+            tailed (TailedFile): the opened file
+
+        Returns:
+            bool: whether the batch was full, so more lines may follow
+        """
+        data = tailed.handle.read(self.batch_bytes)
+        end = data.rfind(b"\n") + 1
+
+        if not end and len(data) == self.batch_bytes:
+            # A line longer than a batch
+            tailed.handle.seek(tailed.offset)
+            data = tailed.handle.readline()
+            end = len(data) if data.endswith(b"\n") else 0
+
+        # The incomplete last line is read again once it is written
+        tailed.handle.seek(tailed.offset + end)
+
+        if not end:
+            return False
+
+        lines = [line for line in data[:end].splitlines() if line.strip()]
+        rows, invalid = parse_lines(lines)
+        tailed.offset += end
+
+        if invalid:
+            self.invalid_lines.labels(dataset_name=tailed.dataset_name).inc(
+                invalid
+            )
+
+        if rows:
+            self.tailed_rows.labels(dataset_name=tailed.dataset_name).inc(
+                len(rows)
+            )
+
+            try:
+                self.process(
+                    tailed.dataset_name, pd.DataFrame.from_records(rows)
+                )
+
+            except Exception:
+                logging.exception(
+                    f"Failed to process rows of {tailed.dataset_name} from {tailed.path}"
+                )
+
+        self.checkpoints[tailed.path] = {
+            "identity": tailed.identity,
+            "offset": tailed.offset,
+        }
+        self.save_checkpoints()
+        size = os.fstat(tailed.handle.fileno()).st_size
+        self.lag_bytes.labels(
+            dataset_name=tailed.dataset_name, path=tailed.path
+        ).set(size - tailed.offset)
+        return len(data) >= self.batch_bytes
+
+    def poll(self, tailed: TailedFile) -> bool:
+        """Read the next batch of a file, following it when it is rotated.
+
+        Args:
+            tailed (TailedFile): the file
+
+        Returns:
+            bool: whether more lines may be read right away
+        """
+        if tailed.handle is None and not self.open_file(
+            tailed, resume=tailed.identity is None
+        ):
+            return False
+
+        if self.read_batch(tailed):
+            return True
+
+        try:
+            stat = os.stat(tailed.path)
+
+        except FileNotFoundError:
+            # Rotated, the new file is not created yet
+            return False
+
+        if [stat.st_dev, stat.st_ino] != tailed.identity:
+            # The lines written to the old file before it was rotated
+            while self.read_batch(tailed):
+                pass
+
+            logging.info(f"{tailed.path} was rotated, following the new file")
+            tailed.handle.close()
+            tailed.handle = None
+            return self.open_file(tailed, resume=False)
+
+        if stat.st_size < tailed.offset:
+            logging.info(
+                f"{tailed.path} was truncated, reading it from its start"
+            )
+            tailed.offset = 0
+            tailed.handle.seek(0)
+            return True
+
+        return False
+
+    def run(self) -> None:
+        """Read the files in turn, waiting for new lines once all are read."""
+        while True:
+            more = False
+
+            for tailed in self.files:
+                try:
+                    more = self.poll(tailed) or more
+
+                except OSError:
+                    logging.exception(f"Failed to tail {tailed.path}")
+
+            if not more:
+                time.sleep(self.poll_sec)
@@ -3,11 +3,27 @@ import logging
 import os
 import zipfile
 
+import numpy as np
 import pandas as pd
 from kaggle.api.kaggle_api_extended import KaggleApi
 
 from .prob_distribution import ProbDistribution
 
+# Compact types of the house pricing columns, the other columns are inferred
+COLUMN_DTYPES = {
+    "bedrooms": "int32",
+    "bathrooms": "float64",
+    "sqft_living": "int32",
+    "sqft_lot": "int32",
+    "floors": "float64",
+    "waterfront": "int8",
+    "view": "int8",
+    "condition": "int8",
+    "grade": "int8",
+    "yr_built": "int16",
+    "price": "float64",
+}
+
 
 def load_data(dataset_path: str, features: list, no_rows: int) -> pd.DataFrame:
     """Loads the dataset from the `dataset_path`,  select the `features` and number of rows upto `no_rows`.
@@ -20,18 +36,21 @@ def load_data(dataset_path: str, features: list, no_rows: int) -> pd.DataFrame:
     Returns:
         pd.DataFrame: a pandas dataframe containing the dataset
     """
-    df = pd.read_csv(dataset_path)
+    # only read the header to count the features
+    n_columns = len(pd.read_csv(dataset_path, nrows=0).columns)
     logging.info(
-        f"Using {len(features)} features from total {len(df.columns)} features of the dataset"
+        f"Using {len(features)} features from total {n_columns} features of the dataset"
     )
-    # select specific features
-    df = df[features]
-    logging.info(
-        f"Using first {no_rows} rows from total {len(df)} rows of the dataset"
+    logging.info(f"Using first {no_rows} rows of the dataset")
+    # select specific features and rows while reading
+    df = pd.read_csv(
+        dataset_path,
+        usecols=features,
+        nrows=no_rows,
+        dtype={f: COLUMN_DTYPES[f] for f in features if f in COLUMN_DTYPES},
     )
-    # select specific rows
-    df = df[0:no_rows]
-    return df
+    # usecols keeps the order of the file
+    return df[features]
 
 
 def compute_dist(feature: pd.Series) -> dict:
@@ -43,25 +62,9 @@ def compute_dist(feature: pd.Series) -> dict:
     Returns:
         dict: the distribution
     """
-    # Converting a 1D pandas data structure to a list
-    feature_list = feature.to_list()
-    # Count the number of values in the list
-    feature_count = len(feature_list)
-
-    # A dictonary to store the probability distribution
-    dist = {}
-
-    # Compute the occurance of each distinct value in the list
-    for val in feature_list:
-        if val in dist:
-            dist[val] += 1
-        else:
-            dist[val] = 1
-
-    # Compute the probabilty distribution for each distinct value store in dictonary
-    dist = {key: val / feature_count for key, val in dist.items()}
-
-    return dist
+    # Compute the probabilty distribution for each distinct value, in order of occurance
+    dist = feature.value_counts(normalize=True, sort=False)
+    return dist.to_dict()
 
 
 def generate_reference_data(
@@ -152,9 +155,9 @@ def generate_production_no_drift_data(
     """
     # fmt: off
     # use same distribution for both columns: ["bedroom", "condition"] as production dataset to generate new values
-    for index, row in production_df.iterrows():
-        production_df.at[index, "bedrooms"] = bedrooms_generator.generate_val(shuffle_dist=False)
-        production_df.at[index, "condition"] = condition_generator.generate_val(shuffle_dist=False)
+    no_rows = len(production_df)
+    production_df["bedrooms"] = bedrooms_generator.generate_vals(no_rows, shuffle_dist=False)
+    production_df["condition"] = condition_generator.generate_vals(no_rows, shuffle_dist=False)
     # fmt: on
     save_path = os.path.join(save_dir, "production_no_drift.csv")
     production_df.to_csv(save_path, index=False)
@@ -183,22 +186,18 @@ def generate_production_with_drift_data(
         pd.DataFrame: production dataset
     """
     # use skewed distribution for both columns: ["bedroom", "condition"] as production dataset
-    # to generate new values at certain indexes [index >= 10 and index < 15]
-    counter = 0
+    # to generate new values at certain positions in each block of 16 rows [position >= 10 and position < 15],
+    # the last row of each block keeps its original values
+    position = np.arange(len(production_df)) % 16
     # fmt: off
-    for index, row in production_df.iterrows():
-        if counter < 10:
-            # shuffle_dist=False mean the original distribution is used
-            production_df.at[index, "bedrooms"] = bedrooms_generator.generate_val(shuffle_dist=False)
-            production_df.at[index, "condition"] = condition_generator.generate_val(shuffle_dist=False)
-            counter += 1
-        elif counter >= 10 and counter < 15:
-            # shuffle_dist=True mean the skewed distribution is used
-            production_df.at[index, "bedrooms"] = bedrooms_generator.generate_val(shuffle_dist=True)
-            production_df.at[index, "condition"] = condition_generator.generate_val(shuffle_dist=True)
-            counter += 1
-        elif counter == 15:
-            counter = 0
+    for generator, column in [(bedrooms_generator, "bedrooms"), (condition_generator, "condition")]:
+        # shuffle_dist=False mean the original distribution is used
+        original = generator.generate_vals(len(production_df), shuffle_dist=False)
+        # shuffle_dist=True mean the skewed distribution is used
+        skewed = generator.generate_vals(len(production_df), shuffle_dist=True)
+        values = production_df[column].to_numpy()
+        values = np.where(position < 10, original, np.where(position < 15, skewed, values))
+        production_df[column] = values
     # fmt: on
     save_path = os.path.join(save_dir, "production_with_drift.csv")
     production_df.to_csv(save_path, index=False)
@@ -231,11 +230,14 @@ def authenticate_api() -> KaggleApi():
     return api
 
 
-def preprocess_dataset(dataset_path: str) -> str:
+def preprocess_dataset(dataset_path: str, chunk_size: int = 100_000) -> str:
     """Unzip dataset and set the date column as index and saves the dataset as csv.
 
+    The dataset is processed and written in chunks, so memory stays bounded whatever its size.
+
     Args:
         dataset_path (str): the path to the downloaded zip dataset file
+        chunk_size (int): number of rows processed at once
 
     Returns:
         str: Path to preprocessed data
@@ -250,15 +252,26 @@ def preprocess_dataset(dataset_path: str) -> str:
 
     root_dir = os.path.dirname(dataset_path)
     filename = "kc_house_data.csv"
-    # Read data
-    house_data = pd.read_csv(os.path.join(root_dir, filename))
-    # Convert to datetime using pandas
-    house_data["date"] = pd.to_datetime(house_data["date"])
-    # Set date column as index
-    house_data.set_index("date", inplace=True)
-    # Save as new dataset
     new_filename = "processed_house_data.csv"
     save_path = os.path.join(root_dir, new_filename)
-    house_data.to_csv(save_path)
+    # Read data chunk by chunk
+    chunks = pd.read_csv(
+        os.path.join(root_dir, filename),
+        chunksize=chunk_size,
+        dtype={"date": str, **COLUMN_DTYPES},
+    )
+
+    for chunk_no, house_data in enumerate(chunks):
+        # Convert to datetime using pandas, the dates look like 20141013T000000
+        house_data["date"] = pd.to_datetime(
+            house_data["date"], format="%Y%m%dT%H%M%S"
+        )
+        # Set date column as index
+        house_data.set_index("date", inplace=True)
+        # Append to the new dataset, the header is only written once
+        house_data.to_csv(
+            save_path, mode="w" if chunk_no == 0 else "a", header=chunk_no == 0
+        )
+
     logging.info(f"Saved processed dataset at path: {save_path}")
     return save_path
@@ -45,3 +45,18 @@ class ProbDistribution:
             val = np.random.choice(self.no_items, p=self.shuffled_dist)
 
         return val
+
+    def generate_vals(
+        self, size: int, shuffle_dist: bool = False
+    ) -> np.ndarray:
+        """Generate many values at once based on the probability distribution.
+
+        Args:
+            size (int): the number of values to generate
+            shuffle_dist (bool): whether to use skewed distribution or not
+
+        Returns:
+            np.ndarray: values based on the probability distribution used
+        """
+        dist = self.shuffled_dist if shuffle_dist else self.items_dist
+        return np.random.choice(self.no_items, size=size, p=dist)
@@ -0,0 +1,191 @@
+"""JSON serialization shared by the simulator, the inference server and the metric server.
+
+orjson is used when it is installed, it serializes NumPy types natively. The
+standard library encoder with `NumpyEncoder` is the fallback.
+"""
+import json
+import logging
+import timeit
+from typing import TYPE_CHECKING, Any, Union
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Name of the encoder in use, logged by the services
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+# The encoder converts NumPy types in source data to JSON-compatible types
+class NumpyEncoder(json.JSONEncoder):
+    """JSON encoder converting NumPy types to native Python types."""
+
+    def default(self, obj: Any) -> Any:
+        """Convert a NumPy object to a JSON-compatible type.
+
+        Args:
+            obj (Any): the object to convert
+
+        Returns:
+            Any: the converted object
+        """
+        if isinstance(obj, np.void):
+            return None
+
+        if isinstance(obj, (np.generic, np.bool_)):
+            return obj.item()
+
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+
+        return super().default(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize an object, NumPy scalars and arrays included, to JSON.
+
+    Args:
+        obj (Any): the object to serialize
+
+    Returns:
+        bytes: the UTF-8 encoded JSON document
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    return json.dumps(obj, cls=NumpyEncoder).encode()
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Deserialize a JSON document.
+
+    Args:
+        data (Union[bytes, str]): the JSON document
+
+    Returns:
+        Any: the deserialized object
+
+    Raises:
+        ValueError: if the document is not valid JSON
+    """
+    try:
+        if orjson is not None:
+            return orjson.loads(data)
+
+        return json.loads(data)
+
+    # Both backends raise a subclass of ValueError, the callers catch this one
+    except ValueError as error:
+        raise ValueError(f"Invalid JSON document: {error}") from error
+
+
+def records(data: "pd.DataFrame") -> list:
+    """Convert the rows of a data frame to dictionaries ready to serialize.
+
+    Args:
+        data (pd.DataFrame): the data to convert
+
+    Returns:
+        list: one dictionary per row, missing values as None
+    """
+    return data.astype(object).where(data.notna(), None).to_dict("records")
+
+
+def benchmark(n_rows: int = 1000, repeat: int = 20) -> None:
+    """Log the encoding and decoding time of rows like the house price ones.
+
+    Args:
+        n_rows (int): the number of rows of a batch
+        repeat (int): the number of runs each timing is the best of
+    """
+    # The inference server does not install pandas
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(
+        {
+            "id": rng.integers(1e9, size=n_rows),
+            "date": "20141013T000000",
+            "price": rng.normal(540_000, 367_000, n_rows),
+            "bedrooms": rng.integers(1, 10, n_rows),
+            "bathrooms": rng.choice([1.0, 1.5, 2.0, 2.5, 3.0], n_rows),
+            "sqft_living": rng.integers(300, 13_000, n_rows),
+            "sqft_lot": rng.integers(500, 1_600_000, n_rows),
+            "floors": rng.choice([1.0, 1.5, 2.0, 3.0], n_rows),
+            "waterfront": rng.integers(0, 2, n_rows),
+            "view": rng.integers(0, 5, n_rows),
+            "condition": rng.integers(1, 6, n_rows),
+            "grade": rng.integers(1, 14, n_rows),
+            "yr_built": rng.integers(1900, 2016, n_rows),
+            "lat": rng.normal(47.5, 0.1, n_rows),
+            "long": rng.normal(-122.2, 0.1, n_rows),
+        }
+    )
+    rows = records(data)
+    # Rows as NumPy scalars, the way the services get them from NumPy arrays
+    numpy_row = {column: data[column].to_numpy()[0] for column in data}
+
+    backends = {"json": (lambda obj: json.dumps(obj, cls=NumpyEncoder), json)}
+    if orjson is not None:
+        backends["orjson"] = (
+            lambda obj: orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY),
+            orjson,
+        )
+
+    logging.info(
+        f"{'backend':8} {'payload':18} {'encode us':>10} {'decode us':>10}"
+    )
+
+    for name, (encode, module) in backends.items():
+        for payload_name, payload, per in (
+            ("row", rows[0], 1),
+            ("row numpy", numpy_row, 1),
+            (f"batch {n_rows}", rows, n_rows),
+        ):
+            document = encode(payload)
+            n_runs = max(10_000 // per, 1)
+            encode_sec = min(
+                timeit.repeat(
+                    lambda e=encode, p=payload: e(p),
+                    number=n_runs,
+                    repeat=repeat,
+                )
+            )
+            decode_sec = min(
+                timeit.repeat(
+                    lambda m=module, d=document: m.loads(d),
+                    number=n_runs,
+                    repeat=repeat,
+                )
+            )
+            logging.info(
+                f"{name:8} {payload_name:18} "
+                f"{encode_sec / n_runs * 1e6:10.1f} "
+                f"{decode_sec / n_runs * 1e6:10.1f}"
+            )
+
+    to_json_sec = min(
+        timeit.repeat(
+            lambda: json.loads(data.iloc[0].to_json(orient="index")),
+            number=1000,
+            repeat=repeat,
+        )
+    )
+    logging.info(
+        f"{'pandas':8} {'row to_json':18} {to_json_sec / 1000 * 1e6:10.1f}"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[logging.StreamHandler()],
+    )
+    benchmark()
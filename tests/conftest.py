@@ -0,0 +1,30 @@
+"""Shared fixtures of the tests of the metric server."""
+import os
+import sys
+
+import prometheus_client
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The metric server modules import each other and the serialization module by name
+sys.path[:0] = [
+    os.path.join(ROOT, "server", "monitoring_server"),
+    os.path.join(ROOT, "src"),
+]
+
+
+@pytest.fixture(autouse=True)
+def registry() -> prometheus_client.CollectorRegistry:
+    """Unregister the metrics created by a test, so the next one can create them again.
+
+    Yields:
+        prometheus_client.CollectorRegistry: the default registry
+    """
+    before = set(prometheus_client.REGISTRY._collector_to_names)
+    yield prometheus_client.REGISTRY
+
+    for collector in (
+        set(prometheus_client.REGISTRY._collector_to_names) - before
+    ):
+        prometheus_client.REGISTRY.unregister(collector)
@@ -0,0 +1,68 @@
+"""Tests of the reference preparation of the drift engines."""
+import gc
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+from drift_engine import ParallelDataDriftMonitoring
+from evidently.options.data_drift import DataDriftOptions
+from evidently.pipeline.column_mapping import ColumnMapping
+from fast_drift import FastDataDriftMonitoring
+from metric_server import LoadedDataset, MonitoringService
+
+COLUMN_MAPPING = ColumnMapping(
+    numerical_features=["number"],
+    categorical_features=[],
+    target=None,
+    prediction=None,
+)
+
+
+@pytest.mark.parametrize(
+    "engine", [ParallelDataDriftMonitoring, FastDataDriftMonitoring]
+)
+def test_new_reference_is_prepared_again(engine: type) -> None:
+    """A reference replacing a collected one is encoded again, even when it reuses its id.
+
+    Args:
+        engine (type): the drift engine tested
+    """
+    monitoring = engine(options=DataDriftOptions(drift_share=1), workers=1)
+    current = pd.DataFrame({"number": np.arange(50.0)})
+
+    for shift in range(50):
+        reference = pd.DataFrame({"number": np.arange(100.0) + shift})
+        monitoring.execute(reference, current, COLUMN_MAPPING)
+
+        assert np.nanmin(monitoring.encoder.reference) == shift
+
+        del reference
+        gc.collect()
+
+
+def test_large_reference_warning(caplog: pytest.LogCaptureFixture) -> None:
+    """A drift engine on a reference above 1000 rows warns that Evidently would run other tests.
+
+    Args:
+        caplog (pytest.LogCaptureFixture): the captured logs
+    """
+    reference = pd.DataFrame({"number": np.arange(1001.0)})
+    dataset = LoadedDataset(
+        name="large",
+        references=reference,
+        monitors=["fast_data_drift"],
+        column_mapping=COLUMN_MAPPING,
+        features=["number"],
+        reference_hash="large",
+    )
+
+    with caplog.at_level(logging.WARNING):
+        MonitoringService(
+            datasets={"large": dataset},
+            window_size=5,
+            calculation_period_sec=0,
+            drift_workers=1,
+        )
+
+    assert "Wasserstein" in caplog.text
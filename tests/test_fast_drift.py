@@ -0,0 +1,161 @@
+"""Parity tests of the fast_data_drift engine with Evidently's data drift monitor."""
+import numpy as np
+import pandas as pd
+import pytest
+from drift_benchmark import synthetic_data
+from evidently.analyzers.data_drift_analyzer import DataDriftAnalyzer
+from evidently.calculations.stattests import (
+    chi_stat_test,
+    ks_stat_test,
+    z_stat_test,
+)
+from evidently.model_monitoring import DataDriftMonitor, ModelMonitoring
+from evidently.options.data_drift import DataDriftOptions
+from evidently.pipeline.column_mapping import ColumnMapping
+from fast_drift import FastDataDriftMonitoring
+
+N_FEATURES = 12
+NUMERICAL_FEATURES = [f"num_{index}" for index in range(N_FEATURES)]
+CATEGORICAL_FEATURES = [f"cat_{index}" for index in range(N_FEATURES)]
+COLUMN_MAPPING = ColumnMapping(
+    numerical_features=NUMERICAL_FEATURES + ["binary_num"],
+    categorical_features=CATEGORICAL_FEATURES + ["binary_cat"],
+    target=None,
+    prediction=None,
+)
+# The tests Evidently picks for references up to 1000 rows, by name
+STAT_TESTS = {
+    "K-S p_value": ks_stat_test,
+    "chi-square p_value": chi_stat_test,
+    "Z-test p_value": z_stat_test,
+}
+
+
+def frames(n_rows: int, shift: float, seed: int) -> pd.DataFrame:
+    """Generate the features of the benchmark, and a binary numerical and categorical one.
+
+    Args:
+        n_rows (int): the number of rows
+        shift (float): the shift of the distributions, 0 for the reference
+        seed (int): the seed of the generator
+
+    Returns:
+        pd.DataFrame: the features
+    """
+    data = synthetic_data(N_FEATURES, n_rows, shift, seed)
+    rng = np.random.default_rng(seed)
+    data["binary_num"] = (rng.random(n_rows) < 0.3 + shift / 4).astype(float)
+    data["binary_cat"] = np.where(
+        rng.random(n_rows) < 0.5 + shift / 4, "yes", "no"
+    ).astype(object)
+    return data
+
+
+def evidently_drift(
+    reference: pd.DataFrame,
+    current: pd.DataFrame,
+    per_feature_stattest: dict | None = None,
+) -> dict:
+    """Calculate the drift of each feature with Evidently's data drift monitor.
+
+    Args:
+        reference (pd.DataFrame): the reference data
+        current (pd.DataFrame): the window
+        per_feature_stattest (dict | None): the test of each feature, Evidently's default ones when None
+
+    Returns:
+        dict: the test, p-value and drift flag of each feature
+    """
+    options = DataDriftOptions(
+        drift_share=1, per_feature_stattest=per_feature_stattest
+    )
+    monitoring = ModelMonitoring(
+        monitors=[DataDriftMonitor()], options=[options]
+    )
+    monitoring.execute(reference, current, COLUMN_MAPPING)
+    results = monitoring.analyzers_results[DataDriftAnalyzer].metrics
+
+    return {
+        feature: (drift.stattest_name, drift.drift_score, drift.drift_detected)
+        for feature, drift in results.drift_by_columns.items()
+    }
+
+
+def fast_drift(reference: pd.DataFrame, current: pd.DataFrame) -> dict:
+    """Calculate the drift of each feature with the fast_data_drift engine.
+
+    Args:
+        reference (pd.DataFrame): the reference data
+        current (pd.DataFrame): the window
+
+    Returns:
+        dict: the test, p-value and drift flag of each feature
+    """
+    monitoring = FastDataDriftMonitoring(
+        options=DataDriftOptions(drift_share=1), workers=1
+    )
+    monitoring.execute(reference, current, COLUMN_MAPPING)
+
+    return {
+        result.feature: (
+            result.stat_test,
+            result.p_value,
+            result.drift_detected,
+        )
+        for result in monitoring.results
+    }
+
+
+def assert_same_drift(expected: dict, found: dict) -> None:
+    """Check two engines ran the same tests with the same outcome.
+
+    Args:
+        expected (dict): the test, p-value and drift flag of each feature
+        found (dict): the same, from the engine tested
+    """
+    assert found.keys() == expected.keys()
+
+    for feature, (stat_test, p_value, drift_detected) in expected.items():
+        assert found[feature][0] == stat_test, feature
+        assert found[feature][1] == pytest.approx(p_value, abs=1e-9), feature
+        assert found[feature][2] == drift_detected, feature
+
+
+@pytest.mark.parametrize("shift", [0.0, 0.3, 1.0])
+def test_same_drift_as_evidently(shift: float) -> None:
+    """Numerical, categorical and binary features get Evidently's tests, p-values and flags.
+
+    Args:
+        shift (float): the shift of the distributions of the window
+    """
+    reference = frames(1000, 0.0, 0)
+    current = frames(500, shift, 1)
+    expected = evidently_drift(reference, current)
+
+    # K-S, chi-square on numerical and categorical features, Z-test on binary ones
+    assert {stat_test for stat_test, _, _ in expected.values()} == set(
+        STAT_TESTS
+    )
+    assert_same_drift(expected, fast_drift(reference, current))
+
+
+@pytest.mark.parametrize("shift", [0.0, 0.3])
+def test_same_drift_as_evidently_above_1000_rows(shift: float) -> None:
+    """Above 1000 reference rows, the p-values match Evidently run with the same tests.
+
+    Args:
+        shift (float): the shift of the distributions of the window
+    """
+    reference = frames(3000, 0.0, 0)
+    current = frames(800, shift, 1)
+    found = fast_drift(reference, current)
+    expected = evidently_drift(
+        reference,
+        current,
+        {
+            feature: STAT_TESTS[stat_test]
+            for feature, (stat_test, _, _) in found.items()
+        },
+    )
+
+    assert_same_drift(expected, found)
@@ -0,0 +1,44 @@
+"""Tests of the drift metrics of the horizons."""
+import numpy as np
+import pandas as pd
+from evidently.pipeline.column_mapping import ColumnMapping
+from metric_server import LoadedDataset, MonitoringService
+
+
+def test_only_the_horizons_are_labelled_by_window() -> None:
+    """The data drift series keep their labels, the horizons get their own metrics."""
+    rng = np.random.default_rng(0)
+    reference = pd.DataFrame({"number": rng.normal(size=200).round(2)})
+    dataset = LoadedDataset(
+        name="horizons",
+        references=reference,
+        monitors=["data_drift"],
+        column_mapping=ColumnMapping(
+            numerical_features=["number"],
+            categorical_features=[],
+            target=None,
+            prediction=None,
+        ),
+        features=["number"],
+        reference_hash="horizons",
+        horizons=[10, 20],
+    )
+    service = MonitoringService(
+        datasets={"horizons": dataset},
+        window_size=10,
+        calculation_period_sec=0,
+        drift_workers=1,
+    )
+    service.iterate(
+        "horizons", pd.DataFrame({"number": rng.normal(size=30).round(2)})
+    )
+    windows = {}
+
+    for metric_key, labels in service.series["horizons"]["drift"]:
+        windows.setdefault(metric_key, set()).add(dict(labels).get("window"))
+
+    assert windows["Evidently:data_drift:value"] == {None}
+    assert windows["Evidently:data_drift:share_drifted_features"] == {None}
+    # The window_size horizon is the data drift itself
+    assert windows["Evidently:horizon_drift:value"] == {"20"}
+    assert windows["Evidently:horizon_drift:dataset_drift"] == {"20"}
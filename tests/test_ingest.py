@@ -0,0 +1,82 @@
+"""Tests of the bounded ingest queues."""
+import pytest
+from ingest import DROP_OLDEST, INGEST_POLICIES, REJECT, SAMPLE, Ingestor
+
+
+def rows(n_rows: int) -> list:
+    """Build rows as the requests send them.
+
+    Args:
+        n_rows (int): the number of rows
+
+    Returns:
+        list: the rows, as dictionaries
+    """
+    return [{"feature": index} for index in range(n_rows)]
+
+
+def shed(ingestor: Ingestor, reason: str) -> float:
+    """Get the number of rows of the dataset shed for a reason.
+
+    Args:
+        ingestor (Ingestor): the ingestor
+        reason (str): why the rows were shed
+
+    Returns:
+        float: the number of rows shed
+    """
+    return ingestor.shed_rows.labels(
+        dataset_name="dataset", reason=reason
+    )._value.get()
+
+
+@pytest.mark.parametrize("policy", INGEST_POLICIES)
+def test_batch_larger_than_the_queue(policy: str) -> None:
+    """A single request larger than the queue cannot take it past max_rows.
+
+    Args:
+        policy (str): one of INGEST_POLICIES
+    """
+    ingestor = Ingestor(
+        lambda dataset_name, new_rows: None, max_rows=10, policy=policy
+    )
+
+    # The worker cannot drain the queue while the condition is held
+    with ingestor.condition:
+        accepted = ingestor.put("dataset", rows(25))
+        queue = ingestor.queues["dataset"]
+
+        assert queue.n_rows <= 10
+        assert sum(len(request) for request in queue.requests) == queue.n_rows
+
+        if policy == REJECT:
+            assert not accepted
+            assert shed(ingestor, "rejected") == 25
+
+        elif policy == DROP_OLDEST:
+            assert queue.n_rows == 10
+            assert queue.requests[0] == rows(25)[-10:]
+
+        else:
+            assert queue.n_rows == 10
+            assert shed(ingestor, "queue_full") == 15
+
+
+def test_sampling_keeps_the_queue_bounded() -> None:
+    """Sampled requests arriving on a half full queue are truncated to its room."""
+    ingestor = Ingestor(
+        lambda dataset_name, new_rows: None,
+        max_rows=10,
+        policy=SAMPLE,
+        sample_every=2,
+    )
+
+    with ingestor.condition:
+        ingestor.put("dataset", rows(6))
+        # 1 in 2 of the 20 rows are kept, 4 of which fit
+        ingestor.put("dataset", rows(20))
+        queue = ingestor.queues["dataset"]
+
+        assert queue.n_rows == 10
+        assert shed(ingestor, "sampled_out") == 10
+        assert shed(ingestor, "queue_full") == 6
@@ -0,0 +1,142 @@
+"""Tests of the lazy loading and unloading of the datasets."""
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+from evidently.pipeline.column_mapping import ColumnMapping
+from metric_server import LoadedDataset, MonitoringService
+
+DATASETS = ("first", "second", "third")
+
+
+def loaded_dataset(dataset_name: str) -> LoadedDataset:
+    """Build a small dataset with a numerical and a categorical feature.
+
+    Args:
+        dataset_name (str): name of the dataset
+
+    Returns:
+        LoadedDataset: the dataset, as loaded from its config and reference
+    """
+    rng = np.random.default_rng(0)
+    reference = pd.DataFrame(
+        {
+            "number": rng.normal(size=200).round(2),
+            "category": rng.choice(["a", "b", "c"], 200),
+        }
+    )
+    return LoadedDataset(
+        name=dataset_name,
+        references=reference,
+        monitors=["data_drift"],
+        column_mapping=ColumnMapping(
+            numerical_features=["number"],
+            categorical_features=["category"],
+            target=None,
+            prediction=None,
+        ),
+        features=["number", "category"],
+        reference_hash=dataset_name,
+    )
+
+
+@pytest.fixture
+def service(tmp_path) -> MonitoringService:
+    """Create a service loading the datasets lazily, one resident at a time.
+
+    Args:
+        tmp_path (pathlib.Path): directory of the spilled windows
+
+    Returns:
+        MonitoringService: the service, with no dataset loaded
+    """
+    return MonitoringService(
+        datasets={},
+        window_size=5,
+        calculation_period_sec=0,
+        loader=loaded_dataset,
+        max_resident_datasets=1,
+        spill_path=str(tmp_path),
+        drift_workers=1,
+    )
+
+
+def new_rows(n_rows: int, seed: int) -> pd.DataFrame:
+    """Build rows as the inference server sends them.
+
+    Args:
+        n_rows (int): the number of rows
+        seed (int): the seed of the generator
+
+    Returns:
+        pd.DataFrame: the rows
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "number": rng.normal(size=n_rows).round(2),
+            "category": rng.choice(["a", "b", "c"], n_rows),
+        }
+    )
+
+
+def test_unload_skips_a_dataset_in_use(service: MonitoringService) -> None:
+    """A dataset whose lock is held by another thread stays loaded.
+
+    Args:
+        service (MonitoringService): the service loading the datasets lazily
+    """
+    service.iterate("first", new_rows(3, 0))
+
+    with service.dataset_lock("first"):
+        unloaded = []
+        thread = threading.Thread(
+            target=lambda: unloaded.append(service.unload("first"))
+        )
+        thread.start()
+        thread.join()
+
+    assert unloaded == [False]
+    assert "first" in service.monitoring
+    assert service.unload("first")
+    assert "first" not in service.monitoring
+
+
+def test_unload_under_concurrent_iterate(service: MonitoringService) -> None:
+    """Serving a dataset while others are unloaded and loaded again never fails.
+
+    Args:
+        service (MonitoringService): the service loading the datasets lazily
+    """
+    errors = []
+
+    def send(offset: int) -> None:
+        """Send rows to every dataset in turn.
+
+        Args:
+            offset (int): the dataset served first
+        """
+        for index in range(30):
+            dataset_name = DATASETS[(offset + index) % len(DATASETS)]
+
+            try:
+                service.iterate(dataset_name, new_rows(3, index))
+
+            except Exception as error:
+                errors.append(error)
+
+    threads = [
+        threading.Thread(target=send, args=(offset,))
+        for offset in range(len(DATASETS) * 2)
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    # Each request unloads the datasets it can, the ones in use are left loaded
+    assert 1 <= len(service.monitoring) <= len(DATASETS)
@@ -0,0 +1,96 @@
+"""Tests of the references shared by the processes of the metric server."""
+import mmap
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+from metric_server import load_dataset
+from reference_store import ReferenceStore
+
+DATASET_CONFIGS = {
+    "column_mapping": {
+        "categorical_features": ["condition"],
+        "numerical_features": ["bedrooms", "sqft_living"],
+    },
+    "data_format": {"header": True, "separator": ","},
+    "monitors": ["data_drift"],
+}
+
+
+def mapped(array: np.ndarray) -> bool:
+    """Check an array is a view of a memory mapped file.
+
+    Args:
+        array (np.ndarray): the array
+
+    Returns:
+        bool: whether the memory of the array is a mapped file
+    """
+    while array is not None and not isinstance(array, mmap.mmap):
+        array = getattr(array, "base", None)
+
+    return array is not None
+
+
+def load_in_worker(store_path: str) -> tuple:
+    """Load the reference through the store, as a server worker does.
+
+    Args:
+        store_path (str): directory of the stored references
+
+    Returns:
+        tuple: the reference hash, the reference as lists, whether each column is memory mapped, and the inode of
+            the stored reference
+    """
+    datasets_path = os.path.join(os.path.dirname(store_path), "datasets")
+    dataset = load_dataset(
+        "houses", datasets_path, DATASET_CONFIGS, ReferenceStore(store_path)
+    )
+    reference = dataset.references
+    columns_mapped = {
+        "bedrooms": mapped(reference["bedrooms"].to_numpy()),
+        "sqft_living": mapped(reference["sqft_living"].to_numpy()),
+        "condition": mapped(reference["condition"].array.codes),
+    }
+    return (
+        dataset.reference_hash,
+        reference[["bedrooms", "sqft_living", "condition"]]
+        .astype(object)
+        .to_dict("list"),
+        columns_mapped,
+        os.stat(os.path.join(store_path, "houses")).st_ino,
+    )
+
+
+def test_two_workers_map_one_stored_reference(tmp_path) -> None:
+    """Two processes loading a reference at once store it once and map it without copies.
+
+    Args:
+        tmp_path (pathlib.Path): directory of the datasets and of the store
+    """
+    dataset_path = tmp_path / "datasets" / "houses"
+    dataset_path.mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    reference = pd.DataFrame(
+        {
+            "bedrooms": rng.integers(1, 7, 500),
+            "sqft_living": rng.normal(2000, 500, 500).round(1),
+            "condition": rng.choice(["poor", "fair", "good"], 500),
+        }
+    )
+    reference.to_csv(dataset_path / "reference.csv", index=False)
+    store_path = str(tmp_path / "reference_store")
+
+    with multiprocessing.get_context("fork").Pool(2) as pool:
+        results = pool.map(
+            load_in_worker, [store_path, store_path], chunksize=1
+        )
+
+    hashes, values, columns_mapped, inodes = zip(*results)
+
+    assert hashes[0] == hashes[1]
+    assert values[0] == values[1] == reference.astype(object).to_dict("list")
+    assert all(columns_mapped[0].values()) and all(columns_mapped[1].values())
+    # The reference was stored once, the second worker mapped the first one's copy
+    assert inodes[0] == inodes[1]
@@ -0,0 +1,144 @@
+"""Tests of the hot reload of the config file."""
+import copy
+
+import yaml
+from reload import ConfigWatcher
+
+CONFIGS = {
+    "datasets": {
+        "houses": {"monitors": ["data_drift"]},
+        "loans": {"monitors": ["data_drift"]},
+    },
+    "service": {
+        "datasets_path": "datasets",
+        "window_size": 30,
+        "calculation_period_sec": 10,
+    },
+}
+
+
+class Reloads:
+    """Record the reloads asked by the watcher, failing the named datasets."""
+
+    def __init__(self) -> None:
+        """Start without reloads nor failures."""
+        self.calls = []
+        self.failing = set()
+
+    def __call__(self, configs: dict, dataset_names: list) -> list:
+        """Record a reload.
+
+        Args:
+            configs (dict): the configs the service runs with
+            dataset_names (list): the datasets to reload
+
+        Returns:
+            list: the datasets which failed
+        """
+        self.calls.append((copy.deepcopy(configs), dataset_names))
+        return sorted(self.failing.intersection(dataset_names))
+
+
+def watcher(tmp_path, reloads: Reloads) -> ConfigWatcher:
+    """Watch a config file, with a folder per dataset.
+
+    Args:
+        tmp_path (pathlib.Path): directory of the config file and of the datasets
+        reloads (Reloads): the reload callback
+
+    Returns:
+        ConfigWatcher: the watcher, running with a copy of CONFIGS
+    """
+    configs = copy.deepcopy(CONFIGS)
+    configs["service"]["datasets_path"] = str(tmp_path / "datasets")
+
+    for dataset_name in configs["datasets"]:
+        (tmp_path / "datasets" / dataset_name).mkdir(parents=True)
+
+    write(tmp_path, configs)
+    return ConfigWatcher(str(tmp_path / "config.yaml"), configs, reloads)
+
+
+def write(tmp_path, configs: dict) -> None:
+    """Write a config file, changing its size so it is seen as modified.
+
+    Args:
+        tmp_path (pathlib.Path): directory of the config file
+        configs (dict): the configs to write
+    """
+    path = tmp_path / "config.yaml"
+    padding = "#" * (path.stat().st_size + 1 if path.exists() else 0)
+    path.write_text(yaml.safe_dump(configs) + padding)
+
+
+def test_failed_dataset_is_retried(tmp_path) -> None:
+    """A dataset which failed to reload keeps its config and is reloaded again.
+
+    Args:
+        tmp_path (pathlib.Path): directory of the config file and of the datasets
+    """
+    reloads = Reloads()
+    config_watcher = watcher(tmp_path, reloads)
+    configs = copy.deepcopy(config_watcher.configs)
+    configs["datasets"]["houses"]["monitors"] = ["cat_target_drift"]
+    reloads.failing.add("houses")
+    write(tmp_path, configs)
+
+    config_watcher.poll()
+
+    assert reloads.calls[-1][0]["datasets"]["houses"] == {
+        "monitors": ["cat_target_drift"]
+    }
+    assert config_watcher.configs["datasets"]["houses"] == {
+        "monitors": ["data_drift"]
+    }
+
+    reloads.failing.clear()
+    config_watcher.poll()
+
+    assert [dataset_names for _, dataset_names in reloads.calls] == [
+        ["houses"],
+        ["houses"],
+    ]
+    assert config_watcher.configs["datasets"]["houses"] == {
+        "monitors": ["cat_target_drift"]
+    }
+
+    config_watcher.poll()
+
+    assert len(reloads.calls) == 2
+
+
+def test_only_the_reloaded_sections_are_applied(tmp_path) -> None:
+    """The options applied on restart and the unchanged datasets keep their running configs.
+
+    Args:
+        tmp_path (pathlib.Path): directory of the config file and of the datasets
+    """
+    reloads = Reloads()
+    config_watcher = watcher(tmp_path, reloads)
+    running = config_watcher.configs
+    loans = running["datasets"]["loans"]
+    configs = copy.deepcopy(config_watcher.configs)
+    configs["service"]["datasets_path"] = str(tmp_path / "elsewhere")
+    configs["service"]["drift_workers"] = 4
+    configs["datasets"]["houses"]["monitors"] = ["cat_target_drift"]
+    write(tmp_path, configs)
+
+    config_watcher.poll()
+
+    assert [dataset_names for _, dataset_names in reloads.calls] == [["houses"]]
+    assert running["service"] == {
+        **CONFIGS["service"],
+        "datasets_path": str(tmp_path / "datasets"),
+    }
+    assert running["datasets"]["houses"] == {"monitors": ["cat_target_drift"]}
+    assert running["datasets"]["loans"] is loans
+
+    configs["service"]["window_size"] = 60
+    write(tmp_path, configs)
+    config_watcher.poll()
+
+    assert reloads.calls[-1][1] == ["houses", "loans"]
+    assert running["service"]["window_size"] == 60
+    assert "drift_workers" not in running["service"]
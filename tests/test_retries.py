@@ -0,0 +1,79 @@
+"""Tests of the deduplication of retried requests."""
+import pandas as pd
+from evidently.pipeline.column_mapping import ColumnMapping
+from metric_server import LoadedDataset, MonitoringService
+
+
+def service(recent_request_ids: int) -> MonitoringService:
+    """Create a service monitoring a dataset with a numerical feature.
+
+    Args:
+        recent_request_ids (int): number of request ids remembered
+
+    Returns:
+        MonitoringService: the service
+    """
+    dataset = LoadedDataset(
+        name="retries",
+        references=pd.DataFrame(
+            {"number": [float(value) for value in range(20)]}
+        ),
+        monitors=["data_drift"],
+        column_mapping=ColumnMapping(
+            numerical_features=["number"],
+            categorical_features=[],
+            target=None,
+            prediction=None,
+        ),
+        features=["number"],
+        reference_hash="retries",
+    )
+    return MonitoringService(
+        datasets={"retries": dataset},
+        window_size=10,
+        calculation_period_sec=0,
+        drift_workers=1,
+        recent_request_ids=recent_request_ids,
+    )
+
+
+def requests(request_ids: list) -> pd.DataFrame:
+    """Build the rows of requests as the inference server sends them.
+
+    Args:
+        request_ids (list): the id of each request
+
+    Returns:
+        pd.DataFrame: a row per request
+    """
+    return pd.DataFrame(
+        {
+            "number": [
+                float(len(str(request_id))) for request_id in request_ids
+            ],
+            "request_id": request_ids,
+        }
+    )
+
+
+def test_retried_rows_enter_the_window_once() -> None:
+    """A request sent again, alone or with new ones, is dropped from the window."""
+    monitoring = service(recent_request_ids=100)
+    monitoring.iterate("retries", requests(["a", "b"]))
+    monitoring.iterate("retries", requests(["b"]))
+    monitoring.iterate("retries", requests(["c", "a", "d", "d"]))
+
+    assert len(monitoring.current["retries"]) == 4
+    assert (
+        monitoring.retried_rows.labels(dataset_name="retries")._value.get() == 3
+    )
+
+
+def test_only_the_recent_request_ids_are_remembered() -> None:
+    """The oldest request ids are forgotten, so memory stays bounded."""
+    monitoring = service(recent_request_ids=2)
+    monitoring.iterate("retries", requests(["a", "b", "c"]))
+    monitoring.iterate("retries", requests(["a", "c"]))
+
+    assert list(monitoring.request_ids["retries"]) == ["c", "a"]
+    assert len(monitoring.current["retries"]) == 4
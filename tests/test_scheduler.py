@@ -0,0 +1,75 @@
+"""Tests of the calculation budget shared by the datasets."""
+import threading
+
+import pandas as pd
+from scheduler import CalculationBudget, CalculationPolicy, CalculationScheduler
+
+
+def scheduler(budget: CalculationBudget) -> CalculationScheduler:
+    """Create the scheduler of a dataset due on every request.
+
+    Args:
+        budget (CalculationBudget): the budget shared by the datasets
+
+    Returns:
+        CalculationScheduler: the scheduler
+    """
+    return CalculationScheduler(
+        CalculationPolicy(period_sec=0),
+        budget,
+        pd.DataFrame({"number": [1.0, 2.0]}),
+    )
+
+
+def test_datasets_cannot_overspend_the_budget_together() -> None:
+    """A dataset due while another one calculates waits for its time to be recorded."""
+    budget = CalculationBudget(max_share=0.5, period_sec=60)
+    first, second = scheduler(budget), scheduler(budget)
+    triggers = []
+
+    assert first.trigger(0.0) == (True, "first")
+
+    thread = threading.Thread(
+        target=lambda: triggers.append(second.trigger(0.0))
+    )
+    thread.start()
+    thread.join(timeout=0.2)
+
+    assert thread.is_alive()
+
+    # The first calculation spends the whole budget
+    first.calculated(0.0, 30.0)
+    thread.join(timeout=5)
+
+    assert triggers == [(False, "budget")]
+
+
+def test_failed_calculation_releases_the_budget() -> None:
+    """A failed calculation spends its time and lets the other datasets calculate."""
+    budget = CalculationBudget(max_share=0.5, period_sec=60)
+    first, second = scheduler(budget), scheduler(budget)
+
+    assert first.trigger(0.0) == (True, "first")
+
+    first.failed(0.0, 1.0)
+
+    assert second.trigger(1.0) == (True, "first")
+    second.calculated(1.0, 1.0)
+    assert budget.used(2.0) == 2.0
+    # The window of the failed calculation stays due
+    assert first.trigger(2.0) == (True, "first")
+    first.calculated(2.0, 1.0)
+
+
+def test_no_cap_records_nothing() -> None:
+    """Without a cap, the calculations are neither serialised nor recorded."""
+    budget = CalculationBudget(max_share=None)
+    first, second = scheduler(budget), scheduler(budget)
+
+    assert first.trigger(0.0) == (True, "first")
+    assert second.trigger(0.0) == (True, "first")
+
+    first.calculated(0.0, 1.0)
+    second.calculated(0.0, 1.0)
+
+    assert len(budget.spent) == 0
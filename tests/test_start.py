@@ -0,0 +1,70 @@
+"""Tests of the start of the metric server under a WSGI server."""
+import metric_server
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+
+
+@pytest.fixture
+def served(tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Write a config and a reference in a working directory, with no service started.
+
+    Args:
+        tmp_path (pathlib.Path): the working directory of the server
+        monkeypatch (pytest.MonkeyPatch): resets the state of the server module
+    """
+    dataset_path = tmp_path / "datasets" / "houses"
+    dataset_path.mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    pd.DataFrame({"bedrooms": rng.integers(1, 7, 100)}).to_csv(
+        dataset_path / "reference.csv", index=False
+    )
+    configs = {
+        "datasets": {
+            "houses": {
+                "column_mapping": {
+                    "categorical_features": [],
+                    "numerical_features": ["bedrooms"],
+                },
+                "data_format": {"header": True, "separator": ","},
+                "monitors": ["data_drift"],
+            }
+        },
+        "service": {
+            "datasets_path": "datasets",
+            "use_reference": True,
+            "moving_reference": False,
+            "window_size": 5,
+            "calculation_period_sec": 1,
+            "warm_up": False,
+        },
+    }
+    (tmp_path / "config.yaml").write_text(yaml.safe_dump(configs))
+    monkeypatch.chdir(tmp_path)
+
+    for name in ("SERVICE", "INGESTOR", "TAILER", "WATCHER", "LOADER"):
+        monkeypatch.setattr(metric_server, name, None)
+
+    monkeypatch.setattr(
+        metric_server, "LOADING_STATUS", metric_server.LoadingStatus()
+    )
+
+
+def test_first_request_starts_the_service(served: None) -> None:
+    """Imported by a WSGI server, the app loads the references on its first request, once.
+
+    Args:
+        served (None): a working directory with a config and a reference, no service started
+    """
+    client = metric_server.app.test_client()
+    client.get("/healthz")
+    loader = metric_server.LOADER
+    loader.join(timeout=60)
+    client.get("/healthz")
+
+    response = client.post("/iterate/houses", json={"bedrooms": [3]})
+
+    assert metric_server.LOADER is loader
+    assert client.get("/ready").status_code == 200
+    assert response.status_code == 200